@@ -0,0 +1,146 @@
+"""Async front end to a storage backend, for use from the event loop."""
+import time
+from functools import partial
+from typing import Any, Callable, Iterator, List, Optional, Tuple, Union
+
+from anyio import to_thread
+
+from models import Product, ProductCreate, ProductUpdate, User, UserCreate, UserUpdate
+from profiling import add_db_time
+from storage import Changes, DuplicateEmail, Page, StorageBackend
+
+
+class AsyncDatabase:
+    """Await the operations of a ``StorageBackend`` without blocking the loop.
+
+    Writes always run in a worker thread, since they may wait on a disk
+    flush and on other writers. So do reads, which may wait on the lock
+    behind a writer or a snapshot and may scan a whole collection, except
+    for those the backend lists in ``inline_reads``: constant-time lookups
+    that are cheaper to run inline than to hand off.
+    """
+
+    def __init__(self, backend: StorageBackend):
+        self.backend = backend
+
+    async def _read(self, method: Callable, *args: Any, **kwargs: Any) -> Any:
+        start = time.perf_counter()
+        try:
+            if method.__name__ in self.backend.inline_reads:
+                return method(*args, **kwargs)
+            return await to_thread.run_sync(partial(method, *args, **kwargs))
+        finally:
+            add_db_time(time.perf_counter() - start)
+
+    async def _write(self, method: Callable, *args: Any, **kwargs: Any) -> Any:
+        start = time.perf_counter()
+        try:
+            return await to_thread.run_sync(partial(method, *args, **kwargs))
+        finally:
+            add_db_time(time.perf_counter() - start)
+
+    async def clear(self):
+        await self._write(self.backend.clear)
+
+    async def seed_sample_data(self):
+        await self._write(self.backend.seed_sample_data)
+
+    async def collection_version(self, collection: str) -> int:
+        return await self._read(self.backend.collection_version, collection)
+
+    async def collection_size(self, collection: str) -> int:
+        return await self._read(self.backend.collection_size, collection)
+
+    async def changes_since(self, collection: str, since: int) -> Changes:
+        return await self._read(self.backend.changes_since, collection, since)
+
+    async def product_version(self, product_id: int) -> Optional[int]:
+        return await self._read(self.backend.product_version, product_id)
+
+    async def user_version(self, user_id: int) -> Optional[int]:
+        return await self._read(self.backend.user_version, user_id)
+
+    async def create_product(self, product_data: ProductCreate) -> Product:
+        return await self._write(self.backend.create_product, product_data)
+
+    async def create_products(self, items: List[ProductCreate]) -> List[Product]:
+        return await self._write(self.backend.create_products, items)
+
+    async def get_all_products(self) -> List[Product]:
+        return await self._read(self.backend.get_all_products)
+
+    def iter_products(self, batch_size: int = 1000) -> Iterator[List[Product]]:
+        """The backend's synchronous iterator; Starlette streams it from a thread."""
+        return self.backend.iter_products(batch_size)
+
+    async def query_products(self, **filters: Any) -> Page:
+        return await self._read(self.backend.query_products, **filters)
+
+    async def top_products(
+        self, limit: int, category: Optional[str] = None, descending: bool = False
+    ) -> List[Product]:
+        return await self._read(
+            self.backend.top_products, limit, category=category, descending=descending
+        )
+
+    async def search_products(self, query: str, limit: int = 10, offset: int = 0) -> List[Product]:
+        return await self._read(self.backend.search_products, query, limit=limit, offset=offset)
+
+    async def get_product(self, product_id: int) -> Optional[Product]:
+        return await self._read(self.backend.get_product, product_id)
+
+    async def update_product(
+        self, product_id: int, update_data: ProductUpdate, expected_version: Optional[int] = None
+    ) -> Optional[Product]:
+        return await self._write(
+            self.backend.update_product, product_id, update_data, expected_version
+        )
+
+    async def update_products(
+        self, updates: List[Tuple[int, ProductUpdate]]
+    ) -> List[Optional[Product]]:
+        return await self._write(self.backend.update_products, updates)
+
+    async def delete_product(self, product_id: int, expected_version: Optional[int] = None) -> bool:
+        return await self._write(self.backend.delete_product, product_id, expected_version)
+
+    async def delete_products(self, product_ids: List[int]) -> List[bool]:
+        return await self._write(self.backend.delete_products, product_ids)
+
+    async def create_user(self, user_data: UserCreate) -> User:
+        return await self._write(self.backend.create_user, user_data)
+
+    async def create_users(self, items: List[UserCreate]) -> List[Union[User, DuplicateEmail]]:
+        return await self._write(self.backend.create_users, items)
+
+    async def get_all_users(self) -> List[User]:
+        return await self._read(self.backend.get_all_users)
+
+    def iter_users(self, batch_size: int = 1000) -> Iterator[List[User]]:
+        """The backend's synchronous iterator; Starlette streams it from a thread."""
+        return self.backend.iter_users(batch_size)
+
+    async def query_users(self, **options: Any) -> Page:
+        return await self._read(self.backend.query_users, **options)
+
+    async def get_user(self, user_id: int) -> Optional[User]:
+        return await self._read(self.backend.get_user, user_id)
+
+    async def get_user_by_email(self, email: str) -> Optional[User]:
+        return await self._read(self.backend.get_user_by_email, email)
+
+    async def update_user(
+        self, user_id: int, update_data: UserUpdate, expected_version: Optional[int] = None
+    ) -> Optional[User]:
+        return await self._write(self.backend.update_user, user_id, update_data, expected_version)
+
+    async def update_users(
+        self, updates: List[Tuple[int, UserUpdate]]
+    ) -> List[Union[User, DuplicateEmail, None]]:
+        return await self._write(self.backend.update_users, updates)
+
+    async def delete_user(self, user_id: int, expected_version: Optional[int] = None) -> bool:
+        return await self._write(self.backend.delete_user, user_id, expected_version)
+
+    async def delete_users(self, user_ids: List[int]) -> List[bool]:
+        return await self._write(self.backend.delete_users, user_ids)
@@ -0,0 +1 @@
+"""Benchmarks for the CRUD API. Run modules with ``python -m bench.<name>``."""
@@ -0,0 +1,77 @@
+"""Benchmark bulk product creation against one request per product.
+
+Usage:
+    python -m bench.bulk --items 10000
+
+Both modes run in-process through the ASGI app, so the comparison isolates
+routing, validation and serialization cost from the network.
+"""
+import argparse
+import json
+import time
+
+from fastapi.testclient import TestClient
+
+from main import app, db
+
+
+def make_items(count: int):
+    """Build ``count`` product payloads."""
+    return [
+        {
+            "name": f"Product {i}",
+            "description": "Bulk benchmark product",
+            "price": float(i % 100),
+            "category": "Bench",
+            "tags": ["bench"],
+        }
+        for i in range(count)
+    ]
+
+
+def one_per_request(client: TestClient, items) -> float:
+    """Return the time to create every item with its own POST."""
+    start = time.perf_counter()
+    for item in items:
+        client.post("/products", json=item)
+    return time.perf_counter() - start
+
+
+def bulk(client: TestClient, items, batch_size: int, ndjson: bool) -> float:
+    """Return the time to create every item through POST /products/bulk."""
+    start = time.perf_counter()
+    for offset in range(0, len(items), batch_size):
+        batch = items[offset:offset + batch_size]
+        if ndjson:
+            client.post(
+                "/products/bulk",
+                content="\n".join(json.dumps(item) for item in batch),
+                headers={"Content-Type": "application/x-ndjson"},
+            )
+        else:
+            client.post("/products/bulk", json=batch)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", type=int, default=10_000)
+    parser.add_argument("--batch-size", type=int, default=1_000)
+    args = parser.parse_args()
+
+    items = make_items(args.items)
+    client = TestClient(app)
+    modes = {
+        "single": lambda: one_per_request(client, items),
+        "bulk-json": lambda: bulk(client, items, args.batch_size, ndjson=False),
+        "bulk-ndjson": lambda: bulk(client, items, args.batch_size, ndjson=True),
+    }
+    print(f"{'mode':>12} {'items/s':>12}")
+    for mode, run in modes.items():
+        db.clear()
+        elapsed = run()
+        print(f"{mode:>12} {args.items / elapsed:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""Measure bytes on the wire and CPU per request for each Content-Encoding.
+
+Usage:
+    python -m bench.compression --rows 10000 --requests 50
+
+Full pages of GET /products and GET /products/search are requested with every encoding
+the server can produce. The list endpoint is measured with the response
+cache enabled, where each encoding is compressed once per version, and
+disabled, where the middleware compresses every response.
+"""
+import argparse
+import time
+
+from fastapi.testclient import TestClient
+
+from compression import PREFERENCE
+from main import MAX_PAGE_SIZE, app, db, response_cache
+from models import ProductCreate
+
+
+def measure(client: TestClient, path: str, encoding: str, count: int):
+    """Return (bytes received, CPU ms) per request for ``path`` with ``encoding``."""
+    headers = {"Accept-Encoding": encoding}
+    size = client.get(path, headers=headers).num_bytes_downloaded
+    start = time.process_time()
+    for _ in range(count):
+        response = client.get(path, headers=headers)
+    elapsed = time.process_time() - start
+    assert response.headers.get("Content-Encoding", "identity") == encoding
+    return size, elapsed / count * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--requests", type=int, default=50)
+    args = parser.parse_args()
+
+    db.clear()
+    db.create_products([
+        ProductCreate(
+            name=f"Product {i}",
+            description="Compression benchmark product",
+            price=float(i % 100),
+            category=f"Category {i % 20}",
+            tags=["bench", f"tag{i % 7}"],
+        )
+        for i in range(args.rows)
+    ])
+    client = TestClient(app)
+
+    cases = [
+        ("list, cached", f"/products?limit={MAX_PAGE_SIZE}", response_cache.max_bytes),
+        ("list, uncached", f"/products?limit={MAX_PAGE_SIZE}", 0),
+        ("search", f"/products/search?q=benchmark&limit={MAX_PAGE_SIZE}", response_cache.max_bytes),
+    ]
+    print(f"{'request':>16} {'encoding':>9} {'bytes':>10} {'cpu ms':>8}")
+    for label, path, cache_bytes in cases:
+        response_cache.max_bytes = cache_bytes
+        response_cache.clear()
+        for encoding in ["identity", *reversed(PREFERENCE)]:
+            size, cpu_ms = measure(client, path, encoding, args.requests)
+            print(f"{label:>16} {encoding:>9} {size:>10} {cpu_ms:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
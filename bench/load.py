@@ -0,0 +1,410 @@
+"""Replay mixed read/write workloads against the API and report the results as JSON.
+
+Usage:
+    python -m bench.load run --rows 1000 100000 --workload read mixed --mode asgi uvicorn
+    python -m bench.load run --rows 10000 --output current.json --baseline baseline.json
+    python -m bench.load compare baseline.json current.json --tolerance 0.1
+
+Each run seeds a fresh ``InMemoryDatabase`` with ``--rows`` products and a
+hundredth as many users, then drives the app from ``--concurrency`` clients
+for ``--seconds`` after a short warm-up. In ``asgi`` mode the app is called
+in-process, which leaves out sockets and HTTP parsing; in ``uvicorn`` mode a
+server process is started and driven over keep-alive connections.
+
+``--workload`` names a built-in mix from ``WORKLOADS`` or a JSONL file to
+replay, one ``{"method", "path", "body", "weight"}`` object per line, where
+``{product_id}`` and ``{user_id}`` in a path are filled with existing ids.
+
+Results hold throughput, p50/p95/p99 latency overall and per operation, and
+the resident memory of the serving process (in ``asgi`` mode that includes
+the load generator). They are written as JSON, and with ``--baseline`` each
+result is compared with the matching one of an earlier run; the exit status
+is 1 if any regressed by more than ``--tolerance``.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import httpx
+
+from bench.workers import ROOT, wait_until_ready
+
+# (method, path, JSON body) of one request.
+Request = Tuple[str, str, Optional[object]]
+Operation = Callable[[random.Random, "Ids"], Request]
+
+
+class Ids:
+    """Id ranges the generated requests draw from; creates extend the product range."""
+
+    def __init__(self, products: int, users: int):
+        self.products = products
+        self.users = users
+
+    def product(self, rng: random.Random) -> int:
+        return rng.randint(1, max(1, self.products))
+
+    def user(self, rng: random.Random) -> int:
+        return rng.randint(1, max(1, self.users))
+
+
+def _product_body(rng: random.Random) -> dict:
+    i = rng.randrange(1_000_000)
+    return {
+        "name": f"Load {i}",
+        "description": f"Load test product {i}",
+        "price": float(i % 500),
+        "category": f"Category {i % 20}",
+        "tags": ["load", f"tag{i % 7}"],
+    }
+
+
+def _create_product(rng: random.Random, ids: Ids) -> Request:
+    ids.products += 1
+    return "POST", "/products", _product_body(rng)
+
+
+OPERATIONS: Dict[str, Operation] = {
+    "get_product": lambda rng, ids: ("GET", f"/products/{ids.product(rng)}", None),
+    "list_products": lambda rng, ids: (
+        "GET", f"/products?limit=50&after_id={ids.product(rng)}", None
+    ),
+    "filter_products": lambda rng, ids: (
+        "GET", f"/products?category=Category%20{rng.randrange(20)}&limit=50", None
+    ),
+    "search_products": lambda rng, ids: (
+        "GET", f"/products/search?q=product+{rng.randrange(1000)}", None
+    ),
+    "top_products": lambda rng, ids: ("GET", "/products/top?limit=10", None),
+    "get_user": lambda rng, ids: ("GET", f"/users/{ids.user(rng)}", None),
+    "list_users": lambda rng, ids: ("GET", f"/users?limit=50&after_id={ids.user(rng)}", None),
+    "create_product": _create_product,
+    "update_product": lambda rng, ids: (
+        "PUT", f"/products/{ids.product(rng)}", {"price": float(rng.randrange(500))}
+    ),
+    "delete_product": lambda rng, ids: ("DELETE", f"/products/{ids.product(rng)}", None),
+}
+
+# Operation weights of each built-in workload.
+WORKLOADS: Dict[str, Dict[str, int]] = {
+    "read": {
+        "get_product": 40, "list_products": 20, "filter_products": 15,
+        "search_products": 10, "top_products": 5, "get_user": 5, "list_users": 5,
+    },
+    "mixed": {
+        "get_product": 30, "list_products": 15, "filter_products": 10, "search_products": 5,
+        "get_user": 5, "list_users": 5, "create_product": 10, "update_product": 15,
+        "delete_product": 5,
+    },
+    "write": {
+        "get_product": 10, "create_product": 40, "update_product": 40, "delete_product": 10,
+    },
+}
+
+
+def load_workload(name: str) -> Dict[str, Tuple[int, Operation]]:
+    """Weighted operations of a built-in workload or of a JSONL replay file."""
+    if name in WORKLOADS:
+        return {op: (weight, OPERATIONS[op]) for op, weight in WORKLOADS[name].items()}
+    workload = {}
+    with open(name) as lines:
+        for number, line in enumerate(lines, 1):
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            method, path, body = entry["method"].upper(), entry["path"], entry.get("body")
+
+            def replay(rng, ids, method=method, path=path, body=body) -> Request:
+                filled = path.format(product_id=ids.product(rng), user_id=ids.user(rng))
+                return method, filled, body
+
+            workload[f"{number}:{method} {path}"] = (entry.get("weight", 1), replay)
+    return workload
+
+
+def seed(rows: int, users: int):
+    """Fill the app's database with ``rows`` products and ``users`` users."""
+    from main import db, password_hasher
+    from models import ProductCreate, UserCreate
+
+    db.clear()
+    rng = random.Random(0)
+    for offset in range(0, rows, 10_000):
+        db.create_products([
+            ProductCreate(**_product_body(rng)) for _ in range(offset, min(rows, offset + 10_000))
+        ])
+    # One hash for every user: seeding shouldn't be a scrypt benchmark.
+    password = password_hasher.hash_sync("load")
+    db.create_users([
+        UserCreate(name=f"User {i}", email=f"user{i}@example.com", password=password)
+        for i in range(users)
+    ])
+
+
+def rss_bytes(pid: str = "self") -> Optional[int]:
+    """Resident set size of a process, where /proc is available."""
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    """p50/p95/p99/max of latencies in seconds, as milliseconds."""
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+    at = lambda fraction: ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+    return {
+        "p50": at(0.50) * 1000,
+        "p95": at(0.95) * 1000,
+        "p99": at(0.99) * 1000,
+        "max": ordered[-1] * 1000,
+    }
+
+
+async def drive(
+    client: httpx.AsyncClient,
+    workload: Dict[str, Tuple[int, Operation]],
+    ids: Ids,
+    concurrency: int,
+    seconds: float,
+    warmup: float,
+) -> dict:
+    """Send requests from ``concurrency`` clients; measure those after the warm-up."""
+    names = list(workload)
+    weights = [workload[name][0] for name in names]
+    latencies: Dict[str, List[float]] = {name: [] for name in names}
+    errors = 0
+    measure_from = time.perf_counter() + warmup
+    deadline = measure_from + seconds
+
+    async def worker(seed: int):
+        nonlocal errors
+        rng = random.Random(seed)
+        while True:
+            name = rng.choices(names, weights)[0]
+            method, path, body = workload[name][1](rng, ids)
+            start = time.perf_counter()
+            if start >= deadline:
+                return
+            response = await client.request(method, path, json=body)
+            if start >= measure_from:
+                latencies[name].append(time.perf_counter() - start)
+                # Random ids may point at rows a delete already removed.
+                errors += response.status_code >= 400 and response.status_code != 404
+
+    await asyncio.gather(*(worker(seed) for seed in range(concurrency)))
+    requests = sum(map(len, latencies.values()))
+    return {
+        "requests": requests,
+        "errors": errors,
+        "throughput": requests / seconds,
+        "latency_ms": percentiles([sample for samples in latencies.values() for sample in samples]),
+        "operations": {
+            name: dict(requests=len(samples), latency_ms=percentiles(samples))
+            for name, samples in latencies.items() if samples
+        },
+    }
+
+
+def run_asgi(args, workload_name: str, rows: int) -> dict:
+    from main import app
+
+    users = max(10, rows // 100)
+    seed(rows, users)
+    transport = httpx.ASGITransport(app=app)
+
+    async def go():
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            return await drive(
+                client, load_workload(workload_name), Ids(rows, users),
+                args.concurrency, args.seconds, args.warmup,
+            )
+
+    result = asyncio.run(go())
+    result["rss_bytes"] = rss_bytes()
+    return result
+
+
+def run_uvicorn(args, workload_name: str, rows: int) -> dict:
+    users = max(10, rows // 100)
+    server = subprocess.Popen(
+        [sys.executable, "-m", "bench.load", "serve", "--rows", str(rows),
+         "--users", str(users), "--port", str(args.port)],
+        cwd=ROOT, stdout=subprocess.DEVNULL,
+    )
+    try:
+        wait_until_ready(args.port, timeout=3600)
+
+        async def go():
+            limits = httpx.Limits(max_connections=args.concurrency)
+            base_url = f"http://127.0.0.1:{args.port}"
+            async with httpx.AsyncClient(base_url=base_url, limits=limits) as client:
+                return await drive(
+                    client, load_workload(workload_name), Ids(rows, users),
+                    args.concurrency, args.seconds, args.warmup,
+                )
+
+        result = asyncio.run(go())
+        result["rss_bytes"] = rss_bytes(str(server.pid))
+        return result
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def serve(args):
+    """Seed the database, then serve the app; started by ``run_uvicorn``."""
+    import uvicorn
+
+    from main import app
+
+    seed(args.rows, args.users)
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
+
+
+def result_key(result: dict) -> str:
+    return f"{result['mode']}/{result['workload']}/{result['rows']}/{result['concurrency']}"
+
+
+# Metric, where to find it in a result, and whether higher is better.
+COMPARED_METRICS = [
+    ("throughput", ("throughput",), True),
+    ("p50 ms", ("latency_ms", "p50"), False),
+    ("p99 ms", ("latency_ms", "p99"), False),
+    ("rss MiB", ("rss_bytes",), False),
+]
+
+
+def compare(baseline: dict, current: dict, tolerance: float) -> List[str]:
+    """Print how each result moved against the baseline; return the regressions."""
+    base_results = {result_key(result): result for result in baseline["results"]}
+    regressions = []
+    print(f"{'result':>32} {'metric':>10} {'baseline':>10} {'current':>10} {'change':>8}",
+          file=sys.stderr)
+    for result in current["results"]:
+        key = result_key(result)
+        base = base_results.get(key)
+        if base is None:
+            print(f"{key:>32} {'(not in baseline)':>10}", file=sys.stderr)
+            continue
+        for metric, path, higher_is_better in COMPARED_METRICS:
+            old, new = base, result
+            for step in path:
+                old, new = (old or {}).get(step), (new or {}).get(step)
+            if not old or new is None:
+                continue
+            if metric == "rss MiB":
+                old, new = old / 2 ** 20, new / 2 ** 20
+            change = (new - old) / old
+            regressed = -change > tolerance if higher_is_better else change > tolerance
+            flag = "  REGRESSED" if regressed else ""
+            print(f"{key:>32} {metric:>10} {old:>10.1f} {new:>10.1f} {change:>+8.1%}{flag}",
+                  file=sys.stderr)
+            if regressed:
+                regressions.append(f"{key} {metric}")
+    return regressions
+
+
+def environment() -> dict:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "commit": commit,
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+    }
+
+
+def run(args) -> int:
+    runners = {"asgi": run_asgi, "uvicorn": run_uvicorn}
+    results = []
+    print(f"{'mode':>8} {'workload':>10} {'rows':>8} {'req/s':>9} {'p50 ms':>8}"
+          f" {'p95 ms':>8} {'p99 ms':>8} {'errors':>6} {'rss MiB':>8}", file=sys.stderr)
+    for mode in args.mode:
+        for workload in args.workload:
+            for rows in args.rows:
+                result = runners[mode](args, workload, rows)
+                result = dict(
+                    mode=mode, workload=workload, rows=rows, concurrency=args.concurrency,
+                    seconds=args.seconds, **result,
+                )
+                results.append(result)
+                latency = result["latency_ms"]
+                rss = (result["rss_bytes"] or 0) / 2 ** 20
+                print(f"{mode:>8} {workload:>10} {rows:>8} {result['throughput']:>9.1f}"
+                      f" {latency.get('p50', 0):>8.2f} {latency.get('p95', 0):>8.2f}"
+                      f" {latency.get('p99', 0):>8.2f} {result['errors']:>6} {rss:>8.1f}",
+                      file=sys.stderr)
+
+    report = {"environment": environment(), "results": results}
+    encoded = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as output:
+            output.write(encoded + "\n")
+    else:
+        print(encoded)
+    if args.baseline:
+        with open(args.baseline) as baseline:
+            return 1 if compare(json.load(baseline), report, args.tolerance) else 0
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="run workloads and report JSON")
+    run_parser.add_argument("--rows", type=int, nargs="+", default=[1_000, 100_000])
+    run_parser.add_argument("--workload", nargs="+", default=["read", "mixed"])
+    run_parser.add_argument("--mode", nargs="+", choices=["asgi", "uvicorn"], default=["asgi"])
+    run_parser.add_argument("--concurrency", type=int, default=16)
+    run_parser.add_argument("--seconds", type=float, default=10.0)
+    run_parser.add_argument("--warmup", type=float, default=1.0)
+    run_parser.add_argument("--port", type=int, default=8766)
+    run_parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    run_parser.add_argument("--baseline", help="JSON report of an earlier run to compare with")
+    run_parser.add_argument("--tolerance", type=float, default=0.10)
+
+    compare_parser = commands.add_parser("compare", help="compare two JSON reports")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--tolerance", type=float, default=0.10)
+
+    serve_parser = commands.add_parser("serve", help=argparse.SUPPRESS)
+    serve_parser.add_argument("--rows", type=int, required=True)
+    serve_parser.add_argument("--users", type=int, required=True)
+    serve_parser.add_argument("--port", type=int, required=True)
+
+    args = parser.parse_args()
+    if args.command == "serve":
+        serve(args)
+    elif args.command == "compare":
+        with open(args.baseline) as baseline, open(args.current) as current:
+            regressions = compare(json.load(baseline), json.load(current), args.tolerance)
+        sys.exit(1 if regressions else 0)
+    else:
+        sys.exit(run(args))
+
+
+if __name__ == "__main__":
+    main()
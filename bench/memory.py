@@ -0,0 +1,91 @@
+"""Measure bytes per stored product for each row representation.
+
+Usage:
+    python -m bench.memory --rows 1000000
+
+Compares a table of Pydantic ``Product`` models, as ``InMemoryDatabase`` used
+to store, with a table of ``ProductRecord`` objects, and reports the whole
+database including its secondary indexes. Every row gets freshly built
+strings, as rows parsed from separate requests would, so interning is
+measured rather than assumed. Sizes come from ``tracemalloc``.
+"""
+import argparse
+import gc
+import tracemalloc
+from datetime import datetime
+from typing import Callable, Dict, List
+
+from database import InMemoryDatabase
+from models import Product, ProductCreate
+from records import ProductRecord
+
+TAGS = ["red", "green", "blue", "large", "small", "sale", "new", "eco"]
+
+
+def product_fields(i: int) -> Dict:
+    return {
+        "name": f"Product {i}",
+        "description": f"Memory benchmark product number {i}",
+        "price": float(i % 1000) + 0.99,
+        "category": "".join(["Category ", str(i % 50)]),
+        "tags": [TAGS[(i + k) % len(TAGS)].encode().decode() for k in range(i % 3 + 1)],
+        "in_stock": i % 7 != 0,
+    }
+
+
+def pydantic_table(rows: int) -> Dict[int, Product]:
+    return {
+        i: Product(id=i, created_at=datetime.now(), **product_fields(i))
+        for i in range(1, rows + 1)
+    }
+
+
+def record_table(rows: int) -> Dict[int, ProductRecord]:
+    return {
+        i: ProductRecord(id=i, created_at=datetime.now(), **product_fields(i))
+        for i in range(1, rows + 1)
+    }
+
+
+def database(rows: int) -> InMemoryDatabase:
+    db = InMemoryDatabase()
+    for offset in range(0, rows, 10_000):
+        db.create_products([
+            ProductCreate(**product_fields(i)) for i in range(offset, min(rows, offset + 10_000))
+        ])
+    return db
+
+
+def measure(build: Callable[[int], object], rows: int) -> float:
+    """Bytes per row still allocated after ``build(rows)`` returns."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        kept = build(rows)
+        gc.collect()
+        after = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    del kept
+    return (after - before) / rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    results: List = [
+        ("Product models (before)", measure(pydantic_table, args.rows)),
+        ("ProductRecord rows (after)", measure(record_table, args.rows)),
+        ("InMemoryDatabase with indexes", measure(database, args.rows)),
+    ]
+    print(f"{args.rows} products")
+    print(f"{'representation':>32} {'bytes/row':>10}")
+    for name, size in results:
+        print(f"{name:>32} {size:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
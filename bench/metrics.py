@@ -0,0 +1,86 @@
+"""Measure the overhead of request and database metrics.
+
+Usage:
+    python -m bench.metrics --rows 10000 --seconds 5 --concurrency 16
+
+Times single metric updates, then drives the app in-process with the
+``read`` and ``mixed`` workloads of ``bench.load``, first without metrics
+and then with ``MetricsMiddleware`` and the database instrumented the way
+``CRUD_METRICS=1`` sets them up. Finally times rendering ``/metrics``.
+"""
+import argparse
+import asyncio
+import os
+import time
+import timeit
+
+# The app is imported bare, and instrumented below once the baseline is in.
+os.environ["CRUD_METRICS"] = "0"
+
+import httpx  # noqa: E402
+
+from bench.load import Ids, drive, load_workload, seed  # noqa: E402
+from main import DB_METHODS, app, db, metrics  # noqa: E402
+from metrics import MetricsMiddleware, Registry, instrument  # noqa: E402
+
+
+def update_cost_ns() -> dict:
+    """Nanoseconds per counter increment and histogram observation."""
+    registry = Registry()
+    counter = registry.counter("c", "Counter.", ("route",))
+    histogram = registry.histogram("h", "Histogram.", ("route",))
+    number = 200_000
+    return {
+        "counter": timeit.timeit(lambda: counter.inc(("/a",)), number=number) / number * 1e9,
+        "histogram": timeit.timeit(
+            lambda: histogram.observe(("/a",), 0.003), number=number
+        ) / number * 1e9,
+    }
+
+
+def measure(asgi_app, workload: str, args) -> dict:
+    seed(args.rows, args.rows // 100)
+
+    async def go():
+        transport = httpx.ASGITransport(app=asgi_app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            return await drive(
+                client, load_workload(workload), Ids(args.rows, args.rows // 100),
+                args.concurrency, args.seconds, warmup=1.0,
+            )
+
+    return asyncio.run(go())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--concurrency", type=int, default=16)
+    args = parser.parse_args()
+
+    costs = update_cost_ns()
+    print(f"counter.inc {costs['counter']:.0f} ns, histogram.observe {costs['histogram']:.0f} ns")
+
+    workloads = ("read", "mixed")
+    plain = {workload: measure(app, workload, args) for workload in workloads}
+    instrumented_app = MetricsMiddleware(app, metrics)
+    instrument(db, metrics, DB_METHODS)
+    instrumented = {workload: measure(instrumented_app, workload, args) for workload in workloads}
+
+    print(f"{'workload':>9} {'metrics':>8} {'req/s':>9} {'p50 ms':>8} {'p99 ms':>8}")
+    for workload in workloads:
+        for label, result in (("off", plain[workload]), ("on", instrumented[workload])):
+            latency = result["latency_ms"]
+            print(f"{workload:>9} {label:>8} {result['throughput']:>9.1f}"
+                  f" {latency['p50']:>8.3f} {latency['p99']:>8.3f}")
+        change = instrumented[workload]["throughput"] / plain[workload]["throughput"] - 1
+        print(f"{workload:>9} {'change':>8} {change:>+9.1%}")
+
+    start = time.perf_counter()
+    body = metrics.render()
+    print(f"/metrics render {(time.perf_counter() - start) * 1000:.2f} ms, {len(body)} bytes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""Measure POST /users throughput and latency with scrypt password hashing.
+
+Usage:
+    python -m bench.passwords --users 400 --concurrency 1 8 32
+
+Creates users from ``concurrency`` concurrent clients through the ASGI app,
+while a probe requests GET /health every 10 ms. The probe's latency shows
+whether hashing holds up the event loop. Each level runs twice: with
+hashing on the bounded pool, and with hashing inline on the event loop,
+which is what calling scrypt straight from the endpoint would do.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from typing import List
+
+import httpx
+
+from main import app, db, password_hasher
+
+
+def percentile(samples: List[float], fraction: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+async def run(users: int, concurrency: int) -> dict:
+    """Create ``users`` users from ``concurrency`` clients; return latencies in ms."""
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        latencies: List[float] = []
+        probes: List[float] = []
+        rejected = 0
+        remaining = iter(range(users))
+        done = asyncio.Event()
+
+        async def worker():
+            nonlocal rejected
+            for i in remaining:
+                start = time.perf_counter()
+                response = await client.post("/users", json={
+                    "name": f"User {i}", "email": f"user{i}@example.com", "password": f"pw{i}",
+                })
+                latencies.append((time.perf_counter() - start) * 1000)
+                rejected += response.status_code == 503
+
+        async def probe():
+            while not done.is_set():
+                start = time.perf_counter()
+                await client.get("/health")
+                probes.append((time.perf_counter() - start) * 1000)
+                await asyncio.sleep(0.01)
+
+        prober = asyncio.create_task(probe())
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+        done.set()
+        await prober
+    return {
+        "rate": users / elapsed,
+        "p50": statistics.median(latencies),
+        "p99": percentile(latencies, 0.99),
+        "probe_p99": percentile(probes, 0.99),
+        "rejected": rejected,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    args = parser.parse_args()
+
+    hasher = password_hasher
+    pooled_hash = hasher.hash
+
+    async def inline_hash(password: str) -> str:
+        return hasher.hash_sync(password)
+
+    print(f"scrypt n={hasher.n} r={hasher.r} p={hasher.p}, {hasher.workers} hashing threads")
+    print(f"{'mode':>7} {'clients':>7} {'users/s':>8} {'p50 ms':>8} {'p99 ms':>8}"
+          f" {'health p99':>10} {'503s':>5}")
+    for concurrency in args.concurrency:
+        for mode, hash_function in (("pool", pooled_hash), ("inline", inline_hash)):
+            hasher.hash = hash_function
+            db.clear()
+            result = asyncio.run(run(args.users, concurrency))
+            print(
+                f"{mode:>7} {concurrency:>7} {result['rate']:>8.1f} {result['p50']:>8.1f}"
+                f" {result['p99']:>8.1f} {result['probe_p99']:>10.1f} {result['rejected']:>5}"
+            )
+    hasher.hash = pooled_hash
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Benchmark point reads, updates and deletes against collection size.
+
+Usage:
+    python -m bench.primary_key --sizes 1000 10000 100000 1000000
+
+Latency for each operation should stay flat as the collection grows.
+"""
+import argparse
+import random
+import time
+from typing import Callable, Dict, List
+
+from database import InMemoryDatabase
+from models import ProductCreate, ProductUpdate
+
+
+def populate(size: int) -> InMemoryDatabase:
+    """Build a database holding ``size`` products."""
+    db = InMemoryDatabase()
+    db.clear()
+    for i in range(size):
+        db.create_product(ProductCreate(
+            name=f"Product {i}",
+            description="Benchmark product",
+            price=float(i % 1000),
+            category=f"Category {i % 50}",
+            tags=["bench"],
+        ))
+    return db
+
+
+def measure(op: Callable[[int], object], ids: List[int]) -> Dict[str, float]:
+    """Run ``op`` once per id and return latency percentiles in microseconds."""
+    samples = []
+    for product_id in ids:
+        start = time.perf_counter_ns()
+        op(product_id)
+        samples.append(time.perf_counter_ns() - start)
+    samples.sort()
+    return {
+        "p50": samples[len(samples) // 2] / 1000,
+        "p99": samples[int(len(samples) * 0.99)] / 1000,
+    }
+
+
+def run(size: int, ops: int) -> Dict[str, Dict[str, float]]:
+    """Benchmark get, update and delete on a database of ``size`` rows."""
+    db = populate(size)
+    ids = random.sample(range(1, size + 1), min(ops, size))
+    update = ProductUpdate(price=1.0)
+    return {
+        "get": measure(db.get_product, ids),
+        "update": measure(lambda product_id: db.update_product(product_id, update), ids),
+        "delete": measure(db.delete_product, ids),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000, 1_000_000])
+    parser.add_argument("--ops", type=int, default=1_000)
+    args = parser.parse_args()
+
+    print(f"{'rows':>10} {'op':>8} {'p50 us':>10} {'p99 us':>10}")
+    for size in args.sizes:
+        for op, stats in run(size, args.ops).items():
+            print(f"{size:>10} {op:>8} {stats['p50']:>10.2f} {stats['p99']:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
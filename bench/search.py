@@ -0,0 +1,85 @@
+"""Benchmark full-text search latency against catalog size.
+
+Usage:
+    python -m bench.search --sizes 10000 100000 1000000
+
+Queries cover a rare term, a mid-frequency term, the most frequent term
+and a multi-term query; ``matches`` is how many products contain any of the
+query's terms. Search visits each term's postings best-scoring bucket first
+and stops once the page is settled, so even a term in most products should
+answer in a few milliseconds at 1M products rather than scoring every
+match.
+"""
+import argparse
+import random
+import time
+from collections import Counter
+from typing import Dict, Tuple
+
+from database import InMemoryDatabase
+from models import ProductCreate
+from search import tokenize
+
+WORDS = [f"word{i}" for i in range(5_000)]
+QUERIES = {
+    "rare": "word4999",
+    "common": "word7",
+    "frequent": "word0",
+    "multi": "word3 word42 word999",
+}
+
+
+def populate(size: int) -> Tuple[InMemoryDatabase, Dict[str, int]]:
+    """Build a database with ``size`` products of Zipf-like random text.
+
+    Also returns how many products match each query.
+    """
+    rng = random.Random(0)
+    weights = [1 / (rank + 1) for rank in range(len(WORDS))]
+    query_terms = {label: set(tokenize(query)) for label, query in QUERIES.items()}
+    matches: Counter = Counter()
+    db = InMemoryDatabase()
+    db.clear()
+    for i in range(size):
+        name = " ".join(rng.choices(WORDS, weights, k=3))
+        description = " ".join(rng.choices(WORDS, weights, k=12))
+        words = set(tokenize(f"{name} {description}"))
+        for label, terms in query_terms.items():
+            if terms & words:
+                matches[label] += 1
+        db.create_product(ProductCreate(
+            name=name, description=description, price=1.0, category="Bench"
+        ))
+    return db, matches
+
+
+def run(size: int, repeat: int) -> Dict[str, Tuple[int, float]]:
+    """Return the match count and median latency in milliseconds for each query."""
+    db, matches = populate(size)
+    db.search_products("warm up the index")
+    results = {}
+    for label, query in QUERIES.items():
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            db.search_products(query, limit=10)
+            samples.append(time.perf_counter() - start)
+        samples.sort()
+        results[label] = matches[label], samples[len(samples) // 2] * 1000
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'rows':>10} {'query':>8} {'matches':>10} {'p50 ms':>10}")
+    for size in args.sizes:
+        for label, (matched, latency) in run(size, args.repeat).items():
+            print(f"{size:>10} {label:>8} {matched:>10} {latency:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
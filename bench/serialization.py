@@ -0,0 +1,58 @@
+"""Benchmark GET /products with and without the fast JSON path.
+
+Usage:
+    python -m bench.serialization --rows 10000 --requests 50
+
+Requests go through the ASGI app in-process, so the numbers isolate
+validation and serialization cost from the network. The response cache is
+turned off, since every request after the first would otherwise be a hit
+that is encoded the fast way whatever ``CRUD_FAST_JSON`` says.
+"""
+import argparse
+import time
+
+from fastapi.testclient import TestClient
+
+from config import settings
+from main import app, db, response_cache
+from models import ProductCreate
+
+
+def requests_per_second(client: TestClient, count: int) -> float:
+    """Return GET /products throughput over ``count`` requests."""
+    client.get("/products")
+    start = time.perf_counter()
+    for _ in range(count):
+        client.get("/products")
+    return count / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--requests", type=int, default=50)
+    args = parser.parse_args()
+
+    db.clear()
+    db.create_products([
+        ProductCreate(
+            name=f"Product {i}",
+            description="Serialization benchmark product",
+            price=float(i % 100),
+            category=f"Category {i % 20}",
+            tags=["bench", f"tag{i % 7}"],
+        )
+        for i in range(args.rows)
+    ])
+    response_cache.max_bytes = 0
+    client = TestClient(app)
+
+    print(f"{'mode':>14} {'req/s':>10}")
+    for fast_json in (False, True):
+        settings.fast_json = fast_json
+        label = "fast_json" if fast_json else "response_model"
+        print(f"{label:>14} {requests_per_second(client, args.requests):>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
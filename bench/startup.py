@@ -0,0 +1,147 @@
+"""Measure cold start: import time of the app and time until it serves requests.
+
+Usage:
+    python -m bench.startup --rows 1000000 --runs 5
+
+Every measurement starts a fresh interpreter. Import time is ``import main``
+alone; ready time runs ``python main.py`` until ``GET /health`` answers, with
+an empty database, restored from a snapshot of ``--rows`` products through
+``CRUD_SNAPSHOT_PATH``, and recovered by replaying a write-ahead log of the
+same rows. The slowest imported modules are listed at the end.
+"""
+import argparse
+import http.client
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+from database import InMemoryDatabase
+from models import ProductCreate
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+IMPORT_SCRIPT = (
+    "import time; start = time.perf_counter(); import main; "
+    "print(time.perf_counter() - start)"
+)
+
+
+def build_dataset(rows: int, snapshot_path: str, wal_dir: str):
+    """Write ``rows`` products both as a snapshot and as a write-ahead log."""
+    db = InMemoryDatabase(wal_dir=wal_dir, fsync=False, snapshot_every=10**9)
+    for offset in range(0, rows, 10_000):
+        db.create_products([
+            ProductCreate(
+                name=f"Product {i}",
+                description=f"Startup benchmark product number {i}",
+                price=float(i % 1000),
+                category=f"Category {i % 50}",
+                tags=[f"tag{i % 10}"],
+            )
+            for i in range(offset, min(rows, offset + 10_000))
+        ])
+    db.save_snapshot(snapshot_path)
+    db.close()
+
+
+def import_time(env: Dict[str, str]) -> float:
+    output = subprocess.run(
+        [sys.executable, "-c", IMPORT_SCRIPT], cwd=ROOT, env=env,
+        capture_output=True, text=True, check=True,
+    ).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def ready_time(env: Dict[str, str], port: int, timeout: float = 600.0) -> float:
+    """Seconds from spawning ``python main.py`` until ``/health`` answers 200."""
+    env = dict(env, CRUD_HOST="127.0.0.1", CRUD_PORT=str(port))
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "main.py"], cwd=ROOT, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            try:
+                conn = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+                conn.request("GET", "/health")
+                if conn.getresponse().status == 200:
+                    return time.perf_counter() - start
+            except OSError:
+                time.sleep(0.005)
+        raise RuntimeError("server did not become ready")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def slowest_imports(env: Dict[str, str], count: int) -> List[str]:
+    """Modules ``main`` imports directly, ordered by cumulative import time."""
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"], cwd=ROOT, env=env,
+        capture_output=True, text=True, check=True,
+    ).stderr
+    totals = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        # Names are indented two spaces per level below the module importing them.
+        # Children are listed before their parent, so keep the direct
+        # children seen since the last top-level import until ``main`` ends.
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if not cumulative.strip().isdigit():
+            continue
+        if depth == 0:
+            if name.strip() == "main":
+                break
+            totals = {}
+        elif depth == 1:
+            totals[name.strip()] = int(cumulative.strip())
+    ranked = sorted(totals.items(), key=lambda item: item[1], reverse=True)
+    return [f"{name:>28} {micros / 1000:>8.1f} ms" for name, micros in ranked[:count]]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--port", type=int, default=8766)
+    args = parser.parse_args()
+
+    env = {
+        key: value for key, value in os.environ.items() if not key.startswith("CRUD_")
+    }
+    with tempfile.TemporaryDirectory() as tmpdir:
+        snapshot_path = os.path.join(tmpdir, "products.snap")
+        wal_dir = os.path.join(tmpdir, "wal")
+        build_dataset(args.rows, snapshot_path, wal_dir)
+        scenarios = {
+            "import main": lambda: import_time(env),
+            "ready, empty": lambda: ready_time(env, args.port),
+            "ready, seeded": lambda: ready_time(
+                dict(env, CRUD_SEED_SAMPLE_DATA="1"), args.port
+            ),
+            f"ready, {args.rows} from snapshot": lambda: ready_time(
+                dict(env, CRUD_SNAPSHOT_PATH=snapshot_path), args.port
+            ),
+            f"ready, {args.rows} from log": lambda: ready_time(
+                dict(env, CRUD_WAL_DIR=wal_dir, CRUD_WAL_SNAPSHOT_EVERY=str(10**9)),
+                args.port,
+            ),
+        }
+        print(f"{'scenario':>32} {'median s':>10} {'min s':>8}")
+        for name, measure in scenarios.items():
+            runs = [measure() for _ in range(args.runs)]
+            print(f"{name:>32} {statistics.median(runs):>10.3f} {min(runs):>8.3f}")
+
+    print("\nslowest imports of main:")
+    for line in slowest_imports(env, 8):
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
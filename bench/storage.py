@@ -0,0 +1,91 @@
+"""Benchmark the in-memory and SQLite storage backends side by side.
+
+Usage:
+    python -m bench.storage --rows 100000
+
+Reports mean latency per operation for each backend.
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from typing import Callable, Dict
+
+from database import create_database
+from models import ProductCreate, ProductUpdate
+
+
+def timed(op: Callable[[int], object], count: int) -> float:
+    """Return the mean latency of ``op(i)`` in microseconds."""
+    start = time.perf_counter()
+    for i in range(count):
+        op(i)
+    return (time.perf_counter() - start) / count * 1e6
+
+
+def run(backend: str, rows: int, ops: int, sqlite_path: str) -> Dict[str, float]:
+    """Load ``rows`` products into ``backend`` and time each operation."""
+    db = create_database(backend, sqlite_path)
+    db.clear()
+    items = [
+        ProductCreate(
+            name=f"Product {i}",
+            description=f"Storage benchmark product number {i}",
+            price=float(i % 1000),
+            category=f"Category {i % 50}",
+            tags=[f"tag{i % 10}"],
+        )
+        for i in range(rows)
+    ]
+    start = time.perf_counter()
+    for offset in range(0, rows, 1000):
+        db.create_products(items[offset:offset + 1000])
+    results = {"bulk load rows/s": rows / (time.perf_counter() - start)}
+
+    ids = [random.randint(1, rows) for _ in range(ops)]
+    update = ProductUpdate(price=1.0)
+    results.update({
+        "create us": timed(lambda i: db.create_product(items[i]), ops),
+        "get us": timed(lambda i: db.get_product(ids[i]), ops),
+        "update us": timed(lambda i: db.update_product(ids[i], update), ops),
+        "page of 50 us": timed(lambda i: db.query_products(limit=50, after_id=ids[i]), ops),
+        "category page us": timed(
+            lambda i: db.query_products(limit=50, category=f"Category {i % 50}"), ops
+        ),
+        "price range us": timed(
+            lambda i: db.query_products(
+                limit=50, min_price=i % 500, max_price=i % 500 + 10, sort_by="price"
+            ),
+            ops,
+        ),
+        "search us": timed(lambda i: db.search_products(f"number {ids[i]}"), ops // 10 or 1),
+    })
+    if hasattr(db, "close"):
+        db.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--ops", type=int, default=1_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        sqlite_path = os.path.join(tmpdir, "bench.db")
+        results = {
+            backend: run(backend, args.rows, args.ops, sqlite_path)
+            for backend in ("memory", "sqlite")
+        }
+
+    print(f"{'operation':>18} {'memory':>12} {'sqlite':>12}")
+    for operation in results["memory"]:
+        print(
+            f"{operation:>18} {results['memory'][operation]:>12.1f}"
+            f" {results['sqlite'][operation]:>12.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""Benchmark write-ahead log throughput and recovery time.
+
+Usage:
+    python -m bench.wal --rows 1000000 --threads 1 8 32
+
+Reports sustained single-row create throughput with fsync enabled for each
+thread count, with the number of records each group commit covered, then
+the time to recover ``--rows`` products from the log alone and from a
+snapshot.
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+from typing import Dict
+
+from database import InMemoryDatabase
+from models import ProductCreate
+
+ITEM = ProductCreate(
+    name="Logged product",
+    description="Write-ahead log benchmark product",
+    price=9.99,
+    category="Bench",
+    tags=["wal"],
+)
+
+
+def write_throughput(threads: int, seconds: float, fsync: bool) -> Dict[str, float]:
+    """Create products from ``threads`` threads for ``seconds``."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        db = InMemoryDatabase(wal_dir=tmpdir, fsync=fsync, snapshot_every=10**9)
+        deadline = time.monotonic() + seconds
+        counts = [0] * threads
+
+        def writer(slot: int):
+            while time.monotonic() < deadline:
+                db.create_product(ITEM)
+                counts[slot] += 1
+
+        workers = [threading.Thread(target=writer, args=(i,)) for i in range(threads)]
+        flushes = db._wal.flushes
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        total = sum(counts)
+        flushes = db._wal.flushes - flushes
+        db.close()
+    return {"writes/s": total / seconds, "records/fsync": total / max(flushes, 1)}
+
+
+def recovery(rows: int) -> Dict[str, float]:
+    """Time recovering ``rows`` products from the log, then from a snapshot."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        db = InMemoryDatabase(wal_dir=tmpdir, snapshot_every=10**9)
+        db.clear()
+        start = time.perf_counter()
+        for offset in range(0, rows, 10_000):
+            db.create_products([ITEM] * min(10_000, rows - offset))
+        load = time.perf_counter() - start
+        db.close()
+
+        start = time.perf_counter()
+        db = InMemoryDatabase(wal_dir=tmpdir, snapshot_every=10**9)
+        from_log = time.perf_counter() - start
+        start = time.perf_counter()
+        db.snapshot()
+        snapshot = time.perf_counter() - start
+        db.close()
+
+        start = time.perf_counter()
+        db = InMemoryDatabase(wal_dir=tmpdir, snapshot_every=10**9)
+        from_snapshot = time.perf_counter() - start
+        assert len(db.products) == rows
+        log_bytes = os.path.getsize(os.path.join(tmpdir, "snapshot"))
+        db.close()
+    return {
+        "bulk load rows/s": rows / load,
+        "recover from log s": from_log,
+        "write snapshot s": snapshot,
+        "recover from snapshot s": from_snapshot,
+        "snapshot MiB": log_bytes / 2**20,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--seconds", type=float, default=5.0)
+    args = parser.parse_args()
+
+    print(f"{'threads':>8} {'fsync':>6} {'writes/s':>10} {'records/fsync':>14}")
+    for fsync in (True, False):
+        for threads in args.threads:
+            result = write_throughput(threads, args.seconds, fsync)
+            print(
+                f"{threads:>8} {'on' if fsync else 'off':>6}"
+                f" {result['writes/s']:>10.0f} {result['records/fsync']:>14.1f}"
+            )
+
+    print()
+    for name, value in recovery(args.rows).items():
+        print(f"{name:>24} {value:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
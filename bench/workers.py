@@ -0,0 +1,130 @@
+"""Measure read throughput as the number of uvicorn workers grows.
+
+Usage:
+    python -m bench.workers --workers 1 2 4 --clients 8 --seconds 10
+
+Each run starts ``python main.py`` with ``CRUD_WORKERS=N`` on a fresh SQLite
+file, then drives it from ``--clients`` load-generating processes over
+keep-alive connections. Reports requests per second for each worker count.
+"""
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from typing import List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+READ_PATHS = [
+    "/products?limit=20",
+    "/products?category=Category%203&limit=20",
+    "/products/1",
+    "/users?limit=20",
+]
+
+
+def seed(port: int, rows: int) -> None:
+    """Bulk-create ``rows`` products through the API."""
+    conn = http.client.HTTPConnection("127.0.0.1", port)
+    for offset in range(0, rows, 1000):
+        body = json.dumps([
+            {
+                "name": f"Product {i}",
+                "description": f"Worker benchmark product {i}",
+                "price": float(i % 500),
+                "category": f"Category {i % 10}",
+            }
+            for i in range(offset, min(rows, offset + 1000))
+        ])
+        conn.request("POST", "/products/bulk", body, {"Content-Type": "application/json"})
+        conn.getresponse().read()
+    conn.close()
+
+
+def wait_until_ready(port: int, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            conn.request("GET", "/health")
+            if conn.getresponse().status == 200:
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"server on port {port} did not start")
+
+
+def client(port: int, seconds: float, start_at: float, results) -> None:
+    """Issue GETs round-robin over ``READ_PATHS`` until the deadline passes."""
+    conn = http.client.HTTPConnection("127.0.0.1", port)
+    while time.time() < start_at:
+        time.sleep(0.001)
+    deadline = time.monotonic() + seconds
+    count = 0
+    while time.monotonic() < deadline:
+        conn.request("GET", READ_PATHS[count % len(READ_PATHS)])
+        conn.getresponse().read()
+        count += 1
+    conn.close()
+    results.put(count)
+
+
+def run(workers: int, clients: int, seconds: float, rows: int, port: int) -> float:
+    """Return requests per second served by ``workers`` uvicorn processes."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        env = dict(
+            os.environ,
+            CRUD_STORAGE="sqlite",
+            CRUD_SQLITE_PATH=os.path.join(tmpdir, "bench.db"),
+            CRUD_WORKERS=str(workers),
+            CRUD_HOST="127.0.0.1",
+            CRUD_PORT=str(port),
+        )
+        server = subprocess.Popen(
+            [sys.executable, "main.py"], cwd=ROOT, env=env,
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        try:
+            wait_until_ready(port)
+            seed(port, rows)
+            results = multiprocessing.Queue()
+            start_at = time.time() + 0.5
+            procs = [
+                multiprocessing.Process(target=client, args=(port, seconds, start_at, results))
+                for _ in range(clients)
+            ]
+            for proc in procs:
+                proc.start()
+            total = sum(results.get() for _ in procs)
+            for proc in procs:
+                proc.join()
+            return total / seconds
+        finally:
+            server.terminate()
+            server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    print(f"{os.cpu_count()} cores, {args.clients} client processes")
+    print(f"{'workers':>8} {'req/s':>10} {'speedup':>8}")
+    baseline: List[float] = []
+    for workers in args.workers:
+        rps = run(workers, args.clients, args.seconds, args.rows, args.port)
+        baseline = baseline or [rps]
+        print(f"{workers:>8} {rps:>10.0f} {rps / baseline[0]:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
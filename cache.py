@@ -0,0 +1,173 @@
+"""Cache of encoded list responses, invalidated by database writes."""
+import threading
+from collections import OrderedDict
+from typing import Dict, Hashable, Optional, Set
+
+from fastapi import Response
+
+from compression import compress_async, variant_etag
+
+
+class CacheEntry:
+    """Encoded JSON body of one list response, plus its compressed variants.
+
+    Variants are keyed by Content-Encoding and built on first request by
+    ``ResponseCache.add_variant``, so a body is compressed about once per
+    encoding for as long as its collection version stays current.
+    """
+
+    __slots__ = ("collection", "version", "body", "headers", "variants")
+
+    def __init__(self, collection: str, version: int, body: bytes, headers: Dict[str, str]):
+        self.collection = collection
+        self.version = version
+        self.body = body
+        self.headers = headers
+        self.variants: Dict[str, bytes] = {}
+
+    @property
+    def size(self) -> int:
+        """Bytes held by the entry's bodies."""
+        return len(self.body) + sum(map(len, self.variants.values()))
+
+    def response(self, encoding: Optional[str]) -> Response:
+        """Build the response, compressed with ``encoding`` when that variant exists."""
+        headers = dict(self.headers, Vary="Accept-Encoding")
+        variant = self.variants.get(encoding) if encoding else None
+        if variant is not None:
+            headers["Content-Encoding"] = encoding
+            if "etag" in headers:
+                headers["etag"] = variant_etag(headers["etag"], encoding)
+            return Response(variant, media_type="application/json", headers=headers)
+        return Response(self.body, media_type="application/json", headers=headers)
+
+
+class ResponseCache:
+    """LRU cache of encoded responses bounded by a byte budget.
+
+    Entries remember the collection version they were built from. A lookup
+    only hits when that version is still current, and ``invalidate`` drops
+    a collection's entries as soon as it is written so they stop holding
+    budget.
+    """
+
+    def __init__(self, max_bytes: int, compress_min_bytes: int = 1024):
+        self.max_bytes = max_bytes
+        self.compress_min_bytes = compress_min_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._bytes = 0
+        self._entries: "OrderedDict[Hashable, CacheEntry]" = OrderedDict()
+        self._keys_by_collection: Dict[str, Set[Hashable]] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def get(self, key: Hashable, version: int) -> Optional[CacheEntry]:
+        """Return the entry for ``key`` if it was built at ``version``."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.version != version:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(
+        self,
+        key: Hashable,
+        collection: str,
+        version: int,
+        body: bytes,
+        headers: Dict[str, str],
+    ) -> CacheEntry:
+        """Store an encoded body and return its entry.
+
+        Entries that don't fit the budget are returned without being stored.
+        """
+        entry = CacheEntry(collection, version, body, headers)
+        if entry.size > self.max_bytes:
+            return entry
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = entry
+            self._keys_by_collection.setdefault(collection, set()).add(key)
+            self._bytes += entry.size
+            self._evict()
+        return entry
+
+    async def add_variant(
+        self, key: Hashable, entry: CacheEntry, encoding: Optional[str]
+    ) -> CacheEntry:
+        """Give ``entry`` its ``encoding`` variant if it is worth having and missing.
+
+        Large bodies are compressed in a worker thread. Two requests racing
+        for the same variant may both compress it; the first one is kept.
+        """
+        if not self._wants_variant(entry, encoding):
+            return entry
+        variant = await compress_async(entry.body, encoding)
+        with self._lock:
+            if self._entries.get(key) is entry and encoding not in entry.variants:
+                entry.variants[encoding] = variant
+                self._bytes += len(variant)
+                self._evict()
+            else:
+                entry.variants.setdefault(encoding, variant)
+        return entry
+
+    def _wants_variant(self, entry: CacheEntry, encoding: Optional[str]) -> bool:
+        return (
+            encoding is not None
+            and encoding not in entry.variants
+            and len(entry.body) >= self.compress_min_bytes
+        )
+
+    def _evict(self):
+        """Drop least recently used entries until within budget; the caller holds the lock."""
+        while self._bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def invalidate(self, collection: str):
+        """Drop every entry built from ``collection``."""
+        with self._lock:
+            for key in list(self._keys_by_collection.get(collection, ())):
+                self._remove(key)
+                self.invalidations += 1
+
+    def clear(self):
+        """Drop every entry and reset the counters."""
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_collection.clear()
+            self._bytes = 0
+            self.hits = self.misses = self.evictions = self.invalidations = 0
+
+    def stats(self) -> Dict[str, int]:
+        """Counters for tuning the cache size."""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+    def _remove(self, key: Hashable):
+        """Remove ``key``; the caller holds the lock."""
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
+        keys = self._keys_by_collection[entry.collection]
+        keys.discard(key)
+        if not keys:
+            del self._keys_by_collection[entry.collection]
@@ -0,0 +1,115 @@
+"""In-process feed of committed writes, for streaming to clients."""
+import asyncio
+import secrets
+import threading
+from typing import Callable, List, Optional, Set
+
+from storage import Change
+
+
+class StaleSequence(Exception):
+    """The events after a consumer's position have left the buffer, or never existed."""
+
+
+class FeedEvent:
+    """One write, numbered by its position in the feed."""
+
+    __slots__ = ("seq", "change", "_encode", "_data")
+
+    def __init__(self, seq: int, change: Change, encode: Callable[[Change], bytes]):
+        self.seq = seq
+        self.change = change
+        self._encode = encode
+        self._data: Optional[bytes] = None
+
+    @property
+    def data(self) -> bytes:
+        """The change encoded for clients, built on first use and shared by all of them."""
+        if self._data is None:
+            self._data = self._encode(self.change)
+        return self._data
+
+
+def _wake(waiter: asyncio.Future):
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+class ChangeFeed:
+    """Ring buffer of the most recent writes, numbered in commit order.
+
+    Subscribed to a database, it turns every ``Change`` into a ``FeedEvent``
+    with the next sequence number. Consumers read forward from the last
+    sequence number they saw. Publishing never waits on a consumer: one that
+    falls more than ``capacity`` events behind gets ``StaleSequence`` and
+    has to resync from a fresh read of the data.
+
+    Sequence numbers restart with the process. ``epoch`` tells positions
+    from different runs apart, so a client resuming across a restart is
+    resynced rather than handed the wrong events.
+    """
+
+    def __init__(self, capacity: int, encode: Callable[[Change], bytes]):
+        self.capacity = capacity
+        self.epoch = secrets.token_hex(4)
+        self._encode = encode
+        self._ring: List[Optional[FeedEvent]] = [None] * capacity
+        self._last_seq = 0
+        self._lock = threading.Lock()
+        self._waiters: Set[asyncio.Future] = set()
+
+    @property
+    def last_seq(self) -> int:
+        """Sequence number of the latest event, 0 before the first."""
+        return self._last_seq
+
+    def position(self, seq: int) -> str:
+        """Opaque resume token for ``seq``, e.g. an SSE event id."""
+        return f"{self.epoch}-{seq}"
+
+    def parse_position(self, token: str) -> Optional[int]:
+        """Sequence number in a token from ``position``, or ``None`` if from another run."""
+        epoch, _, seq = token.strip().partition("-")
+        if epoch != self.epoch or not seq.isdigit():
+            return None
+        return int(seq)
+
+    def publish(self, change: Change):
+        """Append a change; matches the ``subscribe`` callback signature."""
+        with self._lock:
+            self._last_seq += 1
+            self._ring[self._last_seq % self.capacity] = FeedEvent(
+                self._last_seq, change, self._encode
+            )
+            waiters, self._waiters = self._waiters, set()
+        for waiter in waiters:
+            waiter.get_loop().call_soon_threadsafe(_wake, waiter)
+
+    def read(self, after_seq: int, limit: int) -> List[FeedEvent]:
+        """Get up to ``limit`` events following ``after_seq``, oldest first.
+
+        Raises ``StaleSequence`` if some of them were already overwritten,
+        or if ``after_seq`` is ahead of the feed.
+        """
+        with self._lock:
+            last_seq = self._last_seq
+            if after_seq > last_seq or after_seq < last_seq - self.capacity:
+                raise StaleSequence(after_seq)
+            end = min(last_seq, after_seq + limit)
+            return [self._ring[seq % self.capacity] for seq in range(after_seq + 1, end + 1)]
+
+    async def wait(self, after_seq: int, timeout: float) -> bool:
+        """Wait up to ``timeout`` seconds for an event after ``after_seq``."""
+        with self._lock:
+            if self._last_seq > after_seq:
+                return True
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.add(waiter)
+        try:
+            await asyncio.wait_for(waiter, timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            with self._lock:
+                self._waiters.discard(waiter)
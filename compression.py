@@ -0,0 +1,255 @@
+"""Content-Encoding negotiation and response compression.
+
+gzip is always available. Brotli (``pip install brotli``) and Zstandard
+(``pip install zstandard``) are offered when their packages are installed.
+"""
+import gzip
+import zlib
+from typing import Callable, Dict, List, Optional, Tuple
+
+from anyio import to_thread
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Levels that keep compression well under the cost of building the body.
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+ZSTD_LEVEL = 3
+
+# Media types worth compressing. Event streams are left alone so that each
+# event reaches the client as soon as it is sent.
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/plain", "text/html")
+
+# Bodies at least this large are compressed in a worker thread rather than
+# on the event loop; below it the hand-off costs more than it saves.
+OFFLOAD_MIN_BYTES = 64 * 1024
+
+
+def _gzip(body: bytes) -> bytes:
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+COMPRESSORS: Dict[str, Callable[[bytes], bytes]] = {"gzip": _gzip}
+if brotli is not None:
+    COMPRESSORS["br"] = lambda body: brotli.compress(body, quality=BROTLI_QUALITY)
+if zstandard is not None:
+    # Compressor objects are not thread-safe, so each call gets its own.
+    COMPRESSORS["zstd"] = lambda body: zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(body)
+
+# Used when the client rates several encodings equally: zstd compresses about
+# as well as brotli at this level for a fraction of the CPU, and both beat gzip.
+PREFERENCE: List[str] = [name for name in ("zstd", "br", "gzip") if name in COMPRESSORS]
+
+
+def variant_etag(etag: str, encoding: str) -> str:
+    """The ETag of ``etag``'s representation compressed with ``encoding``.
+
+    Each encoding gets its own strong tag, ``"v12"`` becoming ``"v12-gzip"``,
+    since the bytes differ from the identity body's.
+    """
+    return f'{etag[:-1]}-{encoding}"' if etag.endswith('"') else etag
+
+
+def base_etag(tag: str) -> str:
+    """Undo ``variant_etag``, so a tag from any representation names its resource."""
+    for encoding in ("gzip", "br", "zstd"):
+        suffix = f'-{encoding}"'
+        if tag.endswith(suffix):
+            return tag[:-len(suffix)] + '"'
+    return tag
+
+
+def negotiate(accept_encoding: Optional[str]) -> Optional[str]:
+    """Pick the encoding to answer an Accept-Encoding header with, or ``None`` for identity."""
+    if not accept_encoding:
+        return None
+    qualities: Dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        name, *params = item.split(";")
+        quality = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[name.strip().lower()] = quality
+    best, best_quality = None, 0.0
+    for name in PREFERENCE:
+        quality = qualities.get(name, qualities.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = name, quality
+    return best
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    """Compress a whole body with ``encoding``."""
+    return COMPRESSORS[encoding](body)
+
+
+async def compress_async(body: bytes, encoding: str) -> bytes:
+    """Compress a whole body with ``encoding``, off the event loop if it is large."""
+    return await _run(COMPRESSORS[encoding], body)
+
+
+async def _run(compressor: Callable[[bytes], bytes], body: bytes) -> bytes:
+    if len(body) >= OFFLOAD_MIN_BYTES:
+        return await to_thread.run_sync(compressor, body)
+    return compressor(body)
+
+
+class StreamCompressor:
+    """Compress a streamed body chunk by chunk, flushing after each one.
+
+    Flushing costs a few bytes per chunk but lets the client decode every
+    chunk as it arrives, which keeps streamed exports incremental.
+    """
+
+    def __init__(self, encoding: str):
+        if encoding == "gzip":
+            compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+            self._compress = lambda chunk: compressor.compress(chunk) + compressor.flush(
+                zlib.Z_SYNC_FLUSH
+            )
+            self._finish = compressor.flush
+        elif encoding == "br":
+            compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+            self._compress = lambda chunk: compressor.process(chunk) + compressor.flush()
+            self._finish = compressor.finish
+        else:
+            compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+            self._compress = lambda chunk: compressor.compress(chunk) + compressor.flush(
+                zstandard.COMPRESSOBJ_FLUSH_BLOCK
+            )
+            self._finish = compressor.flush
+
+    def compress(self, chunk: bytes) -> bytes:
+        return self._compress(chunk)
+
+    async def compress_async(self, chunk: bytes) -> bytes:
+        """``compress``, off the event loop if the chunk is large.
+
+        Chunks of one stream must still be compressed one at a time, in order.
+        """
+        return await _run(self._compress, chunk)
+
+    def finish(self) -> bytes:
+        return self._finish()
+
+
+def _header(headers: List[Tuple[bytes, bytes]], name: bytes) -> Optional[bytes]:
+    for key, value in headers:
+        if key.lower() == name:
+            return value
+    return None
+
+
+class CompressionMiddleware:
+    """ASGI middleware compressing responses the client can decode.
+
+    Responses that already carry a Content-Encoding, such as precompressed
+    cache entries, pass through untouched, as do bodies smaller than
+    ``minimum_size`` and media types outside ``COMPRESSIBLE_TYPES``.
+    Streamed bodies are compressed incrementally, and an ETag is swapped
+    for the compressed variant's. Bodies and chunks of at
+    least ``OFFLOAD_MIN_BYTES`` are compressed in a worker thread.
+    """
+
+    def __init__(self, app, minimum_size: int = 1024):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        accept_encoding = _header(scope["headers"], b"accept-encoding")
+        encoding = negotiate(accept_encoding.decode("latin-1")) if accept_encoding else None
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        await self.app(scope, receive, _CompressingSend(send, encoding, self.minimum_size))
+
+
+class _CompressingSend:
+    """The ``send`` callable handed to the app for one compressible request."""
+
+    def __init__(self, send, encoding: str, minimum_size: int):
+        self._send = send
+        self._encoding = encoding
+        self._minimum_size = minimum_size
+        self._start: Optional[dict] = None
+        self._stream: Optional[StreamCompressor] = None
+        self._passthrough = False
+
+    async def __call__(self, message: dict):
+        if message["type"] == "http.response.start":
+            self._start = message
+            return
+        if message["type"] != "http.response.body" or self._passthrough:
+            await self._send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if self._stream is not None:
+            chunk = await self._stream.compress_async(body) if body else b""
+            if not more_body:
+                chunk += self._stream.finish()
+            await self._send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+            return
+
+        start, self._start = self._start, None
+        headers = [(key, value) for key, value in start["headers"]]
+        if not self._should_compress(start["status"], headers, len(body), more_body):
+            self._passthrough = True
+            await self._send(start)
+            await self._send(message)
+            return
+
+        headers = [(key, value) for key, value in headers if key.lower() != b"content-length"]
+        headers.append((b"content-encoding", self._encoding.encode()))
+        headers = [
+            (key, variant_etag(value.decode("latin-1"), self._encoding).encode("latin-1"))
+            if key.lower() == b"etag" else (key, value)
+            for key, value in headers
+        ]
+        vary = _header(headers, b"vary")
+        if vary is None:
+            headers.append((b"vary", b"Accept-Encoding"))
+        elif b"accept-encoding" not in vary.lower():
+            headers = [(key, value) for key, value in headers if key.lower() != b"vary"]
+            headers.append((b"vary", vary + b", Accept-Encoding"))
+
+        if more_body:
+            self._stream = StreamCompressor(self._encoding)
+            await self._send(dict(start, headers=headers))
+            await self._send({
+                "type": "http.response.body",
+                "body": await self._stream.compress_async(body) if body else b"",
+                "more_body": True,
+            })
+            return
+        compressed = await compress_async(body, self._encoding)
+        headers.append((b"content-length", str(len(compressed)).encode()))
+        await self._send(dict(start, headers=headers))
+        await self._send({"type": "http.response.body", "body": compressed})
+
+    def _should_compress(
+        self, status: int, headers: List[Tuple[bytes, bytes]], size: int, more_body: bool
+    ) -> bool:
+        if status < 200 or status in (204, 304) or _header(headers, b"content-encoding"):
+            return False
+        media_type = (_header(headers, b"content-type") or b"").split(b";")[0].decode("latin-1")
+        if media_type.strip().lower() not in COMPRESSIBLE_TYPES:
+            return False
+        return more_body or size >= self._minimum_size
@@ -0,0 +1,86 @@
+"""Runtime settings read from environment variables."""
+import os
+from dataclasses import dataclass, field
+from typing import Optional
+
+
+def _env_flag(name: str, default: bool = False) -> bool:
+    """Read a boolean flag such as ``CRUD_FAST_JSON=1`` from the environment."""
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def _env_int(name: str, default: int) -> int:
+    """Read an integer such as ``CRUD_RESPONSE_CACHE_BYTES=0`` from the environment."""
+    value = os.environ.get(name)
+    return default if value is None else int(value)
+
+
+def _env_float(name: str, default: float) -> float:
+    """Read a number such as ``CRUD_PROFILE_SAMPLE_RATE=0.01`` from the environment."""
+    value = os.environ.get(name)
+    return default if value is None else float(value)
+
+
+@dataclass
+class Settings:
+    """Application settings; each field maps to a ``CRUD_*`` variable."""
+    fast_json: bool = field(default_factory=lambda: _env_flag("CRUD_FAST_JSON"))
+    response_cache_bytes: int = field(
+        default_factory=lambda: _env_int("CRUD_RESPONSE_CACHE_BYTES", 64 * 1024 * 1024)
+    )
+    compress_min_bytes: int = field(
+        default_factory=lambda: _env_int("CRUD_COMPRESS_MIN_BYTES", 1024)
+    )
+    storage_backend: str = field(
+        default_factory=lambda: os.environ.get("CRUD_STORAGE", "memory")
+    )
+    sqlite_path: str = field(
+        default_factory=lambda: os.environ.get("CRUD_SQLITE_PATH", "crud.db")
+    )
+    seed_sample_data: bool = field(
+        default_factory=lambda: _env_flag("CRUD_SEED_SAMPLE_DATA")
+    )
+    snapshot_path: Optional[str] = field(
+        default_factory=lambda: os.environ.get("CRUD_SNAPSHOT_PATH") or None
+    )
+    wal_dir: Optional[str] = field(
+        default_factory=lambda: os.environ.get("CRUD_WAL_DIR") or None
+    )
+    wal_fsync: bool = field(default_factory=lambda: _env_flag("CRUD_WAL_FSYNC", True))
+    wal_snapshot_every: int = field(
+        default_factory=lambda: _env_int("CRUD_WAL_SNAPSHOT_EVERY", 100_000)
+    )
+    change_feed_size: int = field(
+        default_factory=lambda: _env_int("CRUD_CHANGE_FEED_SIZE", 10_000)
+    )
+    sync_tombstones: int = field(
+        default_factory=lambda: _env_int("CRUD_SYNC_TOMBSTONES", 10_000)
+    )
+    scrypt_n: int = field(default_factory=lambda: _env_int("CRUD_SCRYPT_N", 2 ** 14))
+    scrypt_r: int = field(default_factory=lambda: _env_int("CRUD_SCRYPT_R", 8))
+    scrypt_p: int = field(default_factory=lambda: _env_int("CRUD_SCRYPT_P", 1))
+    password_workers: int = field(
+        default_factory=lambda: _env_int("CRUD_PASSWORD_WORKERS", 0)
+    )
+    password_queue: int = field(default_factory=lambda: _env_int("CRUD_PASSWORD_QUEUE", 0))
+    metrics: bool = field(default_factory=lambda: _env_flag("CRUD_METRICS", True))
+    profile_header: bool = field(default_factory=lambda: _env_flag("CRUD_PROFILE_HEADER"))
+    profile_sample_rate: float = field(
+        default_factory=lambda: _env_float("CRUD_PROFILE_SAMPLE_RATE", 0.0)
+    )
+    profile_buffer: int = field(default_factory=lambda: _env_int("CRUD_PROFILE_BUFFER", 20))
+    slow_request_ms: float = field(
+        default_factory=lambda: _env_float("CRUD_SLOW_REQUEST_MS", 0.0)
+    )
+    admin_token: Optional[str] = field(
+        default_factory=lambda: os.environ.get("CRUD_ADMIN_TOKEN") or None
+    )
+    host: str = field(default_factory=lambda: os.environ.get("CRUD_HOST", "0.0.0.0"))
+    port: int = field(default_factory=lambda: _env_int("CRUD_PORT", 8000))
+    workers: int = field(default_factory=lambda: _env_int("CRUD_WORKERS", 1))
+
+
+settings = Settings()
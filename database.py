@@ -1,136 +1,1092 @@
 """Database module for in-memory product storage."""
-from typing import List, Optional
-from datetime import datetime
+import gc
+import heapq
+import json
+import os
+import threading
+from collections import deque
+from itertools import islice
+from operator import attrgetter
+from typing import Callable, Deque, Dict, Iterable, Iterator, List, Optional, Set, Tuple, Union
+from contextlib import contextmanager
+from datetime import datetime, timedelta
 
+from pydantic import BaseModel
+from sortedcontainers import SortedList
+
+from config import settings
+from indexes import HashIndex, SortedIndex, intersect
+from locks import ReadWriteLock
 from models import Product, ProductCreate, ProductUpdate, User, UserCreate, UserUpdate
+from records import ProductRecord, UserRecord
+from search import InvertedIndex
+from snapshot import Snapshot, write_snapshot
+from storage import (
+    SAMPLE_PRODUCTS, Change, Changes, ChangesExpired, DuplicateEmail, Page, StorageBackend,
+    VersionConflict, normalize_email, take_page,
+)
+from wal import WriteAheadLog, encode_change
+
+
+def _price_filter(
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+) -> Optional[Callable[[ProductRecord], bool]]:
+    """Build a predicate matching products inside the given price range."""
+    if min_price is not None and max_price is not None:
+        return lambda p: min_price <= p.price <= max_price
+    if min_price is not None:
+        return lambda p: p.price >= min_price
+    if max_price is not None:
+        return lambda p: p.price <= max_price
+    return None
+
+
+def _search_text(product: ProductRecord) -> str:
+    """Text the full-text index holds for a product."""
+    return f"{product.name} {product.description}"
+
+
+EPOCH = datetime(1970, 1, 1)
+MICROSECOND = timedelta(microseconds=1)
+
+
+def _to_micros(moment: datetime) -> int:
+    """Encode a naive timestamp as whole microseconds for a snapshot column."""
+    return (moment - EPOCH) // MICROSECOND
+
+
+def _from_micros(micros: int) -> datetime:
+    return EPOCH + timedelta(microseconds=micros)
+
+
+def _set_fields(update_data: BaseModel) -> dict:
+    """The fields an update sets, skipping those explicitly set to ``None``.
+
+    Every stored field is required, so a null would leave a row that fails
+    validation; SQLite's ``_column_values`` skips them the same way.
+    """
+    return {
+        field: value for field, value in update_data.model_dump(exclude_unset=True).items()
+        if value is not None
+    }
+
+
+def _materialize(page: Page) -> Page:
+    """Turn a page of stored records into a page of models."""
+    return Page([record.to_model() for record in page.items], page.next_after_id)
+
+
+@contextmanager
+def _gc_paused():
+    """Suspend the cyclic garbage collector while allocating many objects.
+
+    A bulk load creates millions of objects and none of them are garbage,
+    yet each batch of allocations would trigger another collection pass.
+    """
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
 
 
 class InMemoryDatabase:
-    """In-memory database for storing and managing products and users."""
+    """In-memory ``StorageBackend`` for storing and managing products and users.
 
-    def __init__(self):
-        self.products: List[Product] = []
-        self.users: List[User] = []
-        self.next_product_id = 1
-        self.next_user_id = 1
-        self._init_sample_data()
+    Rows are kept in dicts keyed by id. Dicts preserve insertion order, and
+    ids are allocated monotonically, so iterating a collection yields rows in
+    id order while point reads, updates and deletes stay O(1). Users are
+    also hashed by normalized email, which keeps emails unique and makes
+    ``get_user_by_email`` a single dict lookup. Rows are held
+    as compact ``ProductRecord``/``UserRecord`` objects and every method
+    returns fresh ``Product``/``User`` models built from them.
 
-    def _init_sample_data(self):
-        """Initialize the database with sample product data."""
-        sample_products = [
-            ProductCreate(
-                name="Wireless Headphones",
-                description="High-quality wireless headphones with noise cancellation",
-                price=199.99,
-                category="Electronics",
-                tags=["audio", "wireless", "premium"]
-            ),
-            ProductCreate(
-                name="Coffee Maker",
-                description="Programmable coffee maker with built-in grinder",
-                price=89.99,
-                category="Appliances",
-                tags=["kitchen", "coffee", "automatic"]
-            ),
-            ProductCreate(
-                name="Laptop Stand",
-                description="Adjustable aluminum laptop stand for ergonomic work",
-                price=45.99,
-                category="Accessories",
-                tags=["ergonomic", "aluminum", "adjustable"]
+    The database is safe to share between threads. Reads hold a
+    ``ReadWriteLock`` shared and see a consistent state; writes hold it
+    exclusively for one row at a time, so ids are allocated atomically and
+    a bulk write lets reads in between its rows. Waiting for the write-ahead
+    log happens after the lock is released, which is what lets concurrent
+    writers share a group commit.
+
+    With ``wal_dir`` set, every write is appended to a ``WriteAheadLog`` and
+    made durable before the write method returns. The state is rebuilt from
+    the latest snapshot plus the log tail on startup, and a new snapshot is
+    taken once ``snapshot_every`` records have gone into the current segment.
+
+    The database starts empty; ``seed_sample_data`` fills a fresh one.
+    """
+
+    # Plain dict lookups, taken without the lock.
+    inline_reads = frozenset(
+        {"collection_version", "collection_size", "product_version", "user_version"}
+    )
+
+    def __init__(
+        self,
+        wal_dir: Optional[str] = None,
+        fsync: bool = True,
+        snapshot_every: int = 100_000,
+        tombstone_limit: int = 10_000,
+    ):
+        self.versions: Dict[str, int] = {"products": 0, "users": 0}
+        # Per collection: every row and tombstone ordered by the version that
+        # last wrote it, the reverse lookup, and the deletes still remembered.
+        self._changes: Dict[str, SortedIndex] = {}
+        self._changed_at: Dict[str, Dict[int, int]] = {}
+        self._tombstones: Dict[str, Dict[int, int]] = {}
+        # Oldest version that ``changes_since`` can still answer from.
+        self._change_horizons = {"products": 0, "users": 0}
+        self._tombstone_limit = tombstone_limit
+        self._subscribers: List[Callable[[Change], None]] = []
+        # Writes waiting for their log record to be durable, in version order,
+        # each with the log sequence number that has to be reached first.
+        self._unpublished: Deque[Tuple[int, Change]] = deque()
+        self._publish_lock = threading.Lock()
+        self._wal: Optional[WriteAheadLog] = None
+        self._snapshot_every = snapshot_every
+        self._snapshot_lock = threading.Lock()
+        self._lock = ReadWriteLock()
+        self.clear()
+        self._fresh = True
+        if wal_dir is not None:
+            wal = WriteAheadLog(wal_dir, fsync)
+            self._fresh = not self._recover(wal)
+            self._wal = wal
+
+    @property
+    def fresh(self) -> bool:
+        """Whether nothing was recovered or loaded when the database opened."""
+        return self._fresh
+
+    def seed_sample_data(self):
+        """Load the sample products, but only into a fresh database."""
+        with self._lock.write():
+            fresh, self._fresh = self._fresh, False
+        if fresh:
+            self._init_sample_data()
+
+    def close(self):
+        """Flush and close the write-ahead log, if there is one."""
+        if self._wal is not None:
+            self._wal.close()
+
+    def subscribe(self, callback: Callable[[Change], None]):
+        """Call ``callback`` with a ``Change`` after every committed write.
+
+        With a write-ahead log, a write is committed once its record is
+        durable, so subscribers never hear of a write that a crash could
+        lose. Callbacks run in the writing thread, in version order, without
+        the database lock held.
+        """
+        self._subscribers.append(callback)
+
+    def clear(self):
+        """Remove every row and reset id allocation.
+
+        Collection versions keep counting up so that clients holding a
+        version from before the reset never see it reused.
+        """
+        with self._lock.write():
+            self._row_versions: Dict[str, Dict[int, int]] = {}
+            for collection in self.versions:
+                self._reset(collection)
+                self._record_write(collection, "clear")
+        self._sync()
+
+    def _reset(self, collection: str):
+        """Empty one collection and its indexes."""
+        self._row_versions[collection] = {}
+        self._changes[collection] = SortedIndex()
+        self._changed_at[collection] = {}
+        self._tombstones[collection] = {}
+        if collection == "products":
+            self.products: Dict[int, ProductRecord] = {}
+            self._product_ids = SortedList()
+            self._category_index = HashIndex()
+            self._tag_index = HashIndex()
+            self._in_stock_index = HashIndex()
+            self._price_index = SortedIndex()
+            self._search_index = InvertedIndex()
+            self.next_product_id = 1
+        else:
+            self.users: Dict[int, UserRecord] = {}
+            self._user_ids = SortedList()
+            self._email_index: Dict[str, int] = {}
+            self.next_user_id = 1
+
+    def _record_write(
+        self,
+        collection: str,
+        op: str,
+        row_id: Optional[int] = None,
+        row: Optional[BaseModel] = None,
+    ):
+        """Advance the collection and row versions, and queue the change for subscribers.
+
+        Called with the write lock held, so records reach the log, and
+        changes the queue, in the order the writes were applied. ``_sync``
+        publishes them once they are durable.
+        """
+        self.versions[collection] += 1
+        row_versions = self._row_versions[collection]
+        if op == "delete":
+            row_versions.pop(row_id, None)
+        elif row_id is not None:
+            row_versions[row_id] = row_versions.get(row_id, 0) + 1
+        change = Change(collection, op, row_id, row, self.versions[collection])
+        self._track_change(collection, op, row_id, change.version)
+        position = 0
+        if self._wal is not None:
+            position = self._wal.append(encode_change(change, row_versions.get(row_id)))
+        self._unpublished.append((position, change))
+
+    def _track_change(self, collection: str, op: str, row_id: Optional[int], version: int):
+        """Index a write by version for ``changes_since``, keeping a tombstone for deletes."""
+        if op == "clear":
+            self._change_horizons[collection] = version
+            return
+        changes = self._changes[collection]
+        changed_at = self._changed_at[collection]
+        previous = changed_at.get(row_id)
+        if previous is not None:
+            changes.remove(previous, row_id)
+        changes.add(version, row_id)
+        changed_at[row_id] = version
+        if op != "delete":
+            return
+        tombstones = self._tombstones[collection]
+        tombstones[row_id] = version
+        if len(tombstones) > self._tombstone_limit:
+            # Ids are never reused, so insertion order is version order.
+            oldest_id = next(iter(tombstones))
+            oldest_version = tombstones.pop(oldest_id)
+            changes.remove(oldest_version, oldest_id)
+            del changed_at[oldest_id]
+            self._change_horizons[collection] = oldest_version
+
+    def _sync(self):
+        """Wait until the writes made so far are durable, snapshotting when due.
+
+        Writers call this once per public write method, so a bulk call costs
+        one group commit rather than one per row.
+        """
+        if self._wal is None:
+            self._publish(0)
+            return
+        self._wal.commit()
+        self._publish(self._wal.durable)
+        if self._wal.records_in_segment >= self._snapshot_every:
+            self.snapshot()
+
+    def _publish(self, durable: int):
+        """Notify subscribers of queued changes whose log record is at most ``durable``.
+
+        Whichever writer gets here first publishes for everyone whose record
+        its commit covered, which keeps the changes in version order.
+        """
+        with self._publish_lock:
+            while self._unpublished and self._unpublished[0][0] <= durable:
+                _, change = self._unpublished.popleft()
+                for callback in self._subscribers:
+                    callback(change)
+
+    def snapshot(self):
+        """Write every row to a new snapshot and drop the log it replaces.
+
+        The log moves to a fresh segment first, so writes made while the
+        snapshot is being written are kept in the log and replayed over it.
+        """
+        if self._wal is None or not self._snapshot_lock.acquire(blocking=False):
+            return
+        try:
+            # Reads hold off writers, so the rows copied match the log position.
+            with self._lock.read():
+                first_segment = self._wal.rotate()
+                meta, tables = self._snapshot_tables({"first_segment": first_segment})
+            write_snapshot(self._wal.snapshot_path, meta, tables)
+            self._wal.remove_segments_before(first_segment)
+        finally:
+            self._snapshot_lock.release()
+
+    def save_snapshot(self, path: str, meta: Optional[dict] = None):
+        """Write every row to a columnar snapshot file at ``path``."""
+        with self._lock.read():
+            meta, tables = self._snapshot_tables(meta)
+        write_snapshot(path, meta, tables)
+
+    def _snapshot_tables(self, meta: Optional[dict]) -> Tuple[dict, dict]:
+        """Copy every row into snapshot columns, with the metadata to go with them."""
+        products = list(self.products.values())
+        users = list(self.users.values())
+        product_versions = self._row_versions["products"]
+        user_versions = self._row_versions["users"]
+        product_changes = self._changed_at["products"]
+        user_changes = self._changed_at["users"]
+        meta = dict(
+            meta or {},
+            versions=dict(self.versions),
+            next_ids={"products": self.next_product_id, "users": self.next_user_id},
+            change_horizons=dict(self._change_horizons),
+            tombstones={c: list(tombstones.items()) for c, tombstones in self._tombstones.items()},
+        )
+        return meta, {
+            "products": {
+                "id": ("q", [p.id for p in products]),
+                "name": ("s", [p.name for p in products]),
+                "description": ("s", [p.description for p in products]),
+                "price": ("d", [p.price for p in products]),
+                "category": ("s", [p.category for p in products]),
+                "tags": ("l", [p.tags for p in products]),
+                "in_stock": ("B", [p.in_stock for p in products]),
+                "created_at": ("q", [_to_micros(p.created_at) for p in products]),
+                "version": ("q", [product_versions.get(p.id, 1) for p in products]),
+                "changed": ("q", [product_changes.get(p.id, 0) for p in products]),
+            },
+            "users": {
+                "id": ("q", [u.id for u in users]),
+                "name": ("s", [u.name for u in users]),
+                "email": ("s", [u.email for u in users]),
+                "password": ("s", [u.password for u in users]),
+                "created_at": ("q", [_to_micros(u.created_at) for u in users]),
+                "updated_at": ("q", [_to_micros(u.updated_at) for u in users]),
+                "version": ("q", [user_versions.get(u.id, 1) for u in users]),
+                "changed": ("q", [user_changes.get(u.id, 0) for u in users]),
+            },
+        }
+
+    def load_snapshot(self, path: str) -> dict:
+        """Replace every row with the contents of a snapshot and return its metadata.
+
+        Rows are trusted as written by ``save_snapshot``: they are built
+        without validation and the secondary indexes are bulk loaded, while
+        the full-text index is rebuilt on the first search. When logging,
+        a new snapshot is taken so the loaded rows are durable.
+        """
+        with self._lock.write(), _gc_paused():
+            meta = self._restore_snapshot(path)
+        self._fresh = False
+        if self._wal is not None:
+            self.snapshot()
+        return meta
+
+    def _restore_snapshot(self, path: str) -> dict:
+        with Snapshot(path) as snapshot:
+            products = {
+                name: snapshot.column("products", name)
+                for name in ("id", "name", "description", "price", "category",
+                             "tags", "in_stock", "created_at", "version")
+            }
+            users = {
+                name: snapshot.column("users", name)
+                for name in ("id", "name", "email", "password",
+                             "created_at", "updated_at", "version")
+            }
+            changed = {
+                table: snapshot.column(table, "changed")
+                if snapshot.has_column(table, "changed") else [0] * snapshot.rows(table)
+                for table in ("products", "users")
+            }
+            meta = snapshot.meta
+
+        for collection in self.versions:
+            self._reset(collection)
+        product_ids = products["id"]
+        product_versions = products.pop("version")
+        products["in_stock"] = list(map(bool, products["in_stock"]))
+        products["created_at"] = list(map(_from_micros, products["created_at"]))
+        self.products = {
+            record.id: record
+            for record in map(ProductRecord, *(products[name] for name in ProductRecord.__slots__))
+        }
+        self._product_ids = SortedList(product_ids)
+        for record in self.products.values():
+            self._category_index.add(record.category, record.id)
+            self._in_stock_index.add(record.in_stock, record.id)
+            for tag in record.tags:
+                self._tag_index.add(tag, record.id)
+        self._price_index.update(zip(products["price"], product_ids))
+        self._search_index = None
+
+        user_ids = users["id"]
+        user_versions = users.pop("version")
+        for key in ("created_at", "updated_at"):
+            users[key] = list(map(_from_micros, users[key]))
+        self.users = {
+            record.id: record
+            for record in map(UserRecord, *(users[name] for name in UserRecord.__slots__))
+        }
+        self._user_ids = SortedList(user_ids)
+        for record in self.users.values():
+            self._index_email(record)
+
+        self._row_versions = {
+            "products": dict(zip(product_ids, product_versions)),
+            "users": dict(zip(user_ids, user_versions)),
+        }
+        for collection, version in meta["versions"].items():
+            self.versions[collection] = max(self.versions[collection], version)
+        self.next_product_id = meta["next_ids"]["products"]
+        self.next_user_id = meta["next_ids"]["users"]
+
+        # Snapshots from before change tracking carry no history to sync from.
+        horizons = meta.get("change_horizons", meta["versions"])
+        for collection, row_ids in (("products", product_ids), ("users", user_ids)):
+            tombstones = dict(meta.get("tombstones", {}).get(collection, []))
+            self._tombstones[collection] = tombstones
+            self._changed_at[collection] = dict(zip(row_ids, changed[collection]))
+            self._changed_at[collection].update(tombstones)
+            self._changes[collection].update(
+                (version, row_id) for row_id, version in self._changed_at[collection].items()
             )
-        ]
+            self._change_horizons[collection] = horizons[collection]
+        return meta
+
+    def _recover(self, wal: WriteAheadLog) -> bool:
+        """Rebuild the state from ``wal``; return whether there was any to rebuild."""
+        recovered = False
+        first_segment = 1
+        if os.path.exists(wal.snapshot_path):
+            first_segment = self.load_snapshot(wal.snapshot_path)["first_segment"]
+            recovered = True
+        for record in wal.replay(first_segment):
+            self._apply(json.loads(record))
+            recovered = True
+        return recovered
+
+    def _apply(self, record: list):
+        """Replay one log record without logging or notifying it again."""
+        collection, op, row_id, row_version, version, row = record
+        self.versions[collection] = max(self.versions[collection], version)
+        if op == "clear":
+            self._reset(collection)
+            self._track_change(collection, op, row_id, version)
+            return
+        if op == "delete":
+            if collection == "products":
+                self._remove_product(row_id)
+            else:
+                record = self.users.pop(row_id, None)
+                if record is not None:
+                    self._user_ids.remove(row_id)
+                    self._unindex_email(record)
+            self._row_versions[collection].pop(row_id, None)
+            self._track_change(collection, op, row_id, version)
+            return
+        if collection == "products":
+            product = ProductRecord.from_model(Product.model_validate(row))
+            old = self.products.get(row_id)
+            if old is None:
+                self._store_product(product)
+            else:
+                # Assign in place so the table keeps its id order.
+                self._unindex_product(old)
+                self.products[row_id] = product
+                self._index_product(product)
+                self._index_search(product)
+            self.next_product_id = max(self.next_product_id, row_id + 1)
+        else:
+            old = self.users.get(row_id)
+            if old is None:
+                self._user_ids.add(row_id)
+            else:
+                self._unindex_email(old)
+            self.users[row_id] = UserRecord.from_model(User.model_validate(row))
+            self._index_email(self.users[row_id])
+            self.next_user_id = max(self.next_user_id, row_id + 1)
+        self._row_versions[collection][row_id] = row_version
+        self._track_change(collection, op, row_id, version)
+
+    def collection_version(self, collection: str) -> int:
+        """Get the version of ``"products"`` or ``"users"``; it grows on every write."""
+        return self.versions[collection]
+
+    def collection_size(self, collection: str) -> int:
+        """Get the number of rows in ``"products"`` or ``"users"``."""
+        return len(self.products if collection == "products" else self.users)
+
+    def changes_since(self, collection: str, since: int) -> Changes:
+        """Get the rows of ``collection`` written after version ``since``, and those deleted.
+
+        Walks the version index from ``since``, so the cost is in the number
+        of changes rather than the size of the collection. ``since=0`` lists
+        every row. Raises ``ChangesExpired`` when deletes after ``since`` may
+        have been forgotten, or ``since`` is from a database that was reset.
+        """
+        with self._lock.read():
+            version = self.versions[collection]
+            horizon = self._change_horizons[collection]
+            if since > version or 0 < since < horizon:
+                raise ChangesExpired(collection, since, horizon)
+            table = self.products if collection == "products" else self.users
+            rows, deleted = [], []
+            for _, row_id in self._changes[collection].items(since + 1 if since else None):
+                record = table.get(row_id)
+                if record is None:
+                    deleted.append(row_id)
+                else:
+                    rows.append(record.to_model())
+            return Changes(rows, deleted, version)
+
+    def product_version(self, product_id: int) -> Optional[int]:
+        """Get how many times a product has been written, or ``None`` if missing."""
+        return self._row_versions["products"].get(product_id)
+
+    def user_version(self, user_id: int) -> Optional[int]:
+        """Get how many times a user has been written, or ``None`` if missing."""
+        return self._row_versions["users"].get(user_id)
 
-        for product_data in sample_products:
-            self.create_product(product_data)
+    def _check_version(self, collection: str, row_id: int, expected_version: Optional[int]):
+        """Refuse a write to an existing row that has moved past ``expected_version``.
+
+        Called under the same write lock as the write it guards, which makes
+        the check and the write one compare-and-swap on the row version.
+        """
+        if expected_version is None:
+            return
+        current = self._row_versions[collection][row_id]
+        if current != expected_version:
+            raise VersionConflict(collection, row_id, current)
+
+    def _index_product(self, product: ProductRecord):
+        """Add a product to the secondary indexes."""
+        self._category_index.add(product.category, product.id)
+        self._in_stock_index.add(product.in_stock, product.id)
+        self._price_index.add(product.price, product.id)
+        for tag in product.tags:
+            self._tag_index.add(tag, product.id)
+
+    def _unindex_product(self, product: ProductRecord):
+        """Remove a product from the secondary indexes."""
+        self._category_index.remove(product.category, product.id)
+        self._in_stock_index.remove(product.in_stock, product.id)
+        self._price_index.remove(product.price, product.id)
+        for tag in product.tags:
+            self._tag_index.remove(tag, product.id)
+
+    def _index_search(self, product: ProductRecord):
+        """Add or refresh a product in the full-text index once it is built."""
+        if self._search_index is not None:
+            self._search_index.add(product.id, _search_text(product))
+
+    def _search(self) -> InvertedIndex:
+        """Get the full-text index, building it if a snapshot load deferred it.
+
+        Call with the write lock held when the index may still be missing.
+        """
+        if self._search_index is None:
+            index = InvertedIndex()
+            with _gc_paused():
+                for product in list(self.products.values()):
+                    index.add(product.id, _search_text(product))
+            self._search_index = index
+        return self._search_index
+
+    def _store_product(self, product: ProductRecord):
+        """Insert a product into the table and every index."""
+        self.products[product.id] = product
+        self._product_ids.add(product.id)
+        self._index_product(product)
+        self._index_search(product)
+
+    def _remove_product(self, product_id: int) -> Optional[ProductRecord]:
+        """Take a product out of the table and every index."""
+        product = self.products.pop(product_id, None)
+        if product is not None:
+            self._product_ids.remove(product_id)
+            self._unindex_product(product)
+            if self._search_index is not None:
+                self._search_index.remove(product_id)
+        return product
+
+    def _init_sample_data(self):
+        """Add the sample products."""
+        self.create_products(SAMPLE_PRODUCTS)
 
     def create_product(self, product_data: ProductCreate) -> Product:
         """Create a new product in the database."""
-        product = Product(
+        with self._lock.write():
+            product = self._create_product(product_data)
+        self._sync()
+        return product
+
+    def _create_product(self, product_data: ProductCreate) -> Product:
+        record = ProductRecord(
             id=self.next_product_id,
             **product_data.model_dump(),
             created_at=datetime.now()
         )
-        self.products.append(product)
+        self._store_product(record)
         self.next_product_id += 1
+        product = record.to_model()
+        self._record_write("products", "create", product.id, product)
         return product
 
+    def create_products(self, items: List[ProductCreate]) -> List[Product]:
+        """Create several products, returning them in input order."""
+        products = []
+        for product_data in items:
+            with self._lock.write():
+                products.append(self._create_product(product_data))
+        self._sync()
+        return products
+
     def get_all_products(self) -> List[Product]:
         """Get all products from the database."""
-        return self.products
+        with self._lock.read():
+            return [record.to_model() for record in self.products.values()]
+
+    def iter_products(self, batch_size: int = 1000) -> Iterator[List[Product]]:
+        """Yield every product in id order, ``batch_size`` rows at a time."""
+        return self._iter_batches("products", self.next_product_id, batch_size)
+
+    def query_products(
+        self,
+        limit: Optional[int] = None,
+        after_id: Optional[int] = None,
+        category: Optional[str] = None,
+        in_stock: Optional[bool] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        tags: Optional[List[str]] = None,
+        match_any_tag: bool = False,
+        sort_by: str = "id",
+        descending: bool = False,
+    ) -> Page:
+        """Get one page of products matching the filters.
+
+        Pagination is keyset based: pass the previous page's ``next_after_id``
+        as ``after_id`` to continue after that row in the chosen sort order.
+        Products must carry every tag in ``tags``, or at least one of them
+        when ``match_any_tag`` is set.
+        """
+        predicate = _price_filter(min_price, max_price)
+        # Everything the query reads is looked up under the lock, since clear()
+        # and loading a snapshot replace the tables and indexes.
+        with self._lock.read():
+            if sort_by == "price":
+                # The price index applies the range itself and stops at its edge.
+                price_index = self._price_index
+
+                def walk(cursor_key: Optional[tuple], descending: bool) -> Iterable[int]:
+                    return price_index.ids(min_price, max_price, cursor_key, descending)
+            elif sort_by == "id":
+                walk = self._id_walker(self._product_ids)
+            else:
+                walk = None
+            candidates = self._product_candidates(category, in_stock, tags, match_any_tag)
+            return _materialize(self._query(
+                self.products, predicate, limit, after_id, sort_by, descending, candidates, walk
+            ))
+
+    def top_products(
+        self,
+        limit: int,
+        category: Optional[str] = None,
+        descending: bool = False,
+    ) -> List[Product]:
+        """Get the ``limit`` cheapest (or most expensive) products."""
+        return self.query_products(
+            limit=limit, category=category, sort_by="price", descending=descending
+        ).items
+
+    def _product_candidates(
+        self,
+        category: Optional[str],
+        in_stock: Optional[bool],
+        tags: Optional[List[str]],
+        match_any_tag: bool,
+    ) -> Optional[Set[int]]:
+        """Resolve the indexed filters to the set of matching product ids."""
+        tag_ids = None
+        if tags:
+            if match_any_tag:
+                tag_ids = self._tag_index.any_of(tags)
+            else:
+                tag_ids = self._tag_index.all_of(tags)
+        return intersect(
+            self._category_index.get(category) if category is not None else None,
+            self._in_stock_index.get(in_stock) if in_stock is not None else None,
+            tag_ids,
+        )
+
+    def search_products(self, query: str, limit: int = 10, offset: int = 0) -> List[Product]:
+        """Get the products whose name or description best match ``query``."""
+        if self._search_index is None:
+            with self._lock.write():
+                self._search()
+        with self._lock.read():
+            hits = self._search_index.search(query, limit=limit, offset=offset)
+            return [self.products[product_id].to_model() for product_id, _ in hits]
 
     def get_product(self, product_id: int) -> Optional[Product]:
         """Get a specific product by ID."""
-        for product in self.products:
-            if product.id == product_id:
-                return product
-        return None
-
-    def update_product(self, product_id: int, update_data: ProductUpdate) -> Optional[Product]:
-        """Update an existing product in the database."""
-        product = self.get_product(product_id)
-        if not product:
+        with self._lock.read():
+            record = self.products.get(product_id)
+            return record.to_model() if record is not None else None
+
+    def update_product(
+        self,
+        product_id: int,
+        update_data: ProductUpdate,
+        expected_version: Optional[int] = None,
+    ) -> Optional[Product]:
+        """Update an existing product in the database.
+
+        With ``expected_version`` set, the update applies only if the product
+        is still at that version and raises ``VersionConflict`` otherwise.
+        """
+        with self._lock.write():
+            product = self._update_product(product_id, update_data, expected_version)
+        self._sync()
+        return product
+
+    def _update_product(
+        self, product_id: int, update_data: ProductUpdate, expected_version: Optional[int] = None
+    ) -> Optional[Product]:
+        record = self.products.get(product_id)
+        if record is None:
             return None
+        self._check_version("products", product_id, expected_version)
 
-        update_dict = update_data.model_dump(exclude_unset=True)
-        for field, value in update_dict.items():
-            setattr(product, field, value)
+        # Filtered before unindexing, so nothing below can fail half-applied.
+        update_dict = _set_fields(update_data)
+        self._unindex_product(record)
+        record.update(update_dict)
+        self._index_product(record)
+        if "name" in update_dict or "description" in update_dict:
+            self._index_search(record)
+        product = record.to_model()
+        self._record_write("products", "update", product_id, product)
 
         return product
 
-    def delete_product(self, product_id: int) -> bool:
-        """Delete a product from the database."""
-        for i, product in enumerate(self.products):
-            if product.id == product_id:
-                del self.products[i]
-                return True
-        return False
+    def update_products(
+        self, updates: List[Tuple[int, ProductUpdate]]
+    ) -> List[Optional[Product]]:
+        """Apply several product updates; missing products yield ``None``."""
+        products = []
+        for product_id, update in updates:
+            with self._lock.write():
+                products.append(self._update_product(product_id, update))
+        self._sync()
+        return products
+
+    def delete_product(self, product_id: int, expected_version: Optional[int] = None) -> bool:
+        """Delete a product from the database, if still at ``expected_version`` when given."""
+        with self._lock.write():
+            deleted = self._delete_product(product_id, expected_version)
+        self._sync()
+        return deleted
+
+    def _delete_product(self, product_id: int, expected_version: Optional[int] = None) -> bool:
+        if product_id in self.products:
+            self._check_version("products", product_id, expected_version)
+        if self._remove_product(product_id) is None:
+            return False
+        self._record_write("products", "delete", product_id)
+        return True
+
+    def delete_products(self, product_ids: List[int]) -> List[bool]:
+        """Delete several products, reporting which ones existed."""
+        deleted = []
+        for product_id in product_ids:
+            with self._lock.write():
+                deleted.append(self._delete_product(product_id))
+        self._sync()
+        return deleted
 
     def create_user(self, user_data: UserCreate) -> User:
         """Create a new user in the database."""
-        user = User(
+        with self._lock.write():
+            user = self._create_user(user_data)
+        self._sync()
+        return user
+
+    def _index_email(self, record: UserRecord):
+        """Claim the user's email, unless a user from before the index holds it."""
+        self._email_index.setdefault(normalize_email(record.email), record.id)
+
+    def _unindex_email(self, record: UserRecord):
+        key = normalize_email(record.email)
+        if self._email_index.get(key) == record.id:
+            del self._email_index[key]
+
+    def _check_email(self, email: str, user_id: Optional[int] = None):
+        """Refuse to give ``email`` to anyone but the user already holding it."""
+        owner = self._email_index.get(normalize_email(email))
+        if owner is not None and owner != user_id:
+            raise DuplicateEmail(email, owner)
+
+    def _create_user(self, user_data: UserCreate) -> User:
+        self._check_email(user_data.email)
+        record = UserRecord(
             id=self.next_user_id,
             **user_data.model_dump(),
             created_at=datetime.now(),
             updated_at=datetime.now()
         )
-        self.users.append(user)
+        self.users[record.id] = record
+        self._user_ids.add(record.id)
+        self._index_email(record)
         self.next_user_id += 1
+        user = record.to_model()
+        self._record_write("users", "create", user.id, user)
         return user
 
+    def create_users(self, items: List[UserCreate]) -> List[Union[User, DuplicateEmail]]:
+        """Create several users, returning them in input order.
+
+        Items whose email is taken yield the ``DuplicateEmail`` instead.
+        """
+        users = []
+        for user_data in items:
+            with self._lock.write():
+                try:
+                    users.append(self._create_user(user_data))
+                except DuplicateEmail as exc:
+                    users.append(exc)
+        self._sync()
+        return users
+
     def get_all_users(self) -> List[User]:
         """Get all users from the database."""
-        return self.users
+        with self._lock.read():
+            return [record.to_model() for record in self.users.values()]
+
+    def iter_users(self, batch_size: int = 1000) -> Iterator[List[User]]:
+        """Yield every user in id order, ``batch_size`` rows at a time."""
+        return self._iter_batches("users", self.next_user_id, batch_size)
+
+    def query_users(
+        self,
+        limit: Optional[int] = None,
+        after_id: Optional[int] = None,
+        sort_by: str = "id",
+        descending: bool = False,
+    ) -> Page:
+        """Get one page of users, see ``query_products`` for cursor semantics."""
+        with self._lock.read():
+            walk = self._id_walker(self._user_ids) if sort_by == "id" else None
+            return _materialize(
+                self._query(self.users, None, limit, after_id, sort_by, descending, walk=walk)
+            )
 
     def get_user(self, user_id: int) -> Optional[User]:
         """Get a specific user by ID."""
-        for user in self.users:
-            if user.id == user_id:
-                return user
-        return None
-
-    def update_user(self, user_id: int, update_data: UserUpdate) -> Optional[User]:
-        """Update an existing user in the database."""
-        user = self.get_user(user_id)
-        if not user:
+        with self._lock.read():
+            record = self.users.get(user_id)
+            return record.to_model() if record is not None else None
+
+    def get_user_by_email(self, email: str) -> Optional[User]:
+        """Get the user holding ``email``, compared after ``normalize_email``."""
+        with self._lock.read():
+            user_id = self._email_index.get(normalize_email(email))
+            return self.users[user_id].to_model() if user_id is not None else None
+
+    def update_user(
+        self, user_id: int, update_data: UserUpdate, expected_version: Optional[int] = None
+    ) -> Optional[User]:
+        """Update an existing user in the database, see ``update_product`` for versions."""
+        with self._lock.write():
+            user = self._update_user(user_id, update_data, expected_version)
+        self._sync()
+        return user
+
+    def _update_user(
+        self, user_id: int, update_data: UserUpdate, expected_version: Optional[int] = None
+    ) -> Optional[User]:
+        record = self.users.get(user_id)
+        if record is None:
             return None
+        self._check_version("users", user_id, expected_version)
 
-        update_dict = update_data.model_dump(exclude_unset=True)
+        update_dict = _set_fields(update_data)
+        email = update_dict.get("email")
+        if email is not None:
+            self._check_email(email, user_id)
+            self._unindex_email(record)
         for field, value in update_dict.items():
             if field != "updated_at":  # Skip the auto-updated field
-                setattr(user, field, value)
-        user.updated_at = datetime.now()  # Always update the timestamp
+                setattr(record, field, value)
+        record.updated_at = datetime.now()  # Always update the timestamp
+        if email is not None:
+            self._index_email(record)
+        user = record.to_model()
+        self._record_write("users", "update", user_id, user)
 
         return user
 
-    def delete_user(self, user_id: int) -> bool:
-        """Delete a user from the database."""
-        for i, user in enumerate(self.users):
-            if user.id == user_id:
-                del self.users[i]
-                return True
-        return False
+    def update_users(
+        self, updates: List[Tuple[int, UserUpdate]]
+    ) -> List[Union[User, DuplicateEmail, None]]:
+        """Apply several user updates; missing users yield ``None``, taken emails the error."""
+        users = []
+        for user_id, update in updates:
+            with self._lock.write():
+                try:
+                    users.append(self._update_user(user_id, update))
+                except DuplicateEmail as exc:
+                    users.append(exc)
+        self._sync()
+        return users
+
+    def delete_user(self, user_id: int, expected_version: Optional[int] = None) -> bool:
+        """Delete a user from the database, if still at ``expected_version`` when given."""
+        with self._lock.write():
+            deleted = self._delete_user(user_id, expected_version)
+        self._sync()
+        return deleted
+
+    def _delete_user(self, user_id: int, expected_version: Optional[int] = None) -> bool:
+        if user_id in self.users:
+            self._check_version("users", user_id, expected_version)
+        record = self.users.pop(user_id, None)
+        if record is None:
+            return False
+        self._user_ids.remove(user_id)
+        self._unindex_email(record)
+        self._record_write("users", "delete", user_id)
+        return True
+
+    def delete_users(self, user_ids: List[int]) -> List[bool]:
+        """Delete several users, reporting which ones existed."""
+        deleted = []
+        for user_id in user_ids:
+            with self._lock.write():
+                deleted.append(self._delete_user(user_id))
+        self._sync()
+        return deleted
+
+    @staticmethod
+    def _query(
+        table: Dict,
+        predicate: Optional[Callable],
+        limit: Optional[int],
+        after_id: Optional[int],
+        sort_by: str,
+        descending: bool,
+        candidates: Optional[Set[int]] = None,
+        walk: Optional[Callable[[Optional[tuple], bool], Iterable[int]]] = None,
+    ) -> Page:
+        """Run a filtered, sorted, keyset-paginated query over one collection.
+
+        Rows are ordered by ``(sort_by, id)`` so the cursor is unambiguous.
+        ``candidates`` restricts the query to ids already resolved from the
+        secondary indexes and ``predicate`` filters whatever rows remain.
+        ``walk(cursor_key, descending)`` yields ids in sort order past the
+        cursor when the sort column is indexed.
+        """
+        key = attrgetter(sort_by, "id")
+        cursor_key = None
+        if after_id is not None:
+            cursor = table.get(after_id)
+            if cursor is not None:
+                cursor_key = key(cursor)
+            elif sort_by == "id":
+                cursor_key = (after_id, after_id)
+            else:
+                raise ValueError(f"Cursor row {after_id} no longer exists")
+
+        # Selecting from the index matches costs m log k; walking the sort index
+        # until the page fills costs about limit * n / m. Pick the cheaper one.
+        if walk is not None and (
+            candidates is None
+            or (limit is not None and (limit + 1) * len(table) < len(candidates) ** 2)
+        ):
+            id_range = walk(cursor_key, descending)
+            if candidates is not None:
+                id_range = filter(candidates.__contains__, id_range)
+            rows = (table[row_id] for row_id in id_range)
+            if predicate is not None:
+                rows = filter(predicate, rows)
+            return take_page(rows, limit)
+
+        if candidates is not None:
+            rows = (table[row_id] for row_id in candidates)
+        else:
+            rows = table.values()
+        if predicate is not None:
+            rows = filter(predicate, rows)
+        if cursor_key is not None:
+            if descending:
+                rows = (row for row in rows if key(row) < cursor_key)
+            else:
+                rows = (row for row in rows if key(row) > cursor_key)
+        if limit is None:
+            return Page(sorted(rows, key=key, reverse=descending), None)
+        select = heapq.nlargest if descending else heapq.nsmallest
+        return take_page(select(limit + 1, rows, key=key), limit)
+
+    def _iter_batches(self, collection: str, next_id: int, batch_size: int) -> Iterator[List]:
+        """Walk a collection in id order one batch at a time.
+
+        Only one batch is held at once, so memory stays bounded however large
+        the collection is. Rows created after iteration starts are excluded,
+        so the walk covers the collection as it was when it began, less any
+        rows deleted on the way. The read lock is held per batch, never
+        across a ``yield``, and the table is looked up afresh under it, since
+        clear() and loading a snapshot replace it.
+        """
+        last_id = next_id - 1
+        after_id = 0
+        while True:
+            with self._lock.read():
+                if collection == "products":
+                    table, ids = self.products, self._product_ids
+                else:
+                    table, ids = self.users, self._user_ids
+                batch_ids = list(islice(
+                    ids.irange(after_id, last_id, inclusive=(False, True)), batch_size
+                ))
+                rows = [table[row_id].to_model() for row_id in batch_ids if row_id in table]
+            if not batch_ids:
+                return
+            if rows:
+                yield rows
+            after_id = batch_ids[-1]
+
+    @staticmethod
+    def _id_walker(ids: SortedList) -> Callable[[Optional[tuple], bool], Iterable[int]]:
+        """Build a ``_query`` walker over a sorted id list."""
+        def walk(cursor_key: Optional[tuple], descending: bool) -> Iterable[int]:
+            if cursor_key is None:
+                return ids.irange(reverse=descending)
+            after_id = cursor_key[1]
+            if descending:
+                return ids.irange(maximum=after_id, inclusive=(True, False), reverse=True)
+            return ids.irange(minimum=after_id, inclusive=(False, True))
+        return walk
+
+
+def create_database(
+    backend: str = "memory",
+    sqlite_path: str = "crud.db",
+    wal_dir: Optional[str] = None,
+    snapshot_path: Optional[str] = None,
+) -> StorageBackend:
+    """Create the storage backend named by ``backend``: ``memory`` or ``sqlite``.
+
+    ``wal_dir`` makes the in-memory backend durable, and ``snapshot_path``
+    restores it from a snapshot when nothing was recovered from the log. The
+    SQLite backend persists on its own and ignores both.
+    """
+    if backend == "memory":
+        database = InMemoryDatabase(
+            wal_dir, settings.wal_fsync, settings.wal_snapshot_every, settings.sync_tombstones
+        )
+        if snapshot_path is not None and database.fresh:
+            database.load_snapshot(snapshot_path)
+        return database
+    if backend == "sqlite":
+        from sqlite_database import SQLiteDatabase
+        return SQLiteDatabase(sqlite_path, tombstone_limit=settings.sync_tombstones)
+    raise ValueError(f"Unknown storage backend {backend!r}")
 
 
 # Global database instance
-db = InMemoryDatabase()
+db = create_database(
+    settings.storage_backend, settings.sqlite_path, settings.wal_dir, settings.snapshot_path
+)
@@ -1,6 +1,6 @@
 import React, { useState, useEffect } from 'react';
 import { Product } from '../types';
-import { productApi } from '../services/api';
+import { productApi, applyChange, subscribeToChanges } from '../services/api';
 import ProductForm from './ProductForm';
 
 const ProductList: React.FC = () => {
@@ -12,6 +12,11 @@ const ProductList: React.FC = () => {
 
   useEffect(() => {
     loadProducts();
+    // Writes from anywhere arrive as deltas; reload only when told to resync.
+    return subscribeToChanges<Product>('products', {
+      onResync: loadProducts,
+      onChange: (change) => setProducts(rows => applyChange(rows, change)),
+    });
   }, []);
 
   const loadProducts = async () => {
@@ -32,7 +37,7 @@ const ProductList: React.FC = () => {
     if (window.confirm('Are you sure you want to delete this product?')) {
       try {
         await productApi.delete(id);
-        setProducts(products.filter(product => product.id !== id));
+        setProducts(rows => rows.filter(product => product.id !== id));
       } catch (err) {
         setError('Failed to delete product');
         console.error(err);
@@ -54,10 +59,10 @@ const ProductList: React.FC = () => {
     try {
       if (editingProduct) {
         const updatedProduct = await productApi.update(editingProduct.id, productData);
-        setProducts(products.map(p => p.id === editingProduct.id ? updatedProduct : p));
+        setProducts(rows => rows.map(p => p.id === editingProduct.id ? updatedProduct : p));
       } else {
         const newProduct = await productApi.create(productData);
-        setProducts([...products, newProduct]);
+        setProducts(rows => rows.some(p => p.id === newProduct.id) ? rows : [...rows, newProduct]);
       }
       handleFormClose();
     } catch (err) {
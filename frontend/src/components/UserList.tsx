@@ -1,6 +1,6 @@
 import React, { useState, useEffect } from 'react';
 import { User } from '../types';
-import { userApi } from '../services/api';
+import { userApi, applyChange, subscribeToChanges } from '../services/api';
 import UserForm from './UserForm';
 
 const UserList: React.FC = () => {
@@ -12,6 +12,11 @@ const UserList: React.FC = () => {
 
   useEffect(() => {
     loadUsers();
+    // Writes from anywhere arrive as deltas; reload only when told to resync.
+    return subscribeToChanges<User>('users', {
+      onResync: loadUsers,
+      onChange: (change) => setUsers(rows => applyChange(rows, change)),
+    });
   }, []);
 
   const loadUsers = async () => {
@@ -32,7 +37,7 @@ const UserList: React.FC = () => {
     if (window.confirm('Are you sure you want to delete this user?')) {
       try {
         await userApi.delete(id);
-        setUsers(users.filter(user => user.id !== id));
+        setUsers(rows => rows.filter(user => user.id !== id));
       } catch (err) {
         setError('Failed to delete user');
         console.error(err);
@@ -54,10 +59,10 @@ const UserList: React.FC = () => {
     try {
       if (editingUser) {
         const updatedUser = await userApi.update(editingUser.id, userData);
-        setUsers(users.map(u => u.id === editingUser.id ? updatedUser : u));
+        setUsers(rows => rows.map(u => u.id === editingUser.id ? updatedUser : u));
       } else {
         const newUser = await userApi.create(userData);
-        setUsers([...users, newUser]);
+        setUsers(rows => rows.some(u => u.id === newUser.id) ? rows : [...rows, newUser]);
       }
       handleFormClose();
     } catch (err) {
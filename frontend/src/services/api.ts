@@ -1,15 +1,75 @@
-import { Product, ProductCreate, ProductUpdate, User, UserCreate, UserUpdate } from '../types';
+import { ChangeEvent, Product, ProductCreate, ProductUpdate, User, UserCreate, UserUpdate } from '../types';
 
 const API_BASE_URL = 'http://localhost:8000';
 
+interface CachedResponse {
+  etag: string;
+  data: unknown;
+}
+
+// Last payload and ETag seen for each URL, revalidated with If-None-Match
+const etagCache = new Map<string, CachedResponse>();
+
+const fetchWithETag = async <T>(url: string, errorMessage: string): Promise<T> => {
+  const cached = etagCache.get(url);
+  const response = await fetch(url, {
+    headers: cached ? { 'If-None-Match': cached.etag } : {},
+  });
+  if (response.status === 304 && cached) {
+    return cached.data as T;
+  }
+  if (!response.ok) {
+    throw new Error(errorMessage);
+  }
+  const data = await response.json();
+  const etag = response.headers.get('ETag');
+  if (etag) {
+    etagCache.set(url, { etag, data });
+  }
+  return data;
+};
+
+interface ChangeHandlers<T> {
+  // The local copy may be missing changes; reload it. Also sent on connect.
+  onResync: () => void;
+  onChange: (change: ChangeEvent<T>) => void;
+}
+
+// Follow writes to one collection over Server-Sent Events. The browser
+// reconnects by itself and resumes from the last event it received.
+// Returns a function that closes the stream.
+export const subscribeToChanges = <T>(
+  collection: 'products' | 'users',
+  { onResync, onChange }: ChangeHandlers<T>,
+): (() => void) => {
+  const source = new EventSource(`${API_BASE_URL}/changes/stream?collection=${collection}`);
+  source.addEventListener('resync', () => onResync());
+  source.addEventListener('change', (event) => {
+    onChange(JSON.parse((event as MessageEvent).data) as ChangeEvent<T>);
+  });
+  return () => source.close();
+};
+
+// Apply one change to a list of rows kept in id order
+export const applyChange = <T extends { id: number }>(rows: T[], change: ChangeEvent<T>): T[] => {
+  if (change.op === 'clear') {
+    return [];
+  }
+  if (change.op === 'delete') {
+    return rows.filter(row => row.id !== change.id);
+  }
+  const row = change.row as T;
+  const index = rows.findIndex(existing => existing.id === row.id);
+  if (index === -1) {
+    return [...rows, row].sort((a, b) => a.id - b.id);
+  }
+  return rows.map(existing => existing.id === row.id ? row : existing);
+};
+
 // Product API functions
 export const productApi = {
   getAll: async (): Promise<Product[]> => {
-    const response = await fetch(`${API_BASE_URL}/products`);
-    if (!response.ok) {
-      throw new Error('Failed to fetch products');
-    }
-    return response.json();
+    return fetchWithETag<Product[]>(`${API_BASE_URL}/products`, 'Failed to fetch products');
   },
 
   create: async (product: ProductCreate): Promise<Product> => {
@@ -53,19 +113,11 @@ export const productApi = {
 // User API functions
 export const userApi = {
   getAll: async (): Promise<User[]> => {
-    const response = await fetch(`${API_BASE_URL}/users`);
-    if (!response.ok) {
-      throw new Error('Failed to fetch users');
-    }
-    return response.json();
+    return fetchWithETag<User[]>(`${API_BASE_URL}/users`, 'Failed to fetch users');
   },
 
   getById: async (id: number): Promise<User> => {
-    const response = await fetch(`${API_BASE_URL}/users/${id}`);
-    if (!response.ok) {
-      throw new Error('Failed to fetch user');
-    }
-    return response.json();
+    return fetchWithETag<User>(`${API_BASE_URL}/users/${id}`, 'Failed to fetch user');
   },
 
   create: async (user: UserCreate): Promise<User> => {
@@ -31,7 +31,6 @@ export interface User {
   id: number;
   name: string;
   email: string;
-  password: string;
   created_at: string;
   updated_at: string;
 }
@@ -48,3 +47,11 @@ export interface UserUpdate {
   password?: string;
   updated_at: string;
 }
+
+export interface ChangeEvent<T> {
+  collection: 'products' | 'users';
+  op: 'create' | 'update' | 'delete' | 'clear';
+  id: number | null;
+  version: number;
+  row: T | null;
+}
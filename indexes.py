@@ -0,0 +1,118 @@
+"""Secondary indexes maintained alongside InMemoryDatabase collections."""
+import math
+from typing import Dict, Hashable, Iterable, Iterator, Optional, Set, Tuple
+
+from sortedcontainers import SortedList
+
+_EMPTY: frozenset = frozenset()
+
+
+class HashIndex:
+    """Map each key to the set of row ids holding it.
+
+    A row may be indexed under several keys, which makes this an inverted
+    index for multi-valued fields such as tags.
+    """
+
+    def __init__(self):
+        self._ids: Dict[Hashable, Set[int]] = {}
+
+    def add(self, key: Hashable, row_id: int):
+        """Index ``row_id`` under ``key``."""
+        self._ids.setdefault(key, set()).add(row_id)
+
+    def remove(self, key: Hashable, row_id: int):
+        """Drop ``row_id`` from ``key``, forgetting keys that become empty."""
+        ids = self._ids.get(key)
+        if ids is None:
+            return
+        ids.discard(row_id)
+        if not ids:
+            del self._ids[key]
+
+    def get(self, key: Hashable) -> Set[int]:
+        """Return the ids indexed under ``key``; callers must not mutate it."""
+        return self._ids.get(key, _EMPTY)
+
+    def all_of(self, keys: Iterable[Hashable]) -> Set[int]:
+        """Return the ids indexed under every key."""
+        sets = sorted((self.get(key) for key in keys), key=len)
+        if not sets:
+            return set()
+        return set(sets[0]).intersection(*sets[1:])
+
+    def any_of(self, keys: Iterable[Hashable]) -> Set[int]:
+        """Return the ids indexed under at least one key."""
+        return set().union(*(self.get(key) for key in keys))
+
+    def keys(self):
+        """Return the distinct indexed keys."""
+        return self._ids.keys()
+
+
+def intersect(*id_sets: Optional[Set[int]]) -> Optional[Set[int]]:
+    """Intersect the given id sets, smallest first, ignoring ``None`` entries.
+
+    Returns ``None`` when no set constrains the result.
+    """
+    sets = sorted((ids for ids in id_sets if ids is not None), key=len)
+    if not sets:
+        return None
+    return set(sets[0]).intersection(*sets[1:])
+
+
+class SortedIndex:
+    """Keep row ids ordered by ``(key, id)`` for range scans and top-k reads.
+
+    Every read is a bisection followed by a walk, so a range query costs
+    O(log n + k) for k returned ids.
+    """
+
+    def __init__(self):
+        self._entries = SortedList()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def add(self, key, row_id: int):
+        """Index ``row_id`` under ``key``."""
+        self._entries.add((key, row_id))
+
+    def remove(self, key, row_id: int):
+        """Drop the ``(key, row_id)`` entry if present."""
+        self._entries.discard((key, row_id))
+
+    def update(self, entries: Iterable[Tuple]):
+        """Index many ``(key, row_id)`` pairs at once, much faster than ``add``."""
+        self._entries.update(entries)
+
+    def items(self, lower=None) -> Iterator[Tuple]:
+        """Yield ``(key, id)`` pairs with ``key >= lower`` in ``(key, id)`` order."""
+        return iter(self._entries.irange((lower,) if lower is not None else None))
+
+    def ids(
+        self,
+        lower=None,
+        upper=None,
+        after: Optional[Tuple] = None,
+        reverse: bool = False,
+    ) -> Iterator[int]:
+        """Yield ids with ``lower <= key <= upper`` in ``(key, id)`` order.
+
+        ``after`` is a ``(key, id)`` cursor; iteration starts strictly past
+        it in the direction of travel.
+        """
+        # (lower,) sorts before and (upper, inf) after every real entry with
+        # that key, so all bounds can be exclusive.
+        lows = [(lower,)] if lower is not None else []
+        highs = [(upper, math.inf)] if upper is not None else []
+        if after is not None:
+            (highs if reverse else lows).append(after)
+        entries = self._entries.irange(
+            max(lows) if lows else None,
+            min(highs) if highs else None,
+            inclusive=(False, False),
+            reverse=reverse,
+        )
+        for _, row_id in entries:
+            yield row_id
@@ -0,0 +1,61 @@
+"""Readers-writer lock for the in-memory backend."""
+import threading
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+
+class ReadWriteLock:
+    """Let any number of readers in at once, or a single writer.
+
+    Waiting writers take precedence over newly arriving readers, so a steady
+    stream of reads cannot starve writes. The thread holding the write lock
+    may take it again, or take the read lock, without deadlocking.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writers_waiting = 0
+        self._writer: Optional[int] = None
+        self._write_depth = 0
+
+    @contextmanager
+    def read(self) -> Iterator[None]:
+        """Hold the lock shared for the duration of the ``with`` block."""
+        if self._writer == threading.get_ident():
+            yield
+            return
+        with self._cond:
+            while self._writer is not None or self._writers_waiting:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if not self._readers:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def write(self) -> Iterator[None]:
+        """Hold the lock exclusively for the duration of the ``with`` block."""
+        me = threading.get_ident()
+        with self._cond:
+            if self._writer != me:
+                self._writers_waiting += 1
+                try:
+                    while self._writer is not None or self._readers:
+                        self._cond.wait()
+                finally:
+                    self._writers_waiting -= 1
+                self._writer = me
+            self._write_depth += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._write_depth -= 1
+                if not self._write_depth:
+                    self._writer = None
+                    self._cond.notify_all()
@@ -1,18 +1,53 @@
 """FastAPI application for Product CRUD operations."""
-from typing import List
-import uvicorn
+import hmac
+import json
+from contextlib import asynccontextmanager
+from functools import lru_cache, partial
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterable, Iterator, List, Literal, Optional, Tuple, Type
 
-from fastapi import FastAPI, HTTPException
+from anyio import to_thread
+from fastapi import Body, FastAPI, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel, TypeAdapter, ValidationError
 
-from models import Product, ProductCreate, ProductUpdate, User, UserCreate, UserUpdate
+from async_database import AsyncDatabase
+from models import (
+    BulkItemResult, BulkResponse, Product, ProductBulkUpdate, ProductChanges, ProductCreate,
+    ProductUpdate, UserBulkUpdate, UserChanges, UserCreate, UserCredentials, UserPublic,
+    UserUpdate,
+)
+from cache import ResponseCache
+from changefeed import ChangeFeed, StaleSequence
+from compression import CompressionMiddleware, base_etag, negotiate
+from config import settings
 from database import db
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, MetricsMiddleware, Registry, instrument
+from passwords import PasswordHasher, PasswordHasherBusy
+from profiling import Profiler, ProfilingMiddleware, TimedRoute
+from serialization import PRODUCT_LIST, USER_LIST, encode_change, json_response
+from storage import (
+    Change, Changes, ChangesExpired, DuplicateEmail, Page, StorageBackend, VersionConflict,
+)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Seed a fresh database with the sample products when asked to, and stop the hasher on exit."""
+    if settings.seed_sample_data:
+        await adb.seed_sample_data()
+    yield
+    password_hasher.close()
+
 
 app = FastAPI(
     title="Product CRUD API",
     description="A simple CRUD API for managing products",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
 )
+# Marks when each request reaches its endpoint and when the endpoint returns,
+# for the phases in the slow-request log and profiles.
+app.router.route_class = TimedRoute
 
 # Add CORS middleware
 app.add_middleware(
@@ -21,7 +56,396 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Next-After-Id"],
+)
+
+# Compresses whatever the client accepts; cached list bodies arrive here
+# already compressed and pass straight through.
+app.add_middleware(CompressionMiddleware, minimum_size=settings.compress_min_bytes)
+
+response_cache = ResponseCache(settings.response_cache_bytes, settings.compress_min_bytes)
+
+# Storage methods timed for /metrics; the iterators return before any work is done.
+DB_METHODS = [
+    name for name in vars(StorageBackend)
+    if not name.startswith("_") and callable(getattr(StorageBackend, name))
+    and name not in ("subscribe", "iter_products", "iter_users")
+]
+
+metrics = Registry()
+if settings.metrics:
+    # Added last, so it is outermost and times the other middleware too.
+    app.add_middleware(MetricsMiddleware, registry=metrics)
+    instrument(db, metrics, DB_METHODS)
+
+# X-Profile has to carry the admin token, so clients can't profile at will.
+if settings.profile_header and settings.admin_token is None:
+    raise SystemExit("CRUD_PROFILE_HEADER requires CRUD_ADMIN_TOKEN")
+profiler = Profiler(
+    settings.profile_buffer,
+    settings.profile_sample_rate,
+    settings.admin_token if settings.profile_header else None,
+    settings.slow_request_ms,
 )
+if settings.profile_header or settings.profile_sample_rate or settings.slow_request_ms:
+    # Outermost of all, so the profile and the phases cover every middleware.
+    app.add_middleware(ProfilingMiddleware, profiler=profiler)
+
+
+def _invalidate_cached_responses(change: Change):
+    """Evict cached list responses of the collection that was written."""
+    response_cache.invalidate(change.collection)
+
+
+db.subscribe(_invalidate_cached_responses)
+
+# Passwords are hashed here, before they reach the database, which stores
+# whatever it is given.
+password_hasher = PasswordHasher(
+    settings.scrypt_n,
+    settings.scrypt_r,
+    settings.scrypt_p,
+    settings.password_workers or None,
+    settings.password_queue or None,
+)
+
+change_feed = ChangeFeed(settings.change_feed_size, encode_change)
+db.subscribe(change_feed.publish)
+
+# Endpoints are async and await the database through this, so none of them
+# ties up a threadpool slot while it waits on a write.
+adb = AsyncDatabase(db)
+
+COLLECTIONS = ("products", "users")
+metrics.gauge_function(
+    "crud_collection_rows", "Rows stored per collection.", ("collection",),
+    lambda: [((name,), db.collection_size(name)) for name in COLLECTIONS],
+)
+metrics.gauge_function(
+    "crud_collection_version", "Writes made to each collection.", ("collection",),
+    lambda: [((name,), db.collection_version(name)) for name in COLLECTIONS],
+)
+metrics.gauge_function(
+    "crud_response_cache", "Response cache size and counters.", ("stat",),
+    lambda: [((name,), value) for name, value in response_cache.stats().items()],
+)
+metrics.gauge_function(
+    "crud_password_hashes_pending", "Password hashes running or queued.", (),
+    lambda: [((), password_hasher.pending)],
+)
+metrics.gauge_function(
+    "crud_change_feed_sequence", "Sequence number of the latest change feed event.", (),
+    lambda: [((), change_feed.last_seq)],
+)
+
+MAX_PAGE_SIZE = 1000
+MAX_BULK_ITEMS = 10_000
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+SSE_MEDIA_TYPE = "text/event-stream"
+FEED_BATCH_SIZE = 500
+FEED_HEARTBEAT_SECONDS = 15.0
+
+
+def _set_next_cursor(response: Response, next_after_id: Optional[int]):
+    """Advertise the cursor for the next page when there is one."""
+    if next_after_id is not None:
+        response.headers["X-Next-After-Id"] = str(next_after_id)
+
+
+def _etag_matches(request: Request, etag: str) -> Optional[str]:
+    """Return the tag in the client's If-None-Match naming ``etag``, if any.
+
+    Tags of compressed variants of ``etag`` match too.
+    """
+    header = request.headers.get("if-none-match")
+    if not header:
+        return None
+    if header.strip() == "*":
+        return etag
+    for tag in header.split(","):
+        tag = tag.strip()
+        if base_etag(tag.removeprefix("W/")) == etag:
+            return tag
+    return None
+
+
+def _collection_etag(collection: str, version: int) -> str:
+    """ETag for any list read of ``collection`` at ``version``."""
+    return f'"{collection}-{version}"'
+
+
+def _row_etag(collection: str, row_id: int, version: int) -> str:
+    """ETag for one row of ``collection`` at ``version``."""
+    return f'"{collection}-{row_id}-{version}"'
+
+
+async def _expected_version(
+    request: Request,
+    collection: str,
+    row_id: int,
+    version_of: Callable[[int], Awaitable[Optional[int]]],
+) -> Optional[int]:
+    """Turn the client's If-Match into the row version a write must find.
+
+    Returns ``None`` when there is no precondition. Raises a 412 when no tag
+    in the header could name this row at any version.
+    """
+    header = request.headers.get("if-match")
+    if not header or header.strip() == "*":
+        return None
+    prefix = f'"{collection}-{row_id}-'
+    versions = set()
+    for tag in header.split(","):
+        tag = base_etag(tag.strip())
+        if tag.startswith(prefix) and tag.endswith('"') and tag[len(prefix):-1].isdigit():
+            versions.add(int(tag[len(prefix):-1]))
+    if len(versions) == 1:
+        return versions.pop()
+    # Several versions of the row are acceptable; whichever is current must be one.
+    current = await version_of(row_id) if versions else None
+    if current is None or current not in versions:
+        raise HTTPException(status_code=412, detail="If-Match names no current version")
+    return current
+
+
+def _conditional(request: Request, response: Response, etag: str) -> Optional[Response]:
+    """Return a 304 when the client copy is current, else tag the response."""
+    matched = _etag_matches(request, etag)
+    if matched:
+        # Name the representation the client holds, which may be compressed.
+        return Response(status_code=304, headers={"ETag": matched, "Cache-Control": "no-cache"})
+    response.headers.update({"ETag": etag, "Cache-Control": "no-cache"})
+    return None
+
+
+async def _rows_response(
+    rows: List[BaseModel], adapter: TypeAdapter, response: Optional[Response] = None
+):
+    """Return rows for ``response_model`` or, with fast JSON on, pre-encoded off the loop."""
+    if not settings.fast_json:
+        return rows
+    headers = dict(response.headers) if response else None
+    return await to_thread.run_sync(partial(json_response, rows, adapter, headers=headers))
+
+
+async def _list_response(
+    request: Request,
+    response: Response,
+    collection: str,
+    adapter: TypeAdapter,
+    load: Callable[[], Awaitable[Page]],
+):
+    """Answer a list read with a 304, a cached body or a freshly loaded page.
+
+    ``load`` runs only on a cache miss. The version is read before loading,
+    so a write racing with the load can only make the result look older
+    than it is, never newer.
+    """
+    version = await adb.collection_version(collection)
+    not_modified = _conditional(request, response, _collection_etag(collection, version))
+    if not_modified:
+        return not_modified
+
+    if not response_cache.enabled:
+        page = await _load_page(load)
+        _set_next_cursor(response, page.next_after_id)
+        return await _rows_response(page.items, adapter, response)
+
+    key = (request.url.path, tuple(sorted(request.query_params.multi_items())))
+    encoding = negotiate(request.headers.get("accept-encoding"))
+    entry = response_cache.get(key, version)
+    if entry is None:
+        page = await _load_page(load)
+        _set_next_cursor(response, page.next_after_id)
+        # A full collection takes a while to encode; do it off the loop.
+        body = await to_thread.run_sync(adapter.dump_json, page.items)
+        entry = response_cache.put(key, collection, version, body, dict(response.headers))
+    entry = await response_cache.add_variant(key, entry, encoding)
+    return entry.response(encoding)
+
+
+async def _load_page(load: Callable[[], Awaitable[Page]]) -> Page:
+    """Run a page query, reporting a stale cursor as a 400."""
+    try:
+        return await load()
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+
+@lru_cache(maxsize=None)
+def _list_adapter(model: Type[BaseModel]) -> TypeAdapter:
+    """Build (once per model) the adapter that validates a whole batch."""
+    return TypeAdapter(List[model])
+
+
+async def _read_bulk_items(
+    request: Request, model: Type[BaseModel]
+) -> Tuple[List[Optional[BaseModel]], Dict[int, Any]]:
+    """Validate a JSON array or NDJSON body of ``model`` items.
+
+    A JSON array is validated in a single pass. Only when that fails is
+    each item validated on its own, so one bad item doesn't sink the rest.
+    NDJSON lines are parsed and validated one by one, so a malformed line
+    fails only its own item; item indexes count the non-blank lines.
+    Returns the items (``None`` where invalid) and the errors by index.
+    """
+    body = await request.body()
+    if request.headers.get("content-type", "").startswith(NDJSON_MEDIA_TYPE):
+        lines = [line for line in body.splitlines() if line.strip()]
+        _check_bulk_size(lines)
+        return _validate_each(lines, model.model_validate_json)
+    try:
+        items = _list_adapter(model).validate_json(body)
+    except ValidationError:
+        try:
+            raw_items = json.loads(body)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Malformed JSON body")
+        if not isinstance(raw_items, list):
+            raise HTTPException(status_code=422, detail="Expected a JSON array")
+        _check_bulk_size(raw_items)
+        return _validate_each(raw_items, model.model_validate)
+    _check_bulk_size(items)
+    return items, {}
+
+
+def _check_bulk_size(items: List[Any]):
+    if len(items) > MAX_BULK_ITEMS:
+        raise HTTPException(
+            status_code=413, detail=f"At most {MAX_BULK_ITEMS} items per bulk request"
+        )
+
+
+def _validate_each(
+    raw_items: List[Any], validate: Callable[[Any], BaseModel]
+) -> Tuple[List[Optional[BaseModel]], Dict[int, Any]]:
+    """Validate items one at a time, collecting the errors of each by index."""
+    items, errors = [], {}
+    for index, raw_item in enumerate(raw_items):
+        try:
+            items.append(validate(raw_item))
+        except ValidationError as exc:
+            items.append(None)
+            errors[index] = exc.errors(include_url=False, include_context=False)
+    return items, errors
+
+
+def _bulk_response(
+    items: List[Optional[Any]], errors: Dict[int, Any], outcomes: List[Any], detail: str
+) -> BulkResponse:
+    """Merge validation errors and database outcomes into per-item results.
+
+    ``outcomes`` holds one entry per valid item, in order: the affected row,
+    ``True`` on success, a ``DuplicateEmail`` when the item's email is taken,
+    or a falsy value when the row was not found.
+    """
+    results = []
+    outcome_iter = iter(outcomes)
+    for index, item in enumerate(items):
+        if item is None:
+            results.append(BulkItemResult(index=index, status=422, detail=errors[index]))
+            continue
+        outcome = next(outcome_iter)
+        if isinstance(outcome, DuplicateEmail):
+            results.append(BulkItemResult(index=index, status=409, detail=str(outcome)))
+        elif not outcome:
+            results.append(BulkItemResult(index=index, status=404, detail=detail))
+        elif outcome is True:
+            results.append(BulkItemResult(index=index, status=200, id=item))
+        else:
+            results.append(BulkItemResult(index=index, status=200, id=outcome.id))
+    return BulkResponse(results=results)
+
+
+def _split_bulk_updates(items: List[Optional[BaseModel]], update_model: Type[BaseModel]):
+    """Turn validated ``*BulkUpdate`` items into ``(id, update)`` pairs."""
+    updates = []
+    for item in items:
+        if item is not None:
+            fields = item.model_dump(exclude_unset=True, exclude={"id"})
+            updates.append((item.id, update_model.model_construct(_fields_set=set(fields), **fields)))
+    return updates
+
+
+def _ndjson_stream(batches: Iterable[List[BaseModel]], model: Type[BaseModel]) -> Iterator[bytes]:
+    """Encode each batch of rows as one chunk of newline-delimited JSON."""
+    adapter = TypeAdapter(model)
+    for rows in batches:
+        yield b"".join(adapter.dump_json(row) + b"\n" for row in rows)
+
+
+@app.exception_handler(VersionConflict)
+async def version_conflict_handler(request: Request, exc: VersionConflict):
+    """Answer a failed If-Match with a 412 carrying the row's current ETag."""
+    return JSONResponse(
+        status_code=412,
+        content={"detail": "Row was modified since it was read"},
+        headers={"ETag": _row_etag(exc.collection, exc.row_id, exc.current_version)},
+    )
+
+
+@app.exception_handler(DuplicateEmail)
+async def duplicate_email_handler(request: Request, exc: DuplicateEmail):
+    """Answer a create or update onto a taken email with a 409."""
+    return JSONResponse(status_code=409, content={"detail": str(exc)})
+
+
+@app.exception_handler(PasswordHasherBusy)
+async def password_hasher_busy_handler(request: Request, exc: PasswordHasherBusy):
+    """Shed password work beyond the hasher's queue with a 503."""
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Too many password operations in progress"},
+        headers={"Retry-After": "1"},
+    )
+
+
+def _sse(event: str, data: bytes, event_id: Optional[str] = None) -> bytes:
+    """Format one Server-Sent Events message."""
+    head = f"id: {event_id}\nevent: {event}\n" if event_id else f"event: {event}\n"
+    return head.encode() + b"data: " + data + b"\n\n"
+
+
+async def _change_stream(
+    feed: ChangeFeed, after_seq: Optional[int], collection: Optional[str]
+) -> AsyncIterator[bytes]:
+    """Yield feed events after ``after_seq`` as SSE messages, then follow new ones.
+
+    A ``resync`` message tells the client to reload its copy of the data:
+    it is sent first when the client has no usable position, and again
+    whenever the client has fallen so far behind that the events it missed
+    are gone. Either way the stream carries on from the newest event.
+    """
+    while True:
+        try:
+            if after_seq is None:
+                raise StaleSequence(after_seq)
+            events = feed.read(after_seq, FEED_BATCH_SIZE)
+        except StaleSequence:
+            after_seq = feed.last_seq
+            yield _sse("resync", b'{"seq":%d}' % after_seq, feed.position(after_seq))
+            continue
+        if events:
+            after_seq = events[-1].seq
+            chunk = b"".join(
+                _sse("change", event.data, feed.position(event.seq))
+                for event in events
+                if collection is None or event.change.collection == collection
+            )
+            if chunk:
+                yield chunk
+        elif not await feed.wait(after_seq, FEED_HEARTBEAT_SECONDS):
+            yield b": keep-alive\n\n"
+
+
+async def _changes_since(collection: str, since: int) -> Changes:
+    """Load the changes for a delta sync, answering a 410 when they are gone."""
+    try:
+        return await adb.changes_since(collection, since)
+    except ChangesExpired as exc:
+        raise HTTPException(
+            status_code=410, detail=f"{exc}; reload and sync from the version of that read"
+        )
 
 
 @app.get("/")
@@ -36,72 +460,401 @@ def health_check():
     return {"status": "healthy"}
 
 
+@app.get("/cache/stats")
+def cache_stats():
+    """Response cache size and hit/miss counters."""
+    return response_cache.stats()
+
+
+@app.get("/metrics")
+def get_metrics():
+    """Request, database and cache metrics in the Prometheus text format."""
+    return Response(metrics.render(), media_type=METRICS_CONTENT_TYPE)
+
+
+def _require_admin(request: Request):
+    """Reject the request unless it carries the admin token.
+
+    Without a token configured the admin endpoints don't exist: profiles and
+    slow requests hold full paths, which may include emails.
+    """
+    if settings.admin_token is None:
+        raise HTTPException(status_code=404, detail="Not Found")
+    expected = f"Bearer {settings.admin_token}"
+    if not hmac.compare_digest(request.headers.get("authorization", ""), expected):
+        raise HTTPException(
+            status_code=401, detail="Admin token required",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+
+@app.get("/admin/profiles")
+def list_profiles(request: Request):
+    """The profiles kept in the ring buffer, oldest first, without their data."""
+    _require_admin(request)
+    return [profile.summary() for profile in list(profiler.profiles)]
+
+
+@app.get("/admin/profiles/{profile_id}")
+def get_profile(
+    request: Request, profile_id: int, format: Literal["pstats", "text"] = "pstats"
+):
+    """Download one profile for ``pstats``/snakeviz, or read its top functions as text."""
+    _require_admin(request)
+    profile = profiler.get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    if format == "text":
+        return Response(profile.text(), media_type="text/plain")
+    return Response(
+        profile.dump(),
+        media_type="application/octet-stream",
+        headers={"Content-Disposition": f'attachment; filename="profile-{profile_id}.prof"'},
+    )
+
+
+@app.get("/admin/slow-requests")
+def list_slow_requests(request: Request):
+    """Recent requests slower than CRUD_SLOW_REQUEST_MS, with their phases."""
+    _require_admin(request)
+    return list(profiler.slow_requests)
+
+
+@app.get("/changes/stream")
+def stream_changes(
+    request: Request,
+    since: Optional[int] = Query(None, ge=0),
+    collection: Optional[Literal["products", "users"]] = None,
+):
+    """Stream every write as Server-Sent Events, optionally for one collection.
+
+    Each ``change`` event carries the written row (``null`` for deletes and
+    clears) and an id to resume from. Reconnecting browsers send it back as
+    Last-Event-ID automatically; ``since`` takes a bare sequence number.
+    """
+    after_seq = since
+    if after_seq is None and "last-event-id" in request.headers:
+        after_seq = change_feed.parse_position(request.headers["last-event-id"])
+    return StreamingResponse(
+        _change_stream(change_feed, after_seq, collection),
+        media_type=SSE_MEDIA_TYPE,
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @app.get("/products", response_model=List[Product])
-def get_products():
-    """Get all products"""
-    return db.get_all_products()
+async def get_products(
+    request: Request,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    after_id: Optional[int] = None,
+    category: Optional[str] = None,
+    in_stock: Optional[bool] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    tags: Optional[List[str]] = Query(None),
+    tag_mode: Literal["all", "any"] = "all",
+    sort: Literal["id", "name", "price", "created_at"] = "id",
+    order: Literal["asc", "desc"] = "asc",
+):
+    """Get products, optionally filtered, sorted and paginated.
+
+    When more rows remain, the X-Next-After-Id header carries the value to
+    pass as ``after_id`` to fetch the next page. Responses carry an ETag that
+    changes with any product write; send it back as If-None-Match to get a
+    304 when nothing changed.
+    """
+    def load() -> Awaitable[Page]:
+        return adb.query_products(
+            limit=limit,
+            after_id=after_id,
+            category=category,
+            in_stock=in_stock,
+            min_price=min_price,
+            max_price=max_price,
+            tags=tags,
+            match_any_tag=tag_mode == "any",
+            sort_by=sort,
+            descending=order == "desc",
+        )
+
+    return await _list_response(request, response, "products", PRODUCT_LIST, load)
+
+
+@app.get("/products/top", response_model=List[Product])
+async def get_top_products(
+    limit: int = Query(10, ge=1, le=MAX_PAGE_SIZE),
+    category: Optional[str] = None,
+    order: Literal["asc", "desc"] = "asc",
+):
+    """Get the cheapest (asc) or most expensive (desc) products"""
+    return await _rows_response(
+        await adb.top_products(limit, category=category, descending=order == "desc"), PRODUCT_LIST
+    )
+
+
+@app.get("/products/search", response_model=List[Product])
+async def search_products(
+    q: str = Query(..., min_length=1),
+    limit: int = Query(10, ge=1, le=MAX_PAGE_SIZE),
+    offset: int = Query(0, ge=0),
+):
+    """Full-text search over product names and descriptions, best match first"""
+    return await _rows_response(await adb.search_products(q, limit=limit, offset=offset), PRODUCT_LIST)
+
+
+@app.get("/products/export")
+def export_products():
+    """Stream every product as NDJSON"""
+    return StreamingResponse(
+        _ndjson_stream(adb.iter_products(), Product), media_type=NDJSON_MEDIA_TYPE
+    )
+
+
+@app.get("/products/changes", response_model=ProductChanges)
+async def get_product_changes(since: int = Query(0, ge=0)):
+    """Get the products written and the ids deleted after version ``since``.
+
+    Pass the returned ``version`` as ``since`` next time; ``since=0`` lists
+    every product. A 410 means deletes since then have been forgotten and
+    the client has to start over from a full read.
+    """
+    return await _changes_since("products", since)
+
+
+@app.get("/products/{product_id}", response_model=Product)
+async def get_product(product_id: int, request: Request, response: Response):
+    """Get a product by ID"""
+    # Read the version first, so a racing write can only make the ETag stale.
+    version = await adb.product_version(product_id)
+    product = await adb.get_product(product_id)
+    if not product:
+        raise HTTPException(status_code=404, detail="Product not found")
+    not_modified = _conditional(request, response, _row_etag("products", product_id, version))
+    if not_modified:
+        return not_modified
+    return product
 
 
 @app.post("/products", response_model=Product)
-def create_product(product: ProductCreate):
+async def create_product(product: ProductCreate):
     """Create a new product"""
     # TODO: Add validation logic here
-    return db.create_product(product)
+    return await adb.create_product(product)
+
+
+@app.post("/products/bulk", response_model=BulkResponse)
+async def create_products_bulk(request: Request):
+    """Create products from a JSON array or NDJSON body"""
+    items, errors = await _read_bulk_items(request, ProductCreate)
+    created = await adb.create_products([item for item in items if item is not None])
+    return _bulk_response(items, errors, created, "Product not found")
+
+
+@app.patch("/products/bulk", response_model=BulkResponse)
+async def update_products_bulk(request: Request):
+    """Apply partial updates, each item carrying the product id"""
+    items, errors = await _read_bulk_items(request, ProductBulkUpdate)
+    updated = await adb.update_products(_split_bulk_updates(items, ProductUpdate))
+    return _bulk_response(items, errors, updated, "Product not found")
+
+
+@app.delete("/products/bulk", response_model=BulkResponse)
+async def delete_products_bulk(product_ids: List[int] = Body(..., max_length=MAX_BULK_ITEMS)):
+    """Delete products by id"""
+    deleted = await adb.delete_products(product_ids)
+    return _bulk_response(product_ids, {}, deleted, "Product not found")
 
 
 @app.put("/products/{product_id}", response_model=Product)
-def update_product(product_id: int, product_update: ProductUpdate):
-    """Update an existing product"""
-    # TODO: Add validation and error handling
-    updated_product = db.update_product(product_id, product_update)
+async def update_product(
+    product_id: int, product_update: ProductUpdate, request: Request, response: Response
+):
+    """Update an existing product.
+
+    Send the product's ETag as If-Match to update only if nobody else has
+    since; a 412 carries the current ETag instead.
+    """
+    expected = await _expected_version(request, "products", product_id, adb.product_version)
+    updated_product = await adb.update_product(product_id, product_update, expected)
     if not updated_product:
         raise HTTPException(status_code=404, detail="Product not found")
+    if expected is not None:
+        response.headers["ETag"] = _row_etag("products", product_id, expected + 1)
     return updated_product
 
 
 
 @app.delete("/products/{product_id}")
-def delete_product(product_id: int):
-    """Delete a product"""
-    # TODO: Add proper response handling
-    success = db.delete_product(product_id)
+async def delete_product(product_id: int, request: Request):
+    """Delete a product, honoring If-Match like PUT"""
+    expected = await _expected_version(request, "products", product_id, adb.product_version)
+    success = await adb.delete_product(product_id, expected)
     if not success:
         raise HTTPException(status_code=404, detail="Product not found")
     return {"message": "Product deleted successfully"}
 
-@app.post("/users", response_model=User)
-def create_user(user: UserCreate):
-    """Create a new user"""
-    return db.create_user(user)
+async def _hash_passwords(items: List[BaseModel]) -> List[BaseModel]:
+    """Copy ``UserCreate``/``UserUpdate`` items with their passwords replaced by hashes."""
+    indexes = [index for index, item in enumerate(items) if item.password is not None]
+    hashes = await password_hasher.hash_many([items[index].password for index in indexes])
+    items = list(items)
+    for index, hashed in zip(indexes, hashes):
+        items[index] = items[index].model_copy(update={"password": hashed})
+    return items
+
+
+@app.post("/users", response_model=UserPublic)
+async def create_user(user: UserCreate):
+    """Create a new user; the password is stored as a scrypt hash"""
+    hashed = await password_hasher.hash(user.password)
+    return await adb.create_user(user.model_copy(update={"password": hashed}))
+
+@app.post("/users/bulk", response_model=BulkResponse)
+async def create_users_bulk(request: Request):
+    """Create users from a JSON array or NDJSON body"""
+    items, errors = await _read_bulk_items(request, UserCreate)
+    created = await adb.create_users(
+        await _hash_passwords([item for item in items if item is not None])
+    )
+    return _bulk_response(items, errors, created, "User not found")
+
+
+@app.patch("/users/bulk", response_model=BulkResponse)
+async def update_users_bulk(request: Request):
+    """Apply partial updates, each item carrying the user id"""
+    items, errors = await _read_bulk_items(request, UserBulkUpdate)
+    updates = _split_bulk_updates(items, UserUpdate)
+    hashed = await _hash_passwords([update for _, update in updates])
+    updated = await adb.update_users(
+        [(user_id, update) for (user_id, _), update in zip(updates, hashed)]
+    )
+    return _bulk_response(items, errors, updated, "User not found")
+
+
+@app.post("/users/verify", response_model=UserPublic)
+async def verify_user(credentials: UserCredentials):
+    """Check an email and password, returning the user they belong to or a 401"""
+    user = await adb.get_user_by_email(credentials.email)
+    if user is None:
+        # Spend the same time on unknown emails as on wrong passwords.
+        await password_hasher.verify(credentials.password, password_hasher.unknown_user_hash)
+        raise HTTPException(status_code=401, detail="Invalid email or password")
+    if not await password_hasher.verify(credentials.password, user.password):
+        raise HTTPException(status_code=401, detail="Invalid email or password")
+    if password_hasher.needs_rehash(user.password):
+        await _rehash_password(user.id, credentials.password)
+    return user
+
+
+async def _rehash_password(user_id: int, password: str):
+    """Store a fresh hash of a verified password, unless the user changed meanwhile."""
+    version = await adb.user_version(user_id)
+    try:
+        hashed = await password_hasher.hash(password)
+        await adb.update_user(user_id, UserUpdate(password=hashed), version)
+    except (PasswordHasherBusy, VersionConflict):
+        pass  # The old hash still verifies; the next login retries.
+
+
+@app.delete("/users/bulk", response_model=BulkResponse)
+async def delete_users_bulk(user_ids: List[int] = Body(..., max_length=MAX_BULK_ITEMS)):
+    """Delete users by id"""
+    deleted = await adb.delete_users(user_ids)
+    return _bulk_response(user_ids, {}, deleted, "User not found")
 
 @app.delete("/users/{user_id}")
-def delete_user(user_id: int):
-    """Delete a user"""
-    return db.delete_user(user_id)
+async def delete_user(user_id: int, request: Request):
+    """Delete a user, honoring If-Match like PUT"""
+    expected = await _expected_version(request, "users", user_id, adb.user_version)
+    return await adb.delete_user(user_id, expected)
+
+@app.get("/users", response_model=List[UserPublic])
+async def get_users(
+    request: Request,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    after_id: Optional[int] = None,
+    sort: Literal["id", "name", "email", "created_at"] = "id",
+    order: Literal["asc", "desc"] = "asc",
+):
+    """Get users, optionally sorted and paginated like GET /products."""
+    def load() -> Awaitable[Page]:
+        return adb.query_users(
+            limit=limit, after_id=after_id, sort_by=sort, descending=order == "desc"
+        )
+
+    return await _list_response(request, response, "users", USER_LIST, load)
+
 
-@app.get("/users", response_model=List[User])
-def get_users():
-    """Get all users"""
-    return db.get_all_users()
+@app.get("/users/export")
+def export_users():
+    """Stream every user as NDJSON"""
+    return StreamingResponse(_ndjson_stream(adb.iter_users(), UserPublic), media_type=NDJSON_MEDIA_TYPE)
 
 
-@app.get("/users/{user_id}", response_model=User)
-def get_user(user_id: int):
+@app.get("/users/changes", response_model=UserChanges)
+async def get_user_changes(since: int = Query(0, ge=0)):
+    """Get the users written and the ids deleted after version ``since``, like products"""
+    return await _changes_since("users", since)
+
+
+@app.get("/users/by-email/{email}", response_model=UserPublic)
+async def get_user_by_email(email: str):
+    """Get a user by email, ignoring case and surrounding whitespace"""
+    user = await adb.get_user_by_email(email)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    return user
+
+
+@app.get("/users/{user_id}", response_model=UserPublic)
+async def get_user(user_id: int, request: Request, response: Response):
     """Get a user by ID"""
-    user = db.get_user(user_id)
+    version = await adb.user_version(user_id)
+    user = await adb.get_user(user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
+    not_modified = _conditional(request, response, _row_etag("users", user_id, version))
+    if not_modified:
+        return not_modified
     return user
 
 
-@app.put("/users/{user_id}", response_model=User)
-def update_user(user_id: int, user_update: UserUpdate):
-    """Update an existing user"""
-    updated_user = db.update_user(user_id, user_update)
+@app.put("/users/{user_id}", response_model=UserPublic)
+async def update_user(
+    user_id: int, user_update: UserUpdate, request: Request, response: Response
+):
+    """Update an existing user, honoring If-Match like PUT /products/{id}"""
+    expected = await _expected_version(request, "users", user_id, adb.user_version)
+    if user_update.password is not None:
+        hashed = await password_hasher.hash(user_update.password)
+        user_update = user_update.model_copy(update={"password": hashed})
+    updated_user = await adb.update_user(user_id, user_update, expected)
     if not updated_user:
         raise HTTPException(status_code=404, detail="User not found")
+    if expected is not None:
+        response.headers["ETag"] = _row_etag("users", user_id, expected + 1)
     return updated_user
 
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    # Imported here so that loading the app, e.g. in tests, skips uvicorn.
+    import uvicorn
+
+    if settings.workers > 1:
+        # Each worker is its own process, so they can only agree on the data
+        # through a store they all open. Response caches and ETags stay
+        # consistent because they key off the collection versions in that store.
+        if settings.storage_backend != "sqlite":
+            raise SystemExit("CRUD_WORKERS > 1 requires CRUD_STORAGE=sqlite")
+        # Importing this module opened the file here, so only this process
+        # can see it fresh; the workers' lifespans then find nothing to seed.
+        if settings.seed_sample_data:
+            db.seed_sample_data()
+        db.close()
+        uvicorn.run(
+            "main:app", host=settings.host, port=settings.port, workers=settings.workers
+        )
+    else:
+        uvicorn.run(app, host=settings.host, port=settings.port)
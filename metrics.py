@@ -0,0 +1,324 @@
+"""Request and database metrics, exposed in the Prometheus text format."""
+import threading
+import time
+import weakref
+from bisect import bisect_left
+from functools import wraps
+from typing import Callable, Dict, Iterable, Sequence, Tuple
+
+Labels = Tuple[str, ...]
+
+# Seconds; spans microsecond point reads through multi-second bulk writes.
+LATENCY_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0,
+    2.5, 5.0, 10.0,
+)
+
+# Starlette appends the charset to text responses.
+CONTENT_TYPE = "text/plain; version=0.0.4"
+
+# Route label of requests no route matched, so unknown paths can't add series.
+UNMATCHED_ROUTE = "<unmatched>"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Labels, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+def _add_into(total: Dict[Labels, list], shard: Dict[Labels, list]):
+    """Add each series of ``shard`` into ``total``."""
+    for labels, values in shard.items():
+        series = total.get(labels)
+        if series is None:
+            total[labels] = list(values)
+        else:
+            for index, value in enumerate(values):
+                series[index] += value
+
+
+class _ShardOwner:
+    """Per-thread object whose collection tells a metric that the thread has exited."""
+
+    __slots__ = ("__weakref__",)
+
+
+class _Metric:
+    """A metric family whose samples are kept per thread and merged when scraped.
+
+    Each thread updates only its own shard, so recording takes no lock and
+    never contends; the shard list is locked only when a thread first
+    records. Scrapes copy each shard, which is atomic under the GIL, and may
+    miss an update that is in flight, which the next scrape picks up.
+
+    Worker threads come and go, so when a thread exits its shard is folded
+    into a single retired total and dropped, which keeps the number of
+    shards at the number of live threads.
+    """
+
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._local = threading.local()
+        self._shards: Dict[int, dict] = {}
+        self._retired: Dict[Labels, list] = {}
+        self._shards_lock = threading.Lock()
+
+    def _shard(self) -> dict:
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = self._local.shard = {}
+            # Only the thread-local holds the owner, so it dies with the thread.
+            owner = self._local.owner = _ShardOwner()
+            with self._shards_lock:
+                self._shards[id(shard)] = shard
+            weakref.finalize(owner, self._retire, shard)
+            return shard
+
+    def _retire(self, shard: dict):
+        with self._shards_lock:
+            del self._shards[id(shard)]
+            _add_into(self._retired, shard)
+
+    def _merged(self) -> Dict[Labels, list]:
+        with self._shards_lock:
+            shards = list(self._shards.values())
+            merged: Dict[Labels, list] = {}
+            _add_into(merged, self._retired)
+        for shard in shards:
+            _add_into(merged, shard.copy())
+        return merged
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} {self.kind}"
+        for labels, values in sorted(self._merged().items()):
+            yield from self._samples(labels, values)
+
+    def _samples(self, labels: Labels, values: list) -> Iterable[str]:
+        yield f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(values[0])}"
+
+
+class Counter(_Metric):
+    """A count that only goes up."""
+
+    kind = "counter"
+
+    def inc(self, labels: Labels = (), amount: float = 1):
+        shard = self._shard()
+        values = shard.get(labels)
+        if values is None:
+            shard[labels] = [amount]
+        else:
+            values[0] += amount
+
+
+class Gauge(Counter):
+    """A value that goes up and down, such as requests in progress."""
+
+    kind = "gauge"
+
+    def dec(self, labels: Labels = (), amount: float = 1):
+        self.inc(labels, -amount)
+
+
+class Histogram(_Metric):
+    """Observations counted into cumulative ``buckets``, plus their sum."""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, labels: Labels, value: float):
+        shard = self._shard()
+        values = shard.get(labels)
+        if values is None:
+            # One slot per bucket, one past the last bucket, then the sum.
+            values = shard[labels] = [0] * (len(self.buckets) + 2)
+        values[bisect_left(self.buckets, value)] += 1
+        values[-1] += value
+
+    def _samples(self, labels: Labels, values: list) -> Iterable[str]:
+        cumulative = 0
+        for bound, count in zip((*self.buckets, float("inf")), values):
+            cumulative += count
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            label_text = _format_labels(self.labelnames, labels, f'le="{le}"')
+            yield f"{self.name}_bucket{label_text} {cumulative}"
+        label_text = _format_labels(self.labelnames, labels)
+        yield f"{self.name}_sum{label_text} {_format_value(values[-1])}"
+        # Derived from the buckets so that it always equals the +Inf bucket.
+        yield f"{self.name}_count{label_text} {cumulative}"
+
+
+class GaugeFunction:
+    """A gauge read from ``collect`` at scrape time, e.g. a collection's size."""
+
+    kind = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str],
+        collect: Callable[[], Iterable[Tuple[Labels, float]]],
+    ):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.collect = collect
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} {self.kind}"
+        for labels, value in self.collect():
+            yield f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+
+
+class Registry:
+    """The metric families served from one ``/metrics`` endpoint."""
+
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+
+    def register(self, metric):
+        """Add ``metric``, or return the one already registered under its name.
+
+        Registering twice is harmless, e.g. when Starlette rebuilds its
+        middleware stack and so constructs ``MetricsMiddleware`` again.
+        """
+        return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, help, labelnames))
+
+    def gauge(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Histogram:
+        return self.register(Histogram(name, help, labelnames))
+
+    def gauge_function(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str],
+        collect: Callable[[], Iterable[Tuple[Labels, float]]],
+    ) -> GaugeFunction:
+        return self.register(GaugeFunction(name, help, labelnames, collect))
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        metrics = list(self._metrics.values())
+        return "\n".join(line for metric in metrics for line in metric.render()) + "\n"
+
+
+class MetricsMiddleware:
+    """ASGI middleware counting requests and timing them per route.
+
+    Requests are labelled with the route's path template, such as
+    ``/products/{product_id}``, rather than the raw path, which keeps the
+    number of series bounded. The time runs until the last body chunk has
+    been sent, so streamed responses are timed in full.
+    """
+
+    def __init__(self, app, registry: Registry):
+        self.app = app
+        self.requests = registry.counter(
+            "http_requests_total", "HTTP requests by route and status.",
+            ("method", "route", "status"),
+        )
+        self.latency = registry.histogram(
+            "http_request_duration_seconds", "Time to serve HTTP requests, by route.",
+            ("method", "route"),
+        )
+        self.in_progress = registry.gauge(
+            "http_requests_in_progress", "HTTP requests being served.", ("method",)
+        )
+        self._routes: Dict[object, str] = {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        method = (scope["method"],)
+        status = "500"
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = str(message["status"])
+            await send(message)
+
+        self.in_progress.inc(method)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.in_progress.dec(method)
+            route = self._route(scope)
+            self.requests.inc((scope["method"], route, status))
+            self.latency.observe((scope["method"], route), elapsed)
+
+    def _route(self, scope) -> str:
+        """Path template of the route that handled the request."""
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return UNMATCHED_ROUTE
+        route = self._routes.get(endpoint)
+        if route is None:
+            for candidate in scope["app"].routes:
+                if getattr(candidate, "endpoint", None) is not None:
+                    self._routes[candidate.endpoint] = candidate.path
+            route = self._routes.get(endpoint, UNMATCHED_ROUTE)
+        return route
+
+
+def instrument(backend, registry: Registry, methods: Iterable[str]) -> Histogram:
+    """Time calls to ``methods`` of a storage backend instance.
+
+    The methods are wrapped on the instance, so callers that look them up
+    at call time, like ``AsyncDatabase``, are timed without changes.
+    Errors are timed too, under the same label.
+    """
+    latency = registry.histogram(
+        "db_operation_duration_seconds", "Time spent in storage backend methods.", ("method",)
+    )
+    for name in methods:
+        setattr(backend, name, _timed(getattr(backend, name), latency, (name,)))
+    return latency
+
+
+def _timed(method: Callable, latency: Histogram, labels: Labels) -> Callable:
+    @wraps(method)
+    def timed(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            latency.observe(labels, time.perf_counter() - start)
+
+    return timed
@@ -1,8 +1,8 @@
 """Pydantic models for product data structures."""
-from typing import Optional, List
+from typing import Any, Optional, List
 from datetime import datetime
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 
 class Product(BaseModel):
@@ -36,15 +36,31 @@ class ProductUpdate(BaseModel):
     tags: Optional[List[str]] = None
     in_stock: Optional[bool] = None
 
-class User(BaseModel):
-    """Model for a user."""
+class ProductBulkUpdate(ProductUpdate):
+    """Model for one item of a bulk product update."""
+    id: int
+
+
+class UserPublic(BaseModel):
+    """Model for a user as returned by the API, without the password."""
     id: int
     name: str
     email: str
-    password: str
     created_at: datetime = datetime.now()
     updated_at: datetime = datetime.now()
-    
+
+
+class User(UserPublic):
+    """Model for a stored user; ``password`` holds the scrypt hash."""
+    password: str = Field(repr=False)
+
+
+class UserCredentials(BaseModel):
+    """Model for checking a user's password."""
+    email: str
+    password: str
+
+
 class UserCreate(BaseModel):
     """Model for creating a new user."""
     name: str
@@ -56,4 +72,36 @@ class UserUpdate(BaseModel):
     name: Optional[str] = None
     email: Optional[str] = None
     password: Optional[str] = None
-    updated_at: datetime = datetime.now()
\ No newline at end of file
+    updated_at: datetime = datetime.now()
+
+
+class UserBulkUpdate(UserUpdate):
+    """Model for one item of a bulk user update."""
+    id: int
+
+
+class BulkItemResult(BaseModel):
+    """Outcome of one item in a bulk request."""
+    index: int
+    status: int
+    id: Optional[int] = None
+    detail: Optional[Any] = None
+
+
+class BulkResponse(BaseModel):
+    """Per-item outcomes of a bulk request, in request order."""
+    results: List[BulkItemResult]
+
+
+class ProductChanges(BaseModel):
+    """Products written and ids deleted since a sync point, and the next sync point."""
+    rows: List[Product]
+    deleted: List[int]
+    version: int
+
+
+class UserChanges(BaseModel):
+    """Users written and ids deleted since a sync point, and the next sync point."""
+    rows: List[UserPublic]
+    deleted: List[int]
+    version: int
@@ -0,0 +1,144 @@
+"""Password hashing with scrypt, kept off the event loop."""
+import asyncio
+import base64
+import hashlib
+import hmac
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Awaitable, Callable, List, Optional, Sequence, TypeVar
+
+T = TypeVar("T")
+
+SALT_BYTES = 16
+KEY_BYTES = 32
+PREFIX = "scrypt"
+
+
+class PasswordHasherBusy(Exception):
+    """More hashing work is queued than the hasher admits; retry later."""
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.b64encode(data).decode("ascii")
+
+
+class PasswordHasher:
+    """Hash and verify passwords with scrypt on a bounded thread pool.
+
+    Hashes are stored as ``scrypt$<n>$<r>$<p>$<salt>$<key>`` with the salt
+    and key in base64, so cost parameters can be raised without breaking
+    existing hashes; ``needs_rehash`` tells which ones are behind. Stored
+    values in any other format are treated as plain text from before
+    hashing, which lets ``verify`` accept them once so they can be rehashed.
+
+    scrypt releases the GIL, so ``workers`` threads hash in parallel
+    without blocking the event loop or the threads serving database calls.
+    At most ``max_pending`` hashes may be running or queued; past that the
+    async methods raise ``PasswordHasherBusy`` at once instead of letting
+    the queue, and every caller's latency, grow without bound.
+    """
+
+    def __init__(
+        self,
+        n: int = 2 ** 14,
+        r: int = 8,
+        p: int = 1,
+        workers: Optional[int] = None,
+        max_pending: Optional[int] = None,
+    ):
+        self.n = n
+        self.r = r
+        self.p = p
+        self.workers = workers or os.cpu_count() or 1
+        self.max_pending = max_pending or self.workers * 16
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix="password-hash")
+
+    @property
+    def unknown_user_hash(self) -> str:
+        """A hash no password matches, with current costs, to verify against for unknown users."""
+        zeros = _b64encode(bytes(SALT_BYTES)), _b64encode(bytes(KEY_BYTES))
+        return f"{PREFIX}${self.n}${self.r}${self.p}${zeros[0]}${zeros[1]}"
+
+    @property
+    def pending(self) -> int:
+        """Hashes admitted and not yet finished."""
+        return self._pending
+
+    def hash_sync(self, password: str) -> str:
+        """Hash ``password`` with a fresh salt, on the calling thread."""
+        salt = os.urandom(SALT_BYTES)
+        key = self._derive(password, salt, self.n, self.r, self.p)
+        return f"{PREFIX}${self.n}${self.r}${self.p}${_b64encode(salt)}${_b64encode(key)}"
+
+    def verify_sync(self, password: str, stored: str) -> bool:
+        """Check ``password`` against a value from ``hash_sync``, on the calling thread."""
+        parts = stored.split("$")
+        if len(parts) != 6 or parts[0] != PREFIX:
+            return hmac.compare_digest(password.encode(), stored.encode())
+        try:
+            n, r, p = int(parts[1]), int(parts[2]), int(parts[3])
+            salt, key = base64.b64decode(parts[4]), base64.b64decode(parts[5])
+        except ValueError:
+            return False
+        return hmac.compare_digest(self._derive(password, salt, n, r, p, len(key)), key)
+
+    def needs_rehash(self, stored: str) -> bool:
+        """Whether ``stored`` is plain text or hashed with other cost parameters."""
+        return not stored.startswith(f"{PREFIX}${self.n}${self.r}${self.p}$")
+
+    async def hash(self, password: str) -> str:
+        """Hash ``password`` in the pool."""
+        return await self._run(1, lambda: self._submit(self.hash_sync, password))
+
+    async def hash_many(self, passwords: Sequence[str]) -> List[str]:
+        """Hash several passwords, using at most ``workers`` pool slots at a time.
+
+        A large batch is admitted as one job per worker, each hashing its
+        share in turn, so it can't crowd single requests out of the queue.
+        """
+        lanes = min(len(passwords), self.workers)
+        hashes: List[str] = [""] * len(passwords)
+
+        async def lane(start: int):
+            for index in range(start, len(passwords), lanes):
+                hashes[index] = await self._submit(self.hash_sync, passwords[index])
+
+        if lanes:
+            await self._run(lanes, lambda: asyncio.gather(*map(lane, range(lanes))))
+        return hashes
+
+    async def verify(self, password: str, stored: str) -> bool:
+        """Check ``password`` against ``stored`` in the pool."""
+        return await self._run(1, lambda: self._submit(self.verify_sync, password, stored))
+
+    def close(self):
+        """Finish queued work and stop the pool's threads."""
+        self._executor.shutdown()
+
+    def _submit(self, function: Callable[..., T], *args) -> "asyncio.Future[T]":
+        return asyncio.wrap_future(self._executor.submit(function, *args))
+
+    async def _run(self, slots: int, start: Callable[[], Awaitable[T]]) -> T:
+        """Start and await some work if ``slots`` more fit under ``max_pending``."""
+        with self._lock:
+            if self._pending + slots > self.max_pending:
+                raise PasswordHasherBusy(f"{self._pending} password hashes pending")
+            self._pending += slots
+        try:
+            return await start()
+        finally:
+            with self._lock:
+                self._pending -= slots
+
+    @staticmethod
+    def _derive(
+        password: str, salt: bytes, n: int, r: int, p: int, length: int = KEY_BYTES
+    ) -> bytes:
+        # scrypt needs 128 * n * r bytes; leave headroom over OpenSSL's 32 MiB default.
+        return hashlib.scrypt(
+            password.encode(), salt=salt, n=n, r=r, p=p, dklen=length,
+            maxmem=256 * n * r * p + 1024 * 1024,
+        )
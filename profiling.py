@@ -0,0 +1,304 @@
+"""Opt-in request profiling and a log of slow requests with their phases."""
+import cProfile
+import functools
+import inspect
+import io
+import logging
+import marshal
+import pstats
+import random
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Callable, Deque, Dict, List, Optional
+
+from fastapi.routing import APIRoute
+
+logger = logging.getLogger("crud.slow")
+
+PROFILE_HEADER = b"x-profile"
+
+
+class RequestTimings:
+    """Points in one request's life, marked as it passes through the app.
+
+    ``start`` is taken by ``ProfilingMiddleware``, ``handler``/``handled``
+    around FastAPI's handler by ``TimedRoute``, ``endpoint``/``endpoint_done``
+    around the endpoint function, and ``end`` once the response is sent.
+    Time spent awaiting ``AsyncDatabase`` is added up in ``db``.
+    """
+
+    __slots__ = ("start", "handler", "endpoint", "endpoint_done", "handled", "end", "db")
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.handler = self.endpoint = self.endpoint_done = self.handled = self.end = None
+        self.db = 0.0
+
+    def phases(self) -> Dict[str, float]:
+        """Milliseconds per phase; together they make up the whole request.
+
+        A phase the request never reached takes no time, and its share goes
+        to the phase before: a request failing validation spends the rest
+        of its time parsing, and one that matched no route, routing.
+        """
+        marks = [self.start, self.handler, self.endpoint, self.endpoint_done, self.handled,
+                 self.end]
+        for index in range(len(marks) - 2, 0, -1):
+            if marks[index] is None:
+                marks[index] = marks[index + 1]
+        routing, parsing, endpoint, serialization, sending = (
+            later - earlier for earlier, later in zip(marks, marks[1:])
+        )
+        phases = {
+            "routing": routing,
+            "parsing": parsing,
+            "endpoint": endpoint - self.db,
+            "db": self.db,
+            "serialization": serialization,
+            "sending": sending,
+        }
+        return {name: seconds * 1000 for name, seconds in phases.items()}
+
+
+_timings: ContextVar[Optional[RequestTimings]] = ContextVar("request_timings", default=None)
+
+
+def add_db_time(seconds: float):
+    """Count ``seconds`` of database work against the current request, if any."""
+    timings = _timings.get()
+    if timings is not None:
+        timings.db += seconds
+
+
+def _mark(name: str):
+    timings = _timings.get()
+    if timings is not None:
+        setattr(timings, name, time.perf_counter())
+
+
+def _timed_endpoint(endpoint: Callable) -> Callable:
+    """Wrap an endpoint to mark when it starts and returns, keeping its signature."""
+    if inspect.iscoroutinefunction(endpoint):
+        @functools.wraps(endpoint)
+        async def timed(*args, **kwargs):
+            _mark("endpoint")
+            try:
+                return await endpoint(*args, **kwargs)
+            finally:
+                _mark("endpoint_done")
+    else:
+        # Sync endpoints run in a worker thread, which inherits the context.
+        @functools.wraps(endpoint)
+        def timed(*args, **kwargs):
+            _mark("endpoint")
+            try:
+                return endpoint(*args, **kwargs)
+            finally:
+                _mark("endpoint_done")
+    return timed
+
+
+class TimedRoute(APIRoute):
+    """Route marking the phases of ``RequestTimings`` around FastAPI's handler.
+
+    Between ``handler`` and ``endpoint`` FastAPI reads and validates the
+    request; between ``endpoint_done`` and ``handled`` it validates and
+    encodes the response.
+    """
+
+    def __init__(self, path: str, endpoint: Callable, **kwargs):
+        super().__init__(path, _timed_endpoint(endpoint), **kwargs)
+
+    def get_route_handler(self) -> Callable:
+        handler = super().get_route_handler()
+
+        async def timed_handler(request):
+            _mark("handler")
+            response = await handler(request)
+            _mark("handled")
+            return response
+
+        return timed_handler
+
+
+class CapturedProfile:
+    """One request's cProfile data and what the request was."""
+
+    __slots__ = ("id", "time", "method", "path", "status", "duration_ms", "reason", "phases",
+                 "stats")
+
+    def __init__(self, id: int, method: str, path: str, status: int, duration_ms: float,
+                 reason: str, phases: Dict[str, float], stats: dict):
+        self.id = id
+        self.time = datetime.now(timezone.utc)
+        self.method = method
+        self.path = path
+        self.status = status
+        self.duration_ms = duration_ms
+        self.reason = reason
+        self.phases = phases
+        self.stats = stats
+
+    def summary(self) -> dict:
+        return {
+            "id": self.id,
+            "time": self.time.isoformat(),
+            "method": self.method,
+            "path": self.path,
+            "status": self.status,
+            "duration_ms": self.duration_ms,
+            "reason": self.reason,
+            "phases": self.phases,
+        }
+
+    def dump(self) -> bytes:
+        """The profile in the file format of ``cProfile``'s ``dump_stats``."""
+        return marshal.dumps(self.stats)
+
+    def text(self, limit: int = 40) -> str:
+        """The ``limit`` functions with the most cumulative time, as ``pstats`` prints them."""
+        output = io.StringIO()
+        stats = pstats.Stats(_LoadedProfile(self.stats), stream=output)
+        stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(limit)
+        return output.getvalue()
+
+
+class _LoadedProfile:
+    """Adapter handing ``pstats.Stats`` a captured profile without a file."""
+
+    def __init__(self, stats: dict):
+        self.stats = stats
+
+    def create_stats(self):
+        pass
+
+
+class Profiler:
+    """Decides which requests to profile and keeps the recent results.
+
+    A request is profiled when it sends ``X-Profile`` with ``header_value``,
+    if that is set, or is picked at ``sample_rate``. cProfile follows one
+    thread, and every task on the event loop shares it, so only one request
+    is profiled at a time and requests that would overlap it are skipped;
+    whatever else ran on the loop meanwhile shows up in its profile too.
+    Work offloaded to worker threads, such as database writes, appears only
+    as the time spent awaiting it.
+
+    Every request slower than ``slow_ms`` is logged to ``crud.slow`` with
+    its phases and kept in a second ring buffer.
+    """
+
+    def __init__(
+        self,
+        capacity: int = 20,
+        sample_rate: float = 0.0,
+        header_value: Optional[str] = None,
+        slow_ms: float = 0.0,
+    ):
+        self.sample_rate = sample_rate
+        self.header_value = header_value
+        self.slow_ms = slow_ms
+        self.profiles: Deque[CapturedProfile] = deque(maxlen=capacity)
+        self.slow_requests: Deque[dict] = deque(maxlen=capacity * 5)
+        self._busy = threading.Lock()
+        self._next_id = 1
+
+    def reason(self, headers: List) -> Optional[str]:
+        """Why a request with these headers should be profiled, or ``None``."""
+        if self.header_value is not None:
+            for key, value in headers:
+                if key.lower() == PROFILE_HEADER:
+                    if value.decode("latin-1") == self.header_value:
+                        return "header"
+                    break
+        if self.sample_rate and random.random() < self.sample_rate:
+            return "sample"
+        return None
+
+    def get(self, profile_id: int) -> Optional[CapturedProfile]:
+        for profile in self.profiles:
+            if profile.id == profile_id:
+                return profile
+        return None
+
+    def try_start(self) -> Optional[cProfile.Profile]:
+        """Start profiling the current request, or return ``None`` if one already is.
+
+        A started profile must be handed to ``stop`` to free the slot.
+        """
+        if not self._busy.acquire(blocking=False):
+            return None
+        profile = cProfile.Profile()
+        profile.enable()
+        return profile
+
+    def stop(self, profile: cProfile.Profile):
+        """Stop a profile from ``try_start`` and let the next request be profiled."""
+        profile.disable()
+        self._busy.release()
+
+    def record(self, scope, status: int, timings: RequestTimings,
+               reason: Optional[str], profile: Optional[cProfile.Profile]):
+        """Keep a stopped profile and log the request if it was slow."""
+        duration_ms = (timings.end - timings.start) * 1000
+        if profile is None and not (self.slow_ms and duration_ms >= self.slow_ms):
+            return
+        phases = timings.phases()
+        path = scope["path"] + (f"?{scope['query_string'].decode('latin-1')}"
+                                if scope.get("query_string") else "")
+        if self.slow_ms and duration_ms >= self.slow_ms:
+            self.slow_requests.append({
+                "time": datetime.now(timezone.utc).isoformat(),
+                "method": scope["method"],
+                "path": path,
+                "status": status,
+                "duration_ms": duration_ms,
+                "phases": phases,
+            })
+            logger.warning(
+                "slow request %s %s %d %.1f ms: %s", scope["method"], path, status, duration_ms,
+                " ".join(f"{name}={ms:.1f}" for name, ms in phases.items()),
+            )
+        if profile is not None:
+            profile.create_stats()
+            self.profiles.append(CapturedProfile(
+                self._next_id, scope["method"], path, status, duration_ms, reason, phases,
+                profile.stats,
+            ))
+            self._next_id += 1
+
+
+class ProfilingMiddleware:
+    """ASGI middleware timing each request's phases and profiling the chosen ones."""
+
+    def __init__(self, app, profiler: Profiler):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        timings = RequestTimings()
+        token = _timings.set(timings)
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        reason = self.profiler.reason(scope["headers"])
+        profile = self.profiler.try_start() if reason is not None else None
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            if profile is not None:
+                self.profiler.stop(profile)
+            timings.end = time.perf_counter()
+            _timings.reset(token)
+            self.profiler.record(scope, status, timings, reason, profile)
@@ -0,0 +1,134 @@
+"""Compact stored forms of products and users for the in-memory backend.
+
+A Pydantic model instance carries a ``__dict__``, a fields-set ``set`` and,
+for products, a ``tags`` list, which together cost several hundred bytes per
+row. Records keep the same attributes in ``__slots__`` instead, with
+categories and tags interned so that every row shares one string per
+distinct value and tags held as a tuple.
+
+The database hands out models, never records: ``to_model`` materializes a
+fresh ``Product`` or ``User`` without re-running validation, since stored
+values were validated on the way in.
+"""
+from datetime import datetime
+from sys import intern
+from typing import Any, Dict, Iterable, Tuple, Type
+
+from pydantic import BaseModel
+
+from models import Product, User
+
+_set_attribute = object.__setattr__
+
+
+def construct(model: Type[BaseModel], values: Dict[str, Any]) -> BaseModel:
+    """Build a ``model`` from trusted values for all of its fields, in field order.
+
+    Equivalent to ``model.model_construct(**values)`` without its per-field
+    lookups, which cost more than the rest of a read.
+    """
+    row = model.__new__(model)
+    _set_attribute(row, "__dict__", values)
+    _set_attribute(row, "__pydantic_fields_set__", set(values))
+    _set_attribute(row, "__pydantic_extra__", None)
+    _set_attribute(row, "__pydantic_private__", None)
+    return row
+
+
+def intern_tags(tags: Iterable[str]) -> Tuple[str, ...]:
+    """Store tags as a tuple of interned strings."""
+    return tuple(map(intern, tags))
+
+
+class ProductRecord:
+    """A stored product."""
+
+    __slots__ = (
+        "id", "name", "description", "price", "category", "tags", "in_stock", "created_at",
+    )
+
+    def __init__(
+        self,
+        id: int,
+        name: str,
+        description: str,
+        price: float,
+        category: str,
+        tags: Iterable[str],
+        in_stock: bool,
+        created_at: datetime,
+    ):
+        self.id = id
+        self.name = name
+        self.description = description
+        self.price = price
+        self.category = intern(category)
+        self.tags = intern_tags(tags)
+        self.in_stock = in_stock
+        self.created_at = created_at
+
+    @classmethod
+    def from_model(cls, product: Product) -> "ProductRecord":
+        return cls(
+            product.id, product.name, product.description, product.price,
+            product.category, product.tags, product.in_stock, product.created_at,
+        )
+
+    def update(self, fields: Dict[str, Any]):
+        """Apply a partial update such as ``ProductUpdate.model_dump(exclude_unset=True)``."""
+        for field, value in fields.items():
+            if field == "category":
+                value = intern(value)
+            elif field == "tags":
+                value = intern_tags(value)
+            setattr(self, field, value)
+
+    def to_model(self) -> Product:
+        return construct(Product, {
+            "id": self.id,
+            "name": self.name,
+            "description": self.description,
+            "price": self.price,
+            "category": self.category,
+            "tags": list(self.tags),
+            "in_stock": self.in_stock,
+            "created_at": self.created_at,
+        })
+
+
+class UserRecord:
+    """A stored user."""
+
+    __slots__ = ("id", "name", "email", "created_at", "updated_at", "password")
+
+    def __init__(
+        self,
+        id: int,
+        name: str,
+        email: str,
+        created_at: datetime,
+        updated_at: datetime,
+        password: str,
+    ):
+        self.id = id
+        self.name = name
+        self.email = email
+        self.created_at = created_at
+        self.updated_at = updated_at
+        self.password = password
+
+    @classmethod
+    def from_model(cls, user: User) -> "UserRecord":
+        return cls(
+            user.id, user.name, user.email, user.created_at, user.updated_at, user.password,
+        )
+
+    def to_model(self) -> User:
+        return construct(User, {
+            "id": self.id,
+            "name": self.name,
+            "email": self.email,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+            "password": self.password,
+        })
@@ -0,0 +1,141 @@
+"""In-process full-text search over product names and descriptions."""
+import heapq
+import math
+import re
+from collections import Counter
+from typing import Dict, List, Set, Tuple
+
+_TOKEN_RE = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Split text into lowercase word tokens."""
+    return _TOKEN_RE.findall(text.lower())
+
+
+class InvertedIndex:
+    """Inverted index ranking documents with Okapi BM25.
+
+    Documents are added, replaced and removed one at a time, so the index is
+    kept current by the database write path and queries only touch the
+    postings of their own terms.
+
+    Each term's postings are also grouped into impact buckets by term
+    frequency and document length, the two things a posting's score depends
+    on, so every document in a bucket scores the same for that term. Queries
+    visit buckets best first and stop once no unvisited document could reach
+    the results, which keeps common terms from scoring their whole posting
+    list.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings: Dict[str, Dict[int, int]] = {}
+        self._impacts: Dict[str, Dict[Tuple[int, int], Set[int]]] = {}
+        self._doc_terms: Dict[int, Tuple[str, ...]] = {}
+        self._doc_lengths: Dict[int, int] = {}
+        self._total_length = 0
+
+    def __len__(self) -> int:
+        return len(self._doc_lengths)
+
+    def add(self, doc_id: int, text: str):
+        """Index ``text`` under ``doc_id``, replacing any previous version."""
+        if doc_id in self._doc_lengths:
+            self.remove(doc_id)
+        tokens = tokenize(text)
+        counts = Counter(tokens)
+        for term, frequency in counts.items():
+            self._postings.setdefault(term, {})[doc_id] = frequency
+            buckets = self._impacts.setdefault(term, {})
+            buckets.setdefault((frequency, len(tokens)), set()).add(doc_id)
+        self._doc_terms[doc_id] = tuple(counts)
+        self._doc_lengths[doc_id] = len(tokens)
+        self._total_length += len(tokens)
+
+    def remove(self, doc_id: int):
+        """Drop ``doc_id`` from the index if present."""
+        terms = self._doc_terms.pop(doc_id, None)
+        if terms is None:
+            return
+        length = self._doc_lengths[doc_id]
+        for term in terms:
+            postings = self._postings[term]
+            bucket_key = (postings.pop(doc_id), length)
+            buckets = self._impacts[term]
+            buckets[bucket_key].discard(doc_id)
+            if not buckets[bucket_key]:
+                del buckets[bucket_key]
+            if not postings:
+                del self._postings[term]
+                del self._impacts[term]
+        self._total_length -= self._doc_lengths.pop(doc_id)
+
+    def search(self, query: str, limit: int = 10, offset: int = 0) -> List[Tuple[int, float]]:
+        """Return ``(doc_id, score)`` pairs for the best matches, best first."""
+        if not self._doc_lengths or offset + limit <= 0:
+            return []
+        k1, b = self.k1, self.b
+        doc_count = len(self._doc_lengths)
+        average_length = self._total_length / doc_count or 1.0
+        doc_lengths = self._doc_lengths
+        # BM25 length normalisation k1 * (1 - b + b * dl / avgdl), split so
+        # scoring a posting is one multiply-add.
+        norm = k1 * (1 - b)
+        slope = k1 * b / average_length
+
+        terms = []
+        buckets = []
+        for term in set(tokenize(query)):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (doc_count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for (frequency, length), doc_ids in self._impacts[term].items():
+                weight = idf * frequency * (k1 + 1) / (frequency + norm + slope * length)
+                buckets.append((weight, len(terms), doc_ids))
+            terms.append((postings, idf))
+        buckets.sort(key=lambda bucket: bucket[0], reverse=True)
+
+        def score(doc_id: int) -> float:
+            length = doc_lengths[doc_id]
+            total = 0.0
+            for postings, idf in terms:
+                frequency = postings.get(doc_id)
+                if frequency:
+                    total += idf * frequency * (k1 + 1) / (frequency + norm + slope * length)
+            return total
+
+        # The best weight each term has left to give, taken from its next
+        # bucket; their sum bounds the score of any document not yet seen.
+        # Each bucket carries the weight of its term's bucket after it.
+        remaining = [0.0] * len(terms)
+        plan = []
+        for weight, term_index, doc_ids in reversed(buckets):
+            plan.append((weight, term_index, doc_ids, remaining[term_index]))
+            remaining[term_index] = weight
+        plan.reverse()
+        wanted = offset + limit
+        # Min-heap of the best ``wanted`` (score, -doc_id) pairs so far; ties
+        # go to the lower id so pages are stable across calls.
+        best: List[Tuple[float, int]] = []
+        seen: Set[int] = set()
+        for weight, term_index, doc_ids, after in plan:
+            if len(best) >= wanted and best[0][0] > sum(remaining):
+                break
+            if len(terms) == 1:
+                # Every document in the bucket scores ``weight``; only the
+                # lowest ids can still make the cut.
+                doc_ids = heapq.nsmallest(wanted, doc_ids)
+            for doc_id in doc_ids:
+                if doc_id in seen:
+                    continue
+                seen.add(doc_id)
+                item = (weight if len(terms) == 1 else score(doc_id), -doc_id)
+                if len(best) < wanted:
+                    heapq.heappush(best, item)
+                elif item > best[0]:
+                    heapq.heapreplace(best, item)
+            remaining[term_index] = after
+        return [(-negated, doc_score) for doc_score, negated in sorted(best, reverse=True)][offset:]
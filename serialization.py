@@ -0,0 +1,36 @@
+"""Fast JSON encoding for rows that the database has already validated."""
+from typing import Dict, List, Optional, Sequence
+
+from fastapi import Response
+from pydantic import BaseModel, TypeAdapter
+
+from models import Product, UserPublic
+from storage import Change
+
+# Stored rows are dumped straight to bytes through these prebuilt adapters,
+# skipping the validate-then-dump round trip of ``response_model``. Users are
+# dumped through the public schema, which has no password field, so the
+# stored password can never be written out.
+PRODUCT_LIST = TypeAdapter(List[Product])
+USER_LIST = TypeAdapter(List[UserPublic])
+ROWS = {"products": TypeAdapter(Product), "users": TypeAdapter(UserPublic)}
+
+
+def json_response(
+    rows: Sequence[BaseModel],
+    adapter: TypeAdapter,
+    headers: Optional[Dict[str, str]] = None,
+) -> Response:
+    """Encode ``rows`` with ``adapter`` into a ready-to-send JSON response."""
+    return Response(adapter.dump_json(rows), media_type="application/json", headers=headers)
+
+
+def encode_change(change: Change) -> bytes:
+    """Encode a write as the JSON sent to change feed clients."""
+    row = ROWS[change.collection].dump_json(change.row) if change.row is not None else b"null"
+    head = (
+        f'{{"collection":"{change.collection}","op":"{change.op}",'
+        f'"id":{"null" if change.row_id is None else change.row_id},'
+        f'"version":{change.version},"row":'
+    )
+    return head.encode() + row + b"}"
@@ -0,0 +1,148 @@
+"""Columnar binary snapshots that load with one mmap and no per-row parsing.
+
+A snapshot holds named tables of equally long columns. Each column is stored
+as one or more contiguous, 8-byte aligned sections:
+
+- ``q`` int64 and ``d`` float64 values, and ``B`` uint8 flags, as raw arrays
+  that load with a single ``memoryview`` cast of the mapped file;
+- ``s`` strings, as an int64 array of code point offsets followed by the
+  UTF-8 text of every value, which is decoded once and sliced;
+- ``l`` lists of strings, as an int64 array of per-row counts followed by
+  an ``s`` column of the flattened values.
+
+A JSON footer records each section's position, the table sizes and caller
+metadata; the file ends with the footer's offset, length and the magic.
+"""
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+from itertools import accumulate, chain
+from typing import Dict, List, Sequence, Tuple
+
+MAGIC = b"CRUDSNP1"
+TRAILER = struct.Struct("<QQ8s")
+ALIGNMENT = 8
+
+Columns = Dict[str, Tuple[str, Sequence]]
+
+
+def _write_section(f, data: bytes) -> List[int]:
+    """Write ``data`` at the next aligned offset and return ``[offset, length]``."""
+    f.write(b"\0" * (-f.tell() % ALIGNMENT))
+    offset = f.tell()
+    f.write(data)
+    return [offset, len(data)]
+
+
+def _write_strings(f, values: Sequence[str]) -> List[List[int]]:
+    offsets = array("q", accumulate(chain((0,), map(len, values))))
+    return [_write_section(f, offsets.tobytes()), _write_section(f, "".join(values).encode())]
+
+
+def write_snapshot(path: str, meta: dict, tables: Dict[str, Columns]):
+    """Atomically write ``tables`` to ``path``.
+
+    ``tables`` maps each table name to ``{column: (kind, values)}`` with a
+    kind from the module docstring; every column of a table has one value
+    per row.
+    """
+    footer = {"byteorder": sys.byteorder, "meta": meta, "tables": {}}
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC)
+        for table, columns in tables.items():
+            rows = None
+            layout = {}
+            for name, (kind, values) in columns.items():
+                rows = len(values)
+                if kind == "s":
+                    sections = _write_strings(f, values)
+                elif kind == "l":
+                    counts = array("q", map(len, values))
+                    sections = [_write_section(f, counts.tobytes())]
+                    sections += _write_strings(f, list(chain.from_iterable(values)))
+                else:
+                    sections = [_write_section(f, array(kind, values).tobytes())]
+                layout[name] = {"kind": kind, "sections": sections}
+            footer["tables"][table] = {"rows": rows or 0, "columns": layout}
+        encoded = json.dumps(footer).encode()
+        footer_offset = f.tell()
+        f.write(encoded)
+        f.write(TRAILER.pack(footer_offset, len(encoded), MAGIC))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    directory = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    try:
+        os.fsync(directory)
+    finally:
+        os.close(directory)
+
+
+class Snapshot:
+    """A snapshot file mapped into memory; use as a context manager."""
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._map)
+        footer_offset, footer_length, magic = TRAILER.unpack(self._view[-TRAILER.size:])
+        if magic != MAGIC or self._view[:len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not a snapshot")
+        footer = json.loads(bytes(self._view[footer_offset:footer_offset + footer_length]))
+        self._swap = footer["byteorder"] != sys.byteorder
+        self.meta: dict = footer["meta"]
+        self._tables: dict = footer["tables"]
+
+    def __enter__(self) -> "Snapshot":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Release the mapping."""
+        self._view.release()
+        self._map.close()
+
+    def rows(self, table: str) -> int:
+        """Number of rows in ``table``, or 0 if the snapshot has no such table."""
+        return self._tables.get(table, {}).get("rows", 0)
+
+    def has_column(self, table: str, name: str) -> bool:
+        """Whether ``table`` was written with column ``name``."""
+        return name in self._tables[table]["columns"]
+
+    def column(self, table: str, name: str) -> List:
+        """Read one column of ``table`` as a list of values."""
+        spec = self._tables[table]["columns"][name]
+        kind, sections = spec["kind"], spec["sections"]
+        if kind == "s":
+            return self._strings(*sections)
+        if kind == "l":
+            counts = self._numbers("q", sections[0])
+            values = self._strings(*sections[1:])
+            bounds = list(accumulate(chain((0,), counts)))
+            return [values[start:end] for start, end in zip(bounds, bounds[1:])]
+        return self._numbers(kind, sections[0])
+
+    def _numbers(self, kind: str, section: List[int]) -> List:
+        offset, length = section
+        with self._view[offset:offset + length] as view:
+            if not self._swap:
+                with view.cast(kind) as values:
+                    return values.tolist()
+            values = array(kind, view)
+        values.byteswap()
+        return values.tolist()
+
+    def _strings(self, offsets_section: List[int], text_section: List[int]) -> List[str]:
+        offsets = self._numbers("q", offsets_section)
+        start, length = text_section
+        with self._view[start:start + length] as view:
+            text = str(view, "utf-8")
+        return [text[a:b] for a, b in zip(offsets, offsets[1:])]
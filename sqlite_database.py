@@ -0,0 +1,878 @@
+"""SQLite storage backend, for data that outlives the process."""
+import json
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+from pydantic import BaseModel
+
+from models import Product, ProductCreate, ProductUpdate, User, UserCreate, UserUpdate
+from search import tokenize
+from storage import (
+    SAMPLE_PRODUCTS, Change, Changes, ChangesExpired, DuplicateEmail, Page, VersionConflict,
+    normalize_email, take_page,
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS products (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    description TEXT NOT NULL,
+    price REAL NOT NULL,
+    category TEXT NOT NULL,
+    tags TEXT NOT NULL,
+    in_stock INTEGER NOT NULL,
+    created_at TEXT NOT NULL,
+    version INTEGER NOT NULL DEFAULT 1,
+    changed INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS products_changed ON products (changed);
+CREATE INDEX IF NOT EXISTS products_category ON products (category, id);
+CREATE INDEX IF NOT EXISTS products_price ON products (price, id);
+CREATE INDEX IF NOT EXISTS products_in_stock ON products (in_stock, id);
+
+CREATE TABLE IF NOT EXISTS product_tags (
+    tag TEXT NOT NULL,
+    product_id INTEGER NOT NULL REFERENCES products (id) ON DELETE CASCADE,
+    PRIMARY KEY (tag, product_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS product_tags_product ON product_tags (product_id);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS product_search USING fts5 (
+    name, description, content='products', content_rowid='id'
+);
+CREATE TRIGGER IF NOT EXISTS product_search_insert AFTER INSERT ON products BEGIN
+    INSERT INTO product_search (rowid, name, description)
+    VALUES (new.id, new.name, new.description);
+END;
+CREATE TRIGGER IF NOT EXISTS product_search_delete AFTER DELETE ON products BEGIN
+    INSERT INTO product_search (product_search, rowid, name, description)
+    VALUES ('delete', old.id, old.name, old.description);
+END;
+CREATE TRIGGER IF NOT EXISTS product_search_update
+AFTER UPDATE OF name, description ON products BEGIN
+    INSERT INTO product_search (product_search, rowid, name, description)
+    VALUES ('delete', old.id, old.name, old.description);
+    INSERT INTO product_search (rowid, name, description)
+    VALUES (new.id, new.name, new.description);
+END;
+
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    email TEXT NOT NULL,
+    password TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    version INTEGER NOT NULL DEFAULT 1,
+    changed INTEGER NOT NULL DEFAULT 0,
+    -- normalize_email(email); NULL only for duplicates that predate the index.
+    email_key TEXT
+);
+CREATE INDEX IF NOT EXISTS users_changed ON users (changed);
+CREATE INDEX IF NOT EXISTS users_email ON users (email);
+CREATE UNIQUE INDEX IF NOT EXISTS users_email_key ON users (email_key);
+
+CREATE TABLE IF NOT EXISTS collection_versions (
+    name TEXT PRIMARY KEY,
+    version INTEGER NOT NULL
+);
+
+-- Deleted ids by the version that deleted them, and per collection the oldest
+-- version changes can be listed from and how many tombstones are kept.
+CREATE TABLE IF NOT EXISTS tombstones (
+    collection TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    row_id INTEGER NOT NULL,
+    PRIMARY KEY (collection, version)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS change_horizons (
+    name TEXT PRIMARY KEY,
+    version INTEGER NOT NULL,
+    tombstones INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO change_horizons (name, version, tombstones)
+VALUES ('products', 0, 0), ('users', 0, 0);
+"""
+
+PRODUCT_COLUMNS = "id, name, description, price, category, tags, in_stock, created_at"
+USER_COLUMNS = "id, name, email, password, created_at, updated_at"
+PRODUCT_SORT_COLUMNS = ("id", "name", "price", "created_at")
+USER_SORT_COLUMNS = ("id", "name", "email", "created_at")
+
+
+def _product_from_row(row: Sequence) -> Product:
+    """Build a ``Product`` from a row of ``PRODUCT_COLUMNS``."""
+    return Product.model_construct(
+        id=row[0],
+        name=row[1],
+        description=row[2],
+        price=row[3],
+        category=row[4],
+        tags=json.loads(row[5]),
+        in_stock=bool(row[6]),
+        created_at=datetime.fromisoformat(row[7]),
+    )
+
+
+def _user_from_row(row: Sequence) -> User:
+    """Build a ``User`` from a row of ``USER_COLUMNS``."""
+    return User.model_construct(
+        id=row[0],
+        name=row[1],
+        email=row[2],
+        password=row[3],
+        created_at=datetime.fromisoformat(row[4]),
+        updated_at=datetime.fromisoformat(row[5]),
+    )
+
+
+def upgrade(connection: sqlite3.Connection):
+    """Add the columns that files created by older versions lack."""
+    for table in ("products", "users"):
+        columns = {row[1] for row in connection.execute(f"PRAGMA table_info({table})")}
+        if columns and "changed" not in columns:
+            connection.execute(
+                f"ALTER TABLE {table} ADD COLUMN changed INTEGER NOT NULL DEFAULT 0"
+            )
+        if table == "users" and columns and "email_key" not in columns:
+            _add_email_keys(connection)
+
+
+def _add_email_keys(connection: sqlite3.Connection):
+    """Key existing users by email; later holders of a duplicate are left unkeyed."""
+    keys: Dict[str, int] = {}
+    for user_id, email in connection.execute("SELECT id, email FROM users ORDER BY id"):
+        keys.setdefault(normalize_email(email), user_id)
+    connection.execute("BEGIN IMMEDIATE")
+    connection.execute("ALTER TABLE users ADD COLUMN email_key TEXT")
+    connection.executemany(
+        "UPDATE users SET email_key = ? WHERE id = ?", keys.items()
+    )
+    connection.execute("COMMIT")
+
+
+def connect(path: str) -> sqlite3.Connection:
+    """Open a connection in WAL mode with autocommit and a statement cache.
+
+    Transactions are started explicitly. Queries are parameterised, so each
+    distinct SQL string is prepared once per connection and then reused
+    from the statement cache.
+    """
+    connection = sqlite3.connect(
+        path, check_same_thread=False, isolation_level=None, cached_statements=256
+    )
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    connection.execute("PRAGMA busy_timeout=5000")
+    connection.execute("PRAGMA foreign_keys=ON")
+    return connection
+
+
+class ConnectionPool:
+    """Fixed-size pool of read connections shared between threads."""
+
+    def __init__(self, path: str, size: int):
+        self._connections: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        for _ in range(size):
+            self._connections.put(connect(path))
+        self.size = size
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """Borrow a connection, waiting while all of them are in use."""
+        connection = self._connections.get()
+        try:
+            yield connection
+        finally:
+            self._connections.put(connection)
+
+    def close(self):
+        """Close every connection; the pool must be idle."""
+        for _ in range(self.size):
+            self._connections.get().close()
+
+
+class SQLiteDatabase:
+    """SQLite ``StorageBackend`` for storing products and users on disk.
+
+    WAL mode lets readers run alongside the single writer, so reads go
+    through a small connection pool while writes are serialized on one
+    dedicated connection. Category, price, stock and email are indexed,
+    tags live in their own table, and full-text search uses an FTS5 index
+    ranked with BM25. A unique index on the normalized email keeps emails
+    unique and serves ``get_user_by_email``.
+    """
+
+    inline_reads = frozenset()  # Every read may wait on disk
+
+    def __init__(self, path: str = "crud.db", pool_size: int = 4, tombstone_limit: int = 10_000):
+        self.path = path
+        self._tombstone_limit = tombstone_limit
+        self._subscribers: List[Callable[[Change], None]] = []
+        self._write_lock = threading.Lock()
+        self._writer = connect(path)
+        upgrade(self._writer)
+        self._writer.executescript(SCHEMA)
+        # Several worker processes may open a new file at once; only the one
+        # whose insert lands sees a fresh database and may seed it.
+        self._fresh = self._writer.execute(
+            "INSERT OR IGNORE INTO collection_versions (name, version)"
+            " VALUES ('products', 0), ('users', 0)"
+        ).rowcount > 0
+        self._readers = ConnectionPool(path, pool_size)
+
+    @property
+    def fresh(self) -> bool:
+        """Whether this connection created the database file's schema."""
+        return self._fresh
+
+    def seed_sample_data(self):
+        """Load the sample products, but only into a fresh database."""
+        if self._fresh:
+            self._fresh = False
+            self._init_sample_data()
+
+    def close(self):
+        """Close every connection."""
+        self._readers.close()
+        self._writer.close()
+
+    def subscribe(self, callback: Callable[[Change], None]):
+        """Call ``callback`` with a ``Change`` after every committed write."""
+        self._subscribers.append(callback)
+
+    @contextmanager
+    def _transaction(self) -> Iterator[Tuple[sqlite3.Connection, List[Change]]]:
+        """Run writes in one transaction, publishing their changes on commit."""
+        changes: List[Change] = []
+        with self._write_lock:
+            self._writer.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._writer, changes
+                self._writer.execute("COMMIT")
+            except BaseException:
+                self._writer.execute("ROLLBACK")
+                raise
+            # Still under the lock, so subscribers see changes in commit order.
+            for change in changes:
+                for callback in self._subscribers:
+                    callback(change)
+
+    def _record_write(
+        self,
+        connection: sqlite3.Connection,
+        changes: List[Change],
+        collection: str,
+        op: str,
+        row_id: Optional[int] = None,
+        row: Optional[BaseModel] = None,
+    ):
+        """Advance the collection version, stamp the row with it and queue the change."""
+        (version,) = connection.execute(
+            "UPDATE collection_versions SET version = version + 1 WHERE name = ? RETURNING version",
+            (collection,),
+        ).fetchone()
+        if op == "clear":
+            connection.execute("DELETE FROM tombstones WHERE collection = ?", (collection,))
+            connection.execute(
+                "UPDATE change_horizons SET version = ?, tombstones = 0 WHERE name = ?",
+                (version, collection),
+            )
+        elif op == "delete":
+            self._add_tombstone(connection, collection, row_id, version)
+        else:
+            connection.execute(
+                f"UPDATE {collection} SET changed = ? WHERE id = ?", (version, row_id)
+            )
+        changes.append(Change(collection, op, row_id, row, version))
+
+    def _add_tombstone(
+        self, connection: sqlite3.Connection, collection: str, row_id: int, version: int
+    ):
+        """Remember a delete for ``changes_since``, forgetting the oldest beyond the limit."""
+        connection.execute(
+            "INSERT INTO tombstones (collection, version, row_id) VALUES (?, ?, ?)",
+            (collection, version, row_id),
+        )
+        (count,) = connection.execute(
+            "UPDATE change_horizons SET tombstones = tombstones + 1 WHERE name = ?"
+            " RETURNING tombstones",
+            (collection,),
+        ).fetchone()
+        if count > self._tombstone_limit:
+            (oldest,) = connection.execute(
+                "DELETE FROM tombstones WHERE collection = ? AND version ="
+                " (SELECT MIN(version) FROM tombstones WHERE collection = ?) RETURNING version",
+                (collection, collection),
+            ).fetchone()
+            connection.execute(
+                "UPDATE change_horizons SET version = ?, tombstones = tombstones - 1"
+                " WHERE name = ?",
+                (oldest, collection),
+            )
+
+    def clear(self):
+        """Remove every row and reset id allocation."""
+        with self._transaction() as (connection, changes):
+            connection.execute("DELETE FROM products")
+            connection.execute("DELETE FROM users")
+            connection.execute("DELETE FROM sqlite_sequence")
+            for collection in ("products", "users"):
+                self._record_write(connection, changes, collection, "clear")
+
+    def _init_sample_data(self):
+        """Add the sample products."""
+        self.create_products(SAMPLE_PRODUCTS)
+
+    def collection_version(self, collection: str) -> int:
+        """Get the version of ``"products"`` or ``"users"``; it grows on every write."""
+        with self._readers.connection() as connection:
+            (version,) = connection.execute(
+                "SELECT version FROM collection_versions WHERE name = ?", (collection,)
+            ).fetchone()
+        return version
+
+    def collection_size(self, collection: str) -> int:
+        """Get the number of rows in ``"products"`` or ``"users"``; this scans an index."""
+        table = "products" if collection == "products" else "users"
+        with self._readers.connection() as connection:
+            (count,) = connection.execute(f"SELECT COUNT(*) FROM {table}").fetchone()
+        return count
+
+    def changes_since(self, collection: str, since: int) -> Changes:
+        """Get the rows of ``collection`` written after version ``since``, and those deleted.
+
+        Both lists come from indexes on the version columns, read in one
+        transaction so they agree with the version returned.
+        """
+        columns, from_row = (
+            (PRODUCT_COLUMNS, _product_from_row) if collection == "products"
+            else (USER_COLUMNS, _user_from_row)
+        )
+        with self._readers.connection() as connection:
+            connection.execute("BEGIN")
+            try:
+                (version,) = connection.execute(
+                    "SELECT version FROM collection_versions WHERE name = ?", (collection,)
+                ).fetchone()
+                (horizon,) = connection.execute(
+                    "SELECT version FROM change_horizons WHERE name = ?", (collection,)
+                ).fetchone()
+                if since > version or 0 < since < horizon:
+                    raise ChangesExpired(collection, since, horizon)
+                rows = connection.execute(
+                    f"SELECT {columns} FROM {collection} WHERE changed > ? ORDER BY changed",
+                    (since if since else -1,),
+                ).fetchall()
+                deleted = connection.execute(
+                    "SELECT row_id FROM tombstones WHERE collection = ? AND version > ?"
+                    " ORDER BY version",
+                    (collection, since),
+                ).fetchall()
+            finally:
+                connection.execute("COMMIT")
+        return Changes([from_row(row) for row in rows], [row_id for (row_id,) in deleted], version)
+
+    def product_version(self, product_id: int) -> Optional[int]:
+        """Get how many times a product has been written, or ``None`` if missing."""
+        return self._row_version("products", product_id)
+
+    def user_version(self, user_id: int) -> Optional[int]:
+        """Get how many times a user has been written, or ``None`` if missing."""
+        return self._row_version("users", user_id)
+
+    def _row_version(self, table: str, row_id: int) -> Optional[int]:
+        """Read the version column of one row."""
+        with self._readers.connection() as connection:
+            row = connection.execute(
+                f"SELECT version FROM {table} WHERE id = ?", (row_id,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def create_product(self, product_data: ProductCreate) -> Product:
+        """Create a new product in the database."""
+        return self.create_products([product_data])[0]
+
+    def create_products(self, items: List[ProductCreate]) -> List[Product]:
+        """Create several products in one transaction, returning them in input order."""
+        products = []
+        with self._transaction() as (connection, changes):
+            for product_data in items:
+                created_at = datetime.now()
+                (product_id,) = connection.execute(
+                    "INSERT INTO products"
+                    " (name, description, price, category, tags, in_stock, created_at)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?) RETURNING id",
+                    (
+                        product_data.name,
+                        product_data.description,
+                        product_data.price,
+                        product_data.category,
+                        json.dumps(product_data.tags),
+                        int(product_data.in_stock),
+                        created_at.isoformat(),
+                    ),
+                ).fetchone()
+                self._insert_tags(connection, product_id, product_data.tags)
+                product = Product(id=product_id, **product_data.model_dump(), created_at=created_at)
+                self._record_write(connection, changes, "products", "create", product_id, product)
+                products.append(product)
+        return products
+
+    @staticmethod
+    def _insert_tags(connection: sqlite3.Connection, product_id: int, tags: List[str]):
+        """Index a product's tags in ``product_tags``."""
+        connection.executemany(
+            "INSERT OR IGNORE INTO product_tags (tag, product_id) VALUES (?, ?)",
+            [(tag, product_id) for tag in tags],
+        )
+
+    def get_all_products(self) -> List[Product]:
+        """Get all products from the database."""
+        return self.query_products().items
+
+    def iter_products(self, batch_size: int = 1000) -> Iterator[List[Product]]:
+        """Yield every product in id order, ``batch_size`` rows at a time."""
+        return self._iter_batches("products", PRODUCT_COLUMNS, _product_from_row, batch_size)
+
+    def query_products(
+        self,
+        limit: Optional[int] = None,
+        after_id: Optional[int] = None,
+        category: Optional[str] = None,
+        in_stock: Optional[bool] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        tags: Optional[List[str]] = None,
+        match_any_tag: bool = False,
+        sort_by: str = "id",
+        descending: bool = False,
+    ) -> Page:
+        """Get one page of products matching the filters.
+
+        Same semantics as ``InMemoryDatabase.query_products``; every filter
+        and the keyset cursor become index-backed WHERE clauses.
+        """
+        if sort_by not in PRODUCT_SORT_COLUMNS:
+            raise ValueError(f"Cannot sort products by {sort_by!r}")
+        where: List[str] = []
+        params: List = []
+        if category is not None:
+            where.append("category = ?")
+            params.append(category)
+        if in_stock is not None:
+            where.append("in_stock = ?")
+            params.append(int(in_stock))
+        if min_price is not None:
+            where.append("price >= ?")
+            params.append(min_price)
+        if max_price is not None:
+            where.append("price <= ?")
+            params.append(max_price)
+        if tags:
+            distinct_tags = list(dict.fromkeys(tags))
+            placeholders = ", ".join("?" * len(distinct_tags))
+            subquery = f"SELECT product_id FROM product_tags WHERE tag IN ({placeholders})"
+            if not match_any_tag:
+                subquery += " GROUP BY product_id HAVING COUNT(*) = ?"
+            where.append(f"id IN ({subquery})")
+            params.extend(distinct_tags)
+            if not match_any_tag:
+                params.append(len(distinct_tags))
+        return self._query(
+            "products", PRODUCT_COLUMNS, _product_from_row, where, params,
+            limit, after_id, sort_by, descending,
+        )
+
+    def top_products(
+        self,
+        limit: int,
+        category: Optional[str] = None,
+        descending: bool = False,
+    ) -> List[Product]:
+        """Get the ``limit`` cheapest (or most expensive) products."""
+        return self.query_products(
+            limit=limit, category=category, sort_by="price", descending=descending
+        ).items
+
+    def search_products(self, query: str, limit: int = 10, offset: int = 0) -> List[Product]:
+        """Get the products whose name or description best match ``query``.
+
+        Any query term may match, as with the in-memory index.
+        """
+        terms = dict.fromkeys(tokenize(query))
+        if not terms:
+            return []
+        match = " OR ".join(f'"{term}"' for term in terms)
+        columns = ", ".join(f"p.{column}" for column in PRODUCT_COLUMNS.split(", "))
+        with self._readers.connection() as connection:
+            rows = connection.execute(
+                f"SELECT {columns} FROM product_search"
+                " JOIN products p ON p.id = product_search.rowid"
+                " WHERE product_search MATCH ? ORDER BY rank, p.id LIMIT ? OFFSET ?",
+                (match, limit, offset),
+            ).fetchall()
+        return [_product_from_row(row) for row in rows]
+
+    def get_product(self, product_id: int) -> Optional[Product]:
+        """Get a specific product by ID."""
+        with self._readers.connection() as connection:
+            row = connection.execute(
+                f"SELECT {PRODUCT_COLUMNS} FROM products WHERE id = ?", (product_id,)
+            ).fetchone()
+        return _product_from_row(row) if row else None
+
+    def update_product(
+        self,
+        product_id: int,
+        update_data: ProductUpdate,
+        expected_version: Optional[int] = None,
+    ) -> Optional[Product]:
+        """Update an existing product in the database.
+
+        With ``expected_version`` set, the update applies only if the product
+        is still at that version and raises ``VersionConflict`` otherwise.
+        """
+        with self._transaction() as (connection, changes):
+            return self._update_product(
+                connection, changes, product_id, update_data, expected_version
+            )
+
+    def update_products(
+        self, updates: List[Tuple[int, ProductUpdate]]
+    ) -> List[Optional[Product]]:
+        """Apply several product updates in one transaction; missing products yield ``None``."""
+        with self._transaction() as (connection, changes):
+            return [
+                self._update_product(connection, changes, product_id, update_data)
+                for product_id, update_data in updates
+            ]
+
+    def _update_product(
+        self,
+        connection: sqlite3.Connection,
+        changes: List[Change],
+        product_id: int,
+        update_data: ProductUpdate,
+        expected_version: Optional[int] = None,
+    ) -> Optional[Product]:
+        fields = _column_values(update_data.model_dump(exclude_unset=True))
+        row = self._update_row(
+            connection, "products", PRODUCT_COLUMNS, product_id, fields, expected_version
+        )
+        if row is None:
+            return None
+        if "tags" in fields:
+            connection.execute("DELETE FROM product_tags WHERE product_id = ?", (product_id,))
+            self._insert_tags(connection, product_id, json.loads(fields["tags"]))
+        product = _product_from_row(row)
+        self._record_write(connection, changes, "products", "update", product_id, product)
+        return product
+
+    def delete_product(self, product_id: int, expected_version: Optional[int] = None) -> bool:
+        """Delete a product from the database, if still at ``expected_version`` when given."""
+        return self._delete_rows("products", [product_id], expected_version)[0]
+
+    def delete_products(self, product_ids: List[int]) -> List[bool]:
+        """Delete several products in one transaction, reporting which ones existed."""
+        return self._delete_rows("products", product_ids)
+
+    def create_user(self, user_data: UserCreate) -> User:
+        """Create a new user in the database."""
+        user = self.create_users([user_data])[0]
+        if isinstance(user, DuplicateEmail):
+            raise user
+        return user
+
+    def create_users(self, items: List[UserCreate]) -> List[Union[User, DuplicateEmail]]:
+        """Create several users in one transaction, returning them in input order.
+
+        Items whose email is taken yield the ``DuplicateEmail`` instead.
+        """
+        users = []
+        with self._transaction() as (connection, changes):
+            for user_data in items:
+                now = datetime.now()
+                try:
+                    with self._unique_email(connection, user_data.email):
+                        (user_id,) = connection.execute(
+                            "INSERT INTO users"
+                            " (name, email, email_key, password, created_at, updated_at)"
+                            " VALUES (?, ?, ?, ?, ?, ?) RETURNING id",
+                            (
+                                user_data.name,
+                                user_data.email,
+                                normalize_email(user_data.email),
+                                user_data.password,
+                                now.isoformat(),
+                                now.isoformat(),
+                            ),
+                        ).fetchone()
+                except DuplicateEmail as exc:
+                    users.append(exc)
+                    continue
+                user = User(id=user_id, **user_data.model_dump(), created_at=now, updated_at=now)
+                self._record_write(connection, changes, "users", "create", user_id, user)
+                users.append(user)
+        return users
+
+    def get_all_users(self) -> List[User]:
+        """Get all users from the database."""
+        return self.query_users().items
+
+    def iter_users(self, batch_size: int = 1000) -> Iterator[List[User]]:
+        """Yield every user in id order, ``batch_size`` rows at a time."""
+        return self._iter_batches("users", USER_COLUMNS, _user_from_row, batch_size)
+
+    def query_users(
+        self,
+        limit: Optional[int] = None,
+        after_id: Optional[int] = None,
+        sort_by: str = "id",
+        descending: bool = False,
+    ) -> Page:
+        """Get one page of users, see ``query_products`` for cursor semantics."""
+        if sort_by not in USER_SORT_COLUMNS:
+            raise ValueError(f"Cannot sort users by {sort_by!r}")
+        return self._query(
+            "users", USER_COLUMNS, _user_from_row, [], [], limit, after_id, sort_by, descending
+        )
+
+    def get_user(self, user_id: int) -> Optional[User]:
+        """Get a specific user by ID."""
+        with self._readers.connection() as connection:
+            row = connection.execute(
+                f"SELECT {USER_COLUMNS} FROM users WHERE id = ?", (user_id,)
+            ).fetchone()
+        return _user_from_row(row) if row else None
+
+    def get_user_by_email(self, email: str) -> Optional[User]:
+        """Get the user holding ``email``, compared after ``normalize_email``."""
+        with self._readers.connection() as connection:
+            row = connection.execute(
+                f"SELECT {USER_COLUMNS} FROM users WHERE email_key = ?", (normalize_email(email),)
+            ).fetchone()
+        return _user_from_row(row) if row else None
+
+    @staticmethod
+    @contextmanager
+    def _unique_email(connection: sqlite3.Connection, email: str) -> Iterator[None]:
+        """Turn the unique email index rejecting a write into ``DuplicateEmail``."""
+        try:
+            yield
+        except sqlite3.IntegrityError:
+            owner = connection.execute(
+                "SELECT id FROM users WHERE email_key = ?", (normalize_email(email),)
+            ).fetchone()
+            if owner is None:
+                raise
+            raise DuplicateEmail(email, owner[0]) from None
+
+    def update_user(
+        self, user_id: int, update_data: UserUpdate, expected_version: Optional[int] = None
+    ) -> Optional[User]:
+        """Update an existing user in the database, see ``update_product`` for versions."""
+        with self._transaction() as (connection, changes):
+            return self._update_user(connection, changes, user_id, update_data, expected_version)
+
+    def update_users(
+        self, updates: List[Tuple[int, UserUpdate]]
+    ) -> List[Union[User, DuplicateEmail, None]]:
+        """Apply several user updates in one transaction.
+
+        Missing users yield ``None`` and taken emails the ``DuplicateEmail``.
+        """
+        users = []
+        with self._transaction() as (connection, changes):
+            for user_id, update_data in updates:
+                try:
+                    users.append(self._update_user(connection, changes, user_id, update_data))
+                except DuplicateEmail as exc:
+                    users.append(exc)
+        return users
+
+    def _update_user(
+        self,
+        connection: sqlite3.Connection,
+        changes: List[Change],
+        user_id: int,
+        update_data: UserUpdate,
+        expected_version: Optional[int] = None,
+    ) -> Optional[User]:
+        fields = _column_values(update_data.model_dump(exclude_unset=True))
+        fields["updated_at"] = datetime.now().isoformat()  # Always update the timestamp
+        email = fields.get("email")
+        if email is not None:
+            fields["email_key"] = normalize_email(email)
+        with self._unique_email(connection, email or ""):
+            row = self._update_row(
+                connection, "users", USER_COLUMNS, user_id, fields, expected_version
+            )
+        if row is None:
+            return None
+        user = _user_from_row(row)
+        self._record_write(connection, changes, "users", "update", user_id, user)
+        return user
+
+    def delete_user(self, user_id: int, expected_version: Optional[int] = None) -> bool:
+        """Delete a user from the database, if still at ``expected_version`` when given."""
+        return self._delete_rows("users", [user_id], expected_version)[0]
+
+    def delete_users(self, user_ids: List[int]) -> List[bool]:
+        """Delete several users in one transaction, reporting which ones existed."""
+        return self._delete_rows("users", user_ids)
+
+    @classmethod
+    def _update_row(
+        cls,
+        connection: sqlite3.Connection,
+        table: str,
+        columns: str,
+        row_id: int,
+        fields: Dict[str, object],
+        expected_version: Optional[int] = None,
+    ) -> Optional[Sequence]:
+        """Apply ``fields`` to one row, bump its version and return the new row."""
+        assignments = [f"{column} = ?" for column in fields] + ["version = version + 1"]
+        where, params = cls._row_condition(row_id, expected_version)
+        row = connection.execute(
+            f"UPDATE {table} SET {', '.join(assignments)} WHERE {where} RETURNING {columns}",
+            (*fields.values(), *params),
+        ).fetchone()
+        if row is None:
+            cls._check_version(connection, table, row_id, expected_version)
+        return row
+
+    def _delete_rows(
+        self, table: str, row_ids: List[int], expected_version: Optional[int] = None
+    ) -> List[bool]:
+        """Delete rows by id in one transaction, reporting which ones existed."""
+        results = []
+        with self._transaction() as (connection, changes):
+            for row_id in row_ids:
+                where, params = self._row_condition(row_id, expected_version)
+                deleted = connection.execute(
+                    f"DELETE FROM {table} WHERE {where}", params
+                ).rowcount > 0
+                if deleted:
+                    self._record_write(connection, changes, table, "delete", row_id)
+                else:
+                    self._check_version(connection, table, row_id, expected_version)
+                results.append(deleted)
+        return results
+
+    @staticmethod
+    def _row_condition(row_id: int, expected_version: Optional[int]) -> Tuple[str, tuple]:
+        """WHERE clause matching one row, and only at ``expected_version`` when given.
+
+        Folding the version into the statement makes it a compare-and-swap,
+        so no read has to be held open between the check and the write.
+        """
+        if expected_version is None:
+            return "id = ?", (row_id,)
+        return "id = ? AND version = ?", (row_id, expected_version)
+
+    @staticmethod
+    def _check_version(
+        connection: sqlite3.Connection, table: str, row_id: int, expected_version: Optional[int]
+    ):
+        """After a conditional write matched nothing, tell a conflict from a missing row."""
+        if expected_version is None:
+            return
+        row = connection.execute(f"SELECT version FROM {table} WHERE id = ?", (row_id,)).fetchone()
+        if row is not None:
+            raise VersionConflict(table, row_id, row[0])
+
+    def _query(
+        self,
+        table: str,
+        columns: str,
+        from_row: Callable[[Sequence], BaseModel],
+        where: List[str],
+        params: List,
+        limit: Optional[int],
+        after_id: Optional[int],
+        sort_by: str,
+        descending: bool,
+    ) -> Page:
+        """Run a filtered, sorted, keyset-paginated query over one table.
+
+        Rows are ordered by ``(sort_by, id)``, so the cursor becomes a
+        row-value comparison that SQLite answers from the matching index.
+        """
+        direction = "DESC" if descending else "ASC"
+        comparison = "<" if descending else ">"
+        with self._readers.connection() as connection:
+            if after_id is not None:
+                if sort_by == "id":
+                    where.append(f"id {comparison} ?")
+                    params.append(after_id)
+                else:
+                    cursor = connection.execute(
+                        f"SELECT {sort_by} FROM {table} WHERE id = ?", (after_id,)
+                    ).fetchone()
+                    if cursor is None:
+                        raise ValueError(f"Cursor row {after_id} no longer exists")
+                    where.append(f"({sort_by}, id) {comparison} (?, ?)")
+                    params.extend((cursor[0], after_id))
+            sql = f"SELECT {columns} FROM {table}"
+            if where:
+                sql += " WHERE " + " AND ".join(where)
+            sql += f" ORDER BY {sort_by} {direction}"
+            if sort_by != "id":
+                sql += f", id {direction}"
+            if limit is not None:
+                sql += " LIMIT ?"
+                params.append(limit + 1)
+            rows = connection.execute(sql, params).fetchall()
+        return take_page(map(from_row, rows), limit)
+
+    def _iter_batches(
+        self,
+        table: str,
+        columns: str,
+        from_row: Callable[[Sequence], BaseModel],
+        batch_size: int,
+    ) -> Iterator[List]:
+        """Walk a table in id order one batch at a time.
+
+        Rows created after iteration starts are excluded, matching the
+        in-memory backend. No connection is held between batches.
+        """
+        with self._readers.connection() as connection:
+            (last_id,) = connection.execute(f"SELECT MAX(id) FROM {table}").fetchone()
+        after_id = 0
+        while last_id is not None:
+            with self._readers.connection() as connection:
+                rows = connection.execute(
+                    f"SELECT {columns} FROM {table} WHERE id > ? AND id <= ? ORDER BY id LIMIT ?",
+                    (after_id, last_id, batch_size),
+                ).fetchall()
+            if not rows:
+                return
+            yield [from_row(row) for row in rows]
+            after_id = rows[-1][0]
+
+
+def _column_values(fields: Dict[str, object]) -> Dict[str, object]:
+    """Convert model field values to column values.
+
+    Fields explicitly set to ``None`` are skipped, since every column is
+    NOT NULL.
+    """
+    values = {}
+    for field, value in fields.items():
+        if value is None:
+            continue
+        if field == "tags":
+            value = json.dumps(value)
+        elif field == "in_stock":
+            value = int(value)
+        elif isinstance(value, datetime):
+            value = value.isoformat()
+        values[field] = value
+    return values
@@ -0,0 +1,227 @@
+"""Storage backend contract shared by the database implementations."""
+from itertools import islice
+from typing import (
+    Callable, FrozenSet, Iterable, Iterator, List, NamedTuple, Optional, Protocol, Tuple,
+    Union,
+)
+
+from pydantic import BaseModel
+
+from models import Product, ProductCreate, ProductUpdate, User, UserCreate, UserUpdate
+
+
+class Change(NamedTuple):
+    """A committed write, as delivered to database subscribers.
+
+    ``op`` is ``"create"``, ``"update"``, ``"delete"`` or ``"clear"``; ``row``
+    is the row after the write and is ``None`` for deletes and clears.
+    """
+    collection: str
+    op: str
+    row_id: Optional[int]
+    row: Optional[BaseModel]
+    version: int
+
+
+class Page(NamedTuple):
+    """A page of query results and the cursor for the page after it."""
+    items: List
+    next_after_id: Optional[int]
+
+
+class Changes(NamedTuple):
+    """Rows written after a sync point, ids deleted since, and the new sync point."""
+    rows: List
+    deleted: List[int]
+    version: int
+
+
+class ChangesExpired(Exception):
+    """Changes since a sync point can no longer be listed; the client must reload."""
+
+    def __init__(self, collection: str, since: int, horizon: int):
+        super().__init__(
+            f"{collection} changes since {since} are gone; the oldest available is {horizon}"
+        )
+        self.collection = collection
+        self.since = since
+        self.horizon = horizon
+
+
+class VersionConflict(Exception):
+    """A conditional write found the row at a different version than expected."""
+
+    def __init__(self, collection: str, row_id: int, current_version: int):
+        super().__init__(
+            f"{collection} row {row_id} is at version {current_version}"
+        )
+        self.collection = collection
+        self.row_id = row_id
+        self.current_version = current_version
+
+
+class DuplicateEmail(Exception):
+    """A user write would give a second user the same normalized email."""
+
+    def __init__(self, email: str, user_id: int):
+        super().__init__(f"Email {email!r} is already used by user {user_id}")
+        self.email = email
+        self.user_id = user_id
+
+
+def normalize_email(email: str) -> str:
+    """Key an email is unique by: surrounding whitespace dropped, case folded."""
+    return email.strip().casefold()
+
+
+def take_page(rows: Iterable, limit: Optional[int]) -> Page:
+    """Consume one row past ``limit`` to learn whether another page exists."""
+    if limit is None:
+        return Page(list(rows), None)
+    items = list(islice(rows, limit + 1))
+    if len(items) > limit:
+        del items[limit:]
+        return Page(items, items[-1].id)
+    return Page(items, None)
+
+
+SAMPLE_PRODUCTS = [
+    ProductCreate(
+        name="Wireless Headphones",
+        description="High-quality wireless headphones with noise cancellation",
+        price=199.99,
+        category="Electronics",
+        tags=["audio", "wireless", "premium"]
+    ),
+    ProductCreate(
+        name="Coffee Maker",
+        description="Programmable coffee maker with built-in grinder",
+        price=89.99,
+        category="Appliances",
+        tags=["kitchen", "coffee", "automatic"]
+    ),
+    ProductCreate(
+        name="Laptop Stand",
+        description="Adjustable aluminum laptop stand for ergonomic work",
+        price=45.99,
+        category="Accessories",
+        tags=["ergonomic", "aluminum", "adjustable"]
+    )
+]
+
+
+class StorageBackend(Protocol):
+    """Operations every database backend provides to the API layer.
+
+    Collections are ``"products"`` and ``"users"``. Ids are allocated in
+    increasing order and never reused until ``clear``. Every write advances
+    the collection version and the written row's version, and is published
+    to subscribers as a ``Change`` once committed. Single-row updates and
+    deletes given an ``expected_version`` apply only if the row is still at
+    that version, and raise ``VersionConflict`` if it has moved on.
+
+    ``changes_since`` lists the rows written and deleted after a collection
+    version. Deletes are remembered for a bounded number of tombstones;
+    asking for changes older than that raises ``ChangesExpired``.
+
+    User emails are unique by ``normalize_email``. Creating or updating a
+    user onto an email another user holds raises ``DuplicateEmail``; the
+    bulk methods put the exception in place of that item's result instead.
+
+    Every method is safe to call from several threads at once.
+    ``inline_reads`` names the reads that an event loop may call directly:
+    they take constant time and never wait on a lock or on I/O. Every other
+    method belongs in a worker thread.
+    """
+
+    inline_reads: FrozenSet[str]
+
+    def subscribe(self, callback: Callable[[Change], None]): ...
+
+    def clear(self): ...
+
+    def seed_sample_data(self): ...
+
+    def collection_version(self, collection: str) -> int: ...
+
+    def collection_size(self, collection: str) -> int: ...
+
+    def changes_since(self, collection: str, since: int) -> Changes: ...
+
+    def product_version(self, product_id: int) -> Optional[int]: ...
+
+    def user_version(self, user_id: int) -> Optional[int]: ...
+
+    def create_product(self, product_data: ProductCreate) -> Product: ...
+
+    def create_products(self, items: List[ProductCreate]) -> List[Product]: ...
+
+    def get_all_products(self) -> List[Product]: ...
+
+    def iter_products(self, batch_size: int = 1000) -> Iterator[List[Product]]: ...
+
+    def query_products(
+        self,
+        limit: Optional[int] = None,
+        after_id: Optional[int] = None,
+        category: Optional[str] = None,
+        in_stock: Optional[bool] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        tags: Optional[List[str]] = None,
+        match_any_tag: bool = False,
+        sort_by: str = "id",
+        descending: bool = False,
+    ) -> Page: ...
+
+    def top_products(
+        self, limit: int, category: Optional[str] = None, descending: bool = False
+    ) -> List[Product]: ...
+
+    def search_products(self, query: str, limit: int = 10, offset: int = 0) -> List[Product]: ...
+
+    def get_product(self, product_id: int) -> Optional[Product]: ...
+
+    def update_product(
+        self, product_id: int, update_data: ProductUpdate, expected_version: Optional[int] = None
+    ) -> Optional[Product]: ...
+
+    def update_products(
+        self, updates: List[Tuple[int, ProductUpdate]]
+    ) -> List[Optional[Product]]: ...
+
+    def delete_product(self, product_id: int, expected_version: Optional[int] = None) -> bool: ...
+
+    def delete_products(self, product_ids: List[int]) -> List[bool]: ...
+
+    def create_user(self, user_data: UserCreate) -> User: ...
+
+    def create_users(self, items: List[UserCreate]) -> List[Union[User, DuplicateEmail]]: ...
+
+    def get_all_users(self) -> List[User]: ...
+
+    def iter_users(self, batch_size: int = 1000) -> Iterator[List[User]]: ...
+
+    def query_users(
+        self,
+        limit: Optional[int] = None,
+        after_id: Optional[int] = None,
+        sort_by: str = "id",
+        descending: bool = False,
+    ) -> Page: ...
+
+    def get_user(self, user_id: int) -> Optional[User]: ...
+
+    def get_user_by_email(self, email: str) -> Optional[User]: ...
+
+    def update_user(
+        self, user_id: int, update_data: UserUpdate, expected_version: Optional[int] = None
+    ) -> Optional[User]: ...
+
+    def update_users(
+        self, updates: List[Tuple[int, UserUpdate]]
+    ) -> List[Union[User, DuplicateEmail, None]]: ...
+
+    def delete_user(self, user_id: int, expected_version: Optional[int] = None) -> bool: ...
+
+    def delete_users(self, user_ids: List[int]) -> List[bool]: ...
@@ -13,10 +13,7 @@ class TestProductEndpoints:
         """Set up fresh database for each test."""
         # Reset the database to a clean state
         from main import db
-        db.products = []
-        db.users = []
-        db.next_product_id = 1
-        db.next_user_id = 1
+        db.clear()
         db._init_sample_data()
         self.base_url = "http://localhost:8000"
 
@@ -36,7 +33,7 @@ class TestProductEndpoints:
         """Test getting all products when database is empty."""
         # Clear the database
         from main import db
-        db.products = []
+        db.clear()
         response = self.client.get("/products")
         assert response.status_code == 200
         assert response.json() == []
@@ -165,10 +162,7 @@ class TestUserEndpoints:
         """Set up fresh database for each test."""
         # Reset the database to a clean state
         from main import db
-        db.products = []
-        db.users = []
-        db.next_product_id = 1
-        db.next_user_id = 1
+        db.clear()
         db._init_sample_data()
         self.client = httpx.AsyncClient(app=app, base_url="http://test")
 
@@ -176,7 +170,7 @@ class TestUserEndpoints:
         """Test getting all users when database is empty."""
         # Clear the users database
         from main import db
-        db.users = []
+        db.clear()
         response = self.client.get("/users")
         assert response.status_code == 200
         assert response.json() == []
@@ -235,7 +229,7 @@ class TestUserEndpoints:
         user = response.json()
         assert user["name"] == user_data["name"]
         assert user["email"] == user_data["email"]
-        assert user["password"] == user_data["password"]
+        assert "password" not in user
         assert "id" in user
 
     def test_create_user_missing_required_fields(self):
@@ -268,7 +262,7 @@ class TestUserEndpoints:
         updated_user = response.json()
         assert updated_user["name"] == "Updated Name"
         assert updated_user["email"] == "updated@example.com"
-        assert updated_user["password"] == "originalpass"  # Should remain unchanged
+        assert "password" not in updated_user  # Never exposed by the API
 
     def test_update_user_not_found(self):
         """Test updating a user that doesn't exist."""
@@ -312,10 +306,7 @@ class TestDatabaseIntegration:
     def setup_method(self):
         """Set up fresh database for each test."""
         from main import db
-        db.products = []
-        db.users = []
-        db.next_product_id = 1
-        db.next_user_id = 1
+        db.clear()
         db._init_sample_data()
         self.client = httpx.AsyncClient(app=app, base_url="http://test")
 
@@ -1,8 +1,32 @@
 """Simple unit tests for the CRUD API application."""
+import asyncio
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+
 import pytest
+from fastapi.testclient import TestClient
+
+import main
 from main import app
+from async_database import AsyncDatabase
 from database import InMemoryDatabase
+from sqlite_database import SQLiteDatabase
 from models import ProductCreate, ProductUpdate, UserCreate, UserUpdate
+from cache import ResponseCache
+from changefeed import ChangeFeed, StaleSequence
+from compression import CompressionMiddleware, negotiate
+from metrics import Registry, instrument
+from passwords import PasswordHasher, PasswordHasherBusy
+from search import InvertedIndex, tokenize
+from profiling import Profiler, ProfilingMiddleware, RequestTimings
+from serialization import encode_change
+from storage import SAMPLE_PRODUCTS, ChangesExpired, DuplicateEmail, VersionConflict
+
+SAMPLE_PRODUCT = SAMPLE_PRODUCTS[0]
 
 
 class TestDatabaseOperations:
@@ -41,6 +65,14 @@ class TestDatabaseOperations:
         assert retrieved_product is not None
         assert retrieved_product.name == "Test Product"
 
+    def test_seed_sample_data_only_when_fresh(self):
+        """Test sample data is opt-in and loaded at most once."""
+        assert self.db.get_all_products() == []
+        self.db.seed_sample_data()
+        self.db.seed_sample_data()
+        names = [p.name for p in self.db.get_all_products()]
+        assert names == [p.name for p in SAMPLE_PRODUCTS]
+
     def test_get_product_not_found(self):
         """Test getting a non-existent product."""
         product = self.db.get_product(999)
@@ -85,6 +117,461 @@ class TestDatabaseOperations:
         retrieved_product = self.db.get_product(created_product.id)
         assert retrieved_product is None
 
+    def test_get_all_products_keeps_order_after_delete(self):
+        """Test that deleting a product keeps the remaining rows in id order."""
+        created = [
+            self.db.create_product(ProductCreate(
+                name=f"Product {i}",
+                description="Ordering test",
+                price=1.0,
+                category="Test"
+            ))
+            for i in range(3)
+        ]
+        self.db.delete_product(created[1].id)
+
+        ids = [product.id for product in self.db.get_all_products()]
+        assert created[1].id not in ids
+        assert ids == sorted(ids)
+        assert ids[-1] == created[2].id
+
+    def test_query_products_paginates_with_cursor(self):
+        """Test walking the product list page by page with after_id."""
+        self.db.clear()
+        for i in range(5):
+            self.db.create_product(ProductCreate(
+                name=f"Product {i}",
+                description="Pagination test",
+                price=float(i),
+                category="Test"
+            ))
+
+        first = self.db.query_products(limit=2)
+        assert [p.id for p in first.items] == [1, 2]
+        assert first.next_after_id == 2
+
+        second = self.db.query_products(limit=2, after_id=first.next_after_id)
+        assert [p.id for p in second.items] == [3, 4]
+
+        last = self.db.query_products(limit=2, after_id=second.next_after_id)
+        assert [p.id for p in last.items] == [5]
+        assert last.next_after_id is None
+
+    def test_query_products_filters_and_sorts(self):
+        """Test combining filters with a descending price sort."""
+        self.db.clear()
+        for price, category, tags in [
+            (10.0, "A", ["x"]),
+            (30.0, "A", ["x", "y"]),
+            (20.0, "A", ["x", "y"]),
+            (40.0, "B", ["x", "y"]),
+        ]:
+            self.db.create_product(ProductCreate(
+                name="Product",
+                description="Filter test",
+                price=price,
+                category=category,
+                tags=tags
+            ))
+
+        page = self.db.query_products(
+            category="A", tags=["x", "y"], sort_by="price", descending=True, limit=1
+        )
+        assert [p.price for p in page.items] == [30.0]
+
+        rest = self.db.query_products(
+            category="A", tags=["x", "y"], sort_by="price", descending=True,
+            after_id=page.next_after_id
+        )
+        assert [p.price for p in rest.items] == [20.0]
+        assert rest.next_after_id is None
+
+    def test_secondary_indexes_follow_updates_and_deletes(self):
+        """Test that category, tag and stock filters see updates and deletes."""
+        self.db.clear()
+        first = self.db.create_product(ProductCreate(
+            name="First", description="Index test", price=1.0,
+            category="A", tags=["red", "small"]
+        ))
+        second = self.db.create_product(ProductCreate(
+            name="Second", description="Index test", price=2.0,
+            category="A", tags=["blue"]
+        ))
+
+        self.db.update_product(first.id, ProductUpdate(category="B", tags=["blue"], in_stock=False))
+        assert [p.id for p in self.db.query_products(category="A").items] == [second.id]
+        assert [p.id for p in self.db.query_products(tags=["blue"]).items] == [first.id, second.id]
+        assert self.db.query_products(tags=["red"]).items == []
+        assert [p.id for p in self.db.query_products(in_stock=False).items] == [first.id]
+
+        self.db.delete_product(second.id)
+        assert self.db.query_products(category="A").items == []
+        assert [p.id for p in self.db.query_products(tags=["blue"]).items] == [first.id]
+
+    def test_null_fields_leave_product_and_indexes_unchanged(self):
+        """Test that explicit nulls in an update are ignored rather than stored."""
+        product = self.db.create_product(ProductCreate(
+            name="Kettle", description="Null test", price=25.0,
+            category="Appliances", tags=["kitchen"]
+        ))
+        updated = self.db.update_product(
+            product.id, ProductUpdate(price=None, tags=None, category=None, name="Renamed")
+        )
+        assert updated.name == "Renamed"
+        assert (updated.price, updated.tags, updated.category) == (
+            product.price, product.tags, product.category,
+        )
+        assert [p.id for p in self.db.query_products(category="Appliances").items] == [product.id]
+        assert [p.id for p in self.db.query_products(tags=["kitchen"]).items] == [product.id]
+        by_price = self.db.query_products(min_price=25.0, max_price=25.0, sort_by="price")
+        assert [p.id for p in by_price.items] == [product.id]
+
+    def test_query_products_tag_modes(self):
+        """Test AND and OR semantics for multi-tag queries."""
+        self.db.clear()
+        for tags in (["a"], ["b"], ["a", "b"], ["c"]):
+            self.db.create_product(ProductCreate(
+                name="Tagged", description="Tag test", price=1.0,
+                category="Test", tags=tags
+            ))
+
+        both = self.db.query_products(tags=["a", "b"])
+        either = self.db.query_products(tags=["a", "b"], match_any_tag=True, limit=2)
+        assert [p.id for p in both.items] == [3]
+        assert [p.id for p in either.items] == [1, 2]
+        assert either.next_after_id == 2
+
+    def test_price_range_and_top_products(self):
+        """Test price range queries and top-k reads after a price update."""
+        self.db.clear()
+        for price, category in [(5.0, "A"), (15.0, "B"), (25.0, "A"), (35.0, "A")]:
+            self.db.create_product(ProductCreate(
+                name="Priced", description="Price test", price=price, category=category
+            ))
+        self.db.update_product(1, ProductUpdate(price=45.0))
+
+        page = self.db.query_products(min_price=10.0, max_price=40.0, sort_by="price", limit=2)
+        assert [p.price for p in page.items] == [15.0, 25.0]
+        rest = self.db.query_products(
+            min_price=10.0, max_price=40.0, sort_by="price", after_id=page.next_after_id
+        )
+        assert [p.price for p in rest.items] == [35.0]
+
+        assert [p.price for p in self.db.top_products(2, category="A")] == [25.0, 35.0]
+        assert [p.price for p in self.db.top_products(1, descending=True)] == [45.0]
+
+    def test_search_products_ranks_and_follows_updates(self):
+        """Test full-text search ranking and incremental index maintenance."""
+        self.db.clear()
+        mug = self.db.create_product(ProductCreate(
+            name="Coffee Mug", description="Ceramic mug for coffee lovers",
+            price=9.0, category="Kitchen"
+        ))
+        grinder = self.db.create_product(ProductCreate(
+            name="Grinder", description="Burr grinder for coffee beans",
+            price=59.0, category="Kitchen"
+        ))
+        self.db.create_product(ProductCreate(
+            name="Teapot", description="Glass teapot", price=19.0, category="Kitchen"
+        ))
+
+        assert [p.id for p in self.db.search_products("coffee")] == [mug.id, grinder.id]
+        assert [p.id for p in self.db.search_products("coffee", offset=1)] == [grinder.id]
+
+        self.db.update_product(mug.id, ProductUpdate(name="Mug", description="Ceramic mug"))
+        assert [p.id for p in self.db.search_products("coffee")] == [grinder.id]
+
+        self.db.delete_product(grinder.id)
+        assert self.db.search_products("coffee") == []
+
+    def test_iter_products_batches_from_start_snapshot(self):
+        """Test batched iteration skips rows created after it starts."""
+        self.db.clear()
+        for i in range(5):
+            self.db.create_product(ProductCreate(
+                name=f"Product {i}", description="Export test", price=1.0, category="Test"
+            ))
+
+        batches = self.db.iter_products(batch_size=2)
+        first = next(batches)
+        self.db.create_product(ProductCreate(
+            name="Late", description="Export test", price=1.0, category="Test"
+        ))
+        self.db.delete_product(3)
+        rest = list(batches)
+
+        assert [p.id for p in first] == [1, 2]
+        assert [[p.id for p in batch] for batch in rest] == [[4, 5]]
+
+    def test_returned_rows_are_copies(self):
+        """Test mutating a returned model does not change the stored row."""
+        product = self.db.create_product(ProductCreate(
+            name="Stored", description="Copy test", price=1.0, category="A", tags=["x"]
+        ))
+        product.name = "Changed"
+        product.tags.append("y")
+        stored = self.db.get_product(product.id)
+        assert stored.name == "Stored"
+        assert stored.tags == ["x"]
+        assert self.db.query_products(tags=["y"]).items == []
+
+    def test_versions_advance_on_writes(self):
+        """Test collection and row versions across create, update and delete."""
+        product = self.db.create_product(ProductCreate(
+            name="Versioned", description="Version test", price=1.0, category="Test"
+        ))
+        before = self.db.collection_version("products")
+        assert self.db.product_version(product.id) == 1
+
+        self.db.update_product(product.id, ProductUpdate(price=2.0))
+        assert self.db.product_version(product.id) == 2
+        assert self.db.collection_version("products") == before + 1
+
+        self.db.delete_product(product.id)
+        assert self.db.product_version(product.id) is None
+        assert self.db.collection_version("products") == before + 2
+        assert self.db.collection_version("users") < before
+
+    def test_concurrent_writes_lose_nothing(self):
+        """Test creates and updates from many threads while others read."""
+        writers, per_writer = 8, 25
+        product = self.db.create_product(ProductCreate(
+            name="Contended", description="Concurrency test", price=1.0, category="Test"
+        ))
+        done = threading.Event()
+        errors = []
+
+        def write(n):
+            for i in range(per_writer):
+                self.db.create_product(ProductCreate(
+                    name=f"Writer {n} item {i}", description="Stress", price=float(i),
+                    category=f"Writer {n}",
+                ))
+            # Each writer owns one field, so a lost update shows as a stale value.
+            field = ["name", "description", "category", "price"][n % 4]
+            value = float(n) if field == "price" else f"value {n}"
+            self.db.update_product(product.id, ProductUpdate(**{field: value}))
+
+        def read():
+            while not done.is_set():
+                try:
+                    page = self.db.query_products(sort_by="price", limit=50)
+                    assert [p.price for p in page.items] == sorted(p.price for p in page.items)
+                    self.db.search_products("stress", limit=5)
+                    self.db.get_all_products()
+                except Exception as exc:
+                    errors.append(exc)
+                    return
+
+        readers = [threading.Thread(target=read) for _ in range(2)]
+        for thread in readers:
+            thread.start()
+        threads = [threading.Thread(target=write, args=(n,)) for n in range(writers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        done.set()
+        for thread in readers:
+            thread.join()
+
+        assert errors == []
+        products = self.db.get_all_products()
+        ids = [p.id for p in products]
+        assert len(ids) == writers * per_writer + 1
+        assert ids == sorted(set(ids))
+        for n in range(writers):
+            assert len(self.db.query_products(category=f"Writer {n}").items) == per_writer
+        assert self.db.product_version(product.id) == writers + 1
+        stored = self.db.get_product(product.id)
+        assert stored.name in {"value 0", "value 4"}
+        assert stored.description in {"value 1", "value 5"}
+        assert stored.category in {"value 2", "value 6"}
+        assert stored.price in {3.0, 7.0}
+        assert self.db.collection_version("products") >= len(ids) + writers
+
+    def test_async_database_gathers_writes(self):
+        """Test concurrent awaits through AsyncDatabase allocate distinct ids."""
+        adb = AsyncDatabase(self.db)
+
+        async def create_all():
+            return await asyncio.gather(*(
+                adb.create_product(ProductCreate(
+                    name=f"Async {i}", description="Gathered", price=1.0, category="Async"
+                ))
+                for i in range(20)
+            ))
+
+        created = asyncio.run(create_all())
+        assert sorted(p.id for p in created) == list(range(1, 21))
+        page = asyncio.run(adb.query_products(category="Async", limit=100))
+        assert len(page.items) == 20
+
+    def test_queries_survive_a_clear_before_they_lock(self):
+        """Test that a clear racing a query can't hand it stale ids for the new table."""
+        if not hasattr(self.db, "_lock"):
+            pytest.skip("SQLite reads see one committed state per statement")
+        for i in range(3):
+            self.db.create_product(ProductCreate(
+                name=f"Row {i}", description="Race", price=1.0, category="Race"
+            ))
+        lock, db = self.db._lock, self.db
+
+        class ClearFirst:
+            """Run a clear just before the first read lock is taken."""
+            raced = False
+
+            def read(self):
+                if not self.raced:
+                    self.raced = True
+                    db.clear()
+                    db.create_product(SAMPLE_PRODUCT)
+                return lock.read()
+
+            def write(self):
+                return lock.write()
+
+        self.db._lock = ClearFirst()
+        assert [p.id for p in self.db.query_products(limit=10).items] == [1]
+        self.db._lock = ClearFirst()
+        assert [[p.id for p in batch] for batch in self.db.iter_products()] == [[1]]
+
+    def test_async_database_reads_do_not_block_the_loop(self):
+        """Test a read stuck in the backend, e.g. behind a writer, leaves the loop free."""
+        from functools import wraps
+
+        adb = AsyncDatabase(self.db)
+        released = threading.Event()
+        get_product = self.db.get_product
+
+        @wraps(get_product)
+        def waiting_get_product(product_id):
+            released.wait(timeout=2)  # Would time out if run on the loop
+            return get_product(product_id)
+
+        self.db.get_product = waiting_get_product
+
+        async def read_while_loop_runs():
+            read = asyncio.ensure_future(adb.get_product(1))
+            await asyncio.sleep(0.01)
+            loop_free = not read.done()
+            released.set()
+            await read
+            return loop_free, released.is_set()
+
+        assert asyncio.run(read_while_loop_runs()) == (True, True)
+        assert asyncio.run(adb.collection_version("products")) == self.db.collection_version(
+            "products"
+        )
+
+    def test_conditional_writes_compare_versions(self):
+        """Test that expected_version turns updates and deletes into compare-and-swap."""
+        product = self.db.create_product(ProductCreate(
+            name="Guarded", description="CAS test", price=1.0, category="Test"
+        ))
+        updated = self.db.update_product(product.id, ProductUpdate(price=2.0), expected_version=1)
+        assert updated.price == 2.0
+
+        with pytest.raises(VersionConflict) as conflict:
+            self.db.update_product(product.id, ProductUpdate(price=3.0), expected_version=1)
+        assert conflict.value.current_version == 2
+        with pytest.raises(VersionConflict):
+            self.db.delete_product(product.id, expected_version=1)
+        assert self.db.get_product(product.id).price == 2.0
+        assert self.db.product_version(product.id) == 2
+
+        assert self.db.update_product(999, ProductUpdate(price=3.0), expected_version=1) is None
+        assert self.db.delete_product(999, expected_version=1) is False
+        assert self.db.delete_product(product.id, expected_version=2) is True
+
+        user = self.db.create_user(UserCreate(name="Guarded", email="g@example.com", password="pw"))
+        with pytest.raises(VersionConflict):
+            self.db.update_user(user.id, UserUpdate(name="Stale"), expected_version=2)
+        assert self.db.update_user(user.id, UserUpdate(name="Fresh"), expected_version=1).name == "Fresh"
+        with pytest.raises(VersionConflict):
+            self.db.delete_user(user.id, expected_version=1)
+        assert self.db.delete_user(user.id, expected_version=2) is True
+
+    def test_contended_conditional_updates_have_one_winner(self):
+        """Test that of several writers holding the same version, exactly one wins."""
+        product = self.db.create_product(ProductCreate(
+            name="Contended", description="CAS race", price=0.0, category="Test"
+        ))
+        rounds, writers = 5, 6
+        for round_number in range(rounds):
+            version = self.db.product_version(product.id)
+            outcomes = []
+            barrier = threading.Barrier(writers)
+
+            def write(n):
+                barrier.wait()
+                try:
+                    self.db.update_product(
+                        product.id, ProductUpdate(price=float(n)), expected_version=version
+                    )
+                    outcomes.append(n)
+                except VersionConflict:
+                    pass
+
+            threads = [threading.Thread(target=write, args=(n,)) for n in range(writers)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            assert len(outcomes) == 1
+            assert self.db.get_product(product.id).price == float(outcomes[0])
+        assert self.db.product_version(product.id) == rounds + 1
+
+    def test_changes_since_lists_writes_and_tombstones(self):
+        """Test delta sync from a version, including deletes."""
+        for i in range(3):
+            self.db.create_product(ProductCreate(
+                name=f"Synced {i}", description="Sync test", price=1.0, category="Test"
+            ))
+        everything = self.db.changes_since("products", 0)
+        assert sorted(p.id for p in everything.rows) == [1, 2, 3]
+        since = everything.version
+        assert since == self.db.collection_version("products")
+
+        self.db.update_product(1, ProductUpdate(name="Edited"))
+        self.db.delete_product(2)
+        self.db.create_product(ProductCreate(
+            name="Added", description="Sync test", price=1.0, category="Test"
+        ))
+        delta = self.db.changes_since("products", since)
+        assert [(p.id, p.name) for p in delta.rows] == [(1, "Edited"), (4, "Added")]
+        assert delta.deleted == [2]
+        assert delta.version == since + 3
+
+        empty = self.db.changes_since("products", delta.version)
+        assert (empty.rows, empty.deleted, empty.version) == ([], [], delta.version)
+        assert self.db.changes_since("users", 0).rows == []
+        with pytest.raises(ChangesExpired):
+            self.db.changes_since("products", delta.version + 1)
+
+    def test_changes_since_forgets_old_tombstones(self):
+        """Test bounded tombstone retention and resets expire old sync points."""
+        self.db._tombstone_limit = 2
+        for i in range(4):
+            self.db.create_product(ProductCreate(
+                name=f"Doomed {i}", description="Sync test", price=1.0, category="Test"
+            ))
+        since = self.db.collection_version("products")
+        for product_id in (1, 2, 3):
+            self.db.delete_product(product_id)
+
+        with pytest.raises(ChangesExpired) as expired:
+            self.db.changes_since("products", since)
+        assert expired.value.horizon == since + 1
+        delta = self.db.changes_since("products", since + 1)
+        assert delta.deleted == [2, 3]
+        assert [p.id for p in self.db.changes_since("products", 0).rows] == [4]
+
+        self.db.clear()
+        with pytest.raises(ChangesExpired):
+            self.db.changes_since("products", delta.version)
+        assert self.db.changes_since("products", 0).deleted == []
+
     def test_create_user(self):
         """Test creating a user."""
         user_data = UserCreate(
@@ -154,6 +641,595 @@ class TestDatabaseOperations:
         retrieved_user = self.db.get_user(created_user.id)
         assert retrieved_user is None
 
+    def test_emails_are_unique_by_normalized_form(self):
+        """Test the email index on create, update, delete and lookup."""
+        ann = self.db.create_user(UserCreate(name="Ann", email="Ann@Example.com", password="pw"))
+        bob = self.db.create_user(UserCreate(name="Bob", email="bob@example.com", password="pw"))
+        with pytest.raises(DuplicateEmail) as duplicate:
+            self.db.create_user(UserCreate(name="Ann", email=" ann@example.COM ", password="pw"))
+        assert duplicate.value.user_id == ann.id
+        assert self.db.get_user_by_email("ANN@example.com").id == ann.id
+        assert self.db.get_user_by_email("nobody@example.com") is None
+
+        with pytest.raises(DuplicateEmail):
+            self.db.update_user(bob.id, UserUpdate(email="ann@example.com"))
+        assert self.db.get_user(bob.id).email == "bob@example.com"
+        assert self.db.update_user(ann.id, UserUpdate(email="ann@example.com")) is not None
+        assert self.db.update_user(99, UserUpdate(email="bob@example.com")) is None
+        self.db.update_user(bob.id, UserUpdate(email="robert@example.com"))
+        assert self.db.get_user_by_email("bob@example.com") is None
+        assert self.db.get_user_by_email("robert@example.com").id == bob.id
+
+        results = self.db.create_users([
+            UserCreate(name="Bob", email="bob@example.com", password="pw"),
+            UserCreate(name="Rob", email="Robert@example.com", password="pw"),
+        ])
+        assert results[0].email == "bob@example.com"
+        assert isinstance(results[1], DuplicateEmail) and results[1].user_id == bob.id
+        updates = self.db.update_users([(ann.id, UserUpdate(email="bob@example.com"))])
+        assert isinstance(updates[0], DuplicateEmail)
+
+        self.db.delete_user(ann.id)
+        assert self.db.get_user_by_email("ann@example.com") is None
+        self.db.create_user(UserCreate(name="Ann", email="ann@example.com", password="pw"))
+
+
+class TestSQLiteDatabaseOperations(TestDatabaseOperations):
+    """Run the database operation tests against the SQLite backend."""
+
+    def setup_method(self):
+        """Set up a fresh SQLite database file for each test."""
+        self.tmpdir = tempfile.mkdtemp()
+        self.db = SQLiteDatabase(os.path.join(self.tmpdir, "test.db"))
+
+    def teardown_method(self):
+        """Close the database and remove its files."""
+        self.db.close()
+        shutil.rmtree(self.tmpdir)
+
+    def test_upgrade_keys_existing_emails(self):
+        """Test opening a file from before the email index keeps its duplicates."""
+        self.db.close()
+        path = os.path.join(self.tmpdir, "old.db")
+        connection = sqlite3.connect(path)
+        connection.executescript("""
+            CREATE TABLE users (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL,
+                email TEXT NOT NULL, password TEXT NOT NULL,
+                created_at TEXT NOT NULL, updated_at TEXT NOT NULL,
+                version INTEGER NOT NULL DEFAULT 1
+            );
+            INSERT INTO users (name, email, password, created_at, updated_at) VALUES
+                ('Ann', 'ann@example.com', 'pw', '2024-01-01T00:00:00', '2024-01-01T00:00:00'),
+                ('Ann', 'ANN@example.com', 'pw', '2024-01-01T00:00:00', '2024-01-01T00:00:00');
+        """)
+        connection.close()
+
+        self.db = SQLiteDatabase(path)
+        assert self.db.get_user_by_email("ann@example.com").id == 1
+        assert len(self.db.get_all_users()) == 2
+        with pytest.raises(DuplicateEmail):
+            self.db.create_user(UserCreate(name="Ann", email="Ann@example.com", password="pw"))
+
+
+class TestWriteAheadLog:
+    """Test that InMemoryDatabase survives a restart through its log."""
+
+    def setup_method(self):
+        """Set up an empty log directory for each test."""
+        self.tmpdir = tempfile.mkdtemp()
+
+    def teardown_method(self):
+        """Remove the log directory."""
+        shutil.rmtree(self.tmpdir)
+
+    def open(self, **kwargs):
+        return InMemoryDatabase(wal_dir=self.tmpdir, fsync=False, **kwargs)
+
+    def write_some(self, db):
+        db.create_products([
+            ProductCreate(name=f"P{i}", description="d", price=i, category="C", tags=["t"])
+            for i in range(6)
+        ])
+        db.update_product(4, ProductUpdate(name="Renamed", price=99.0))
+        db.delete_product(3)
+        db.update_products([(5, ProductUpdate(category="D")), (6, ProductUpdate(in_stock=False))])
+        user = db.create_user(UserCreate(name="Ann", email="ann@example.com", password="pw"))
+        db.update_user(user.id, UserUpdate(name="Anne", email="Anne@example.com"))
+
+    def assert_same_state(self, before, after):
+        assert after.get_all_products() == before.get_all_products()
+        assert after.get_all_users() == before.get_all_users()
+        assert after.versions == before.versions
+        assert after._row_versions == before._row_versions
+        assert after.query_products(category="D").items == before.query_products(category="D").items
+        assert after.search_products("renamed") == before.search_products("renamed")
+        assert after._changed_at == before._changed_at
+        assert after._change_horizons == before._change_horizons
+        assert after._email_index == before._email_index
+        assert after.changes_since("products", 3) == before.changes_since("products", 3)
+
+    def test_subscribers_hear_of_writes_once_durable(self):
+        """Test subscribers are called after the log commit, in version order."""
+        db = self.open()
+        seen = []
+        db.subscribe(lambda change: seen.append((change, db._wal.durable)))
+        self.write_some(db)
+        db.close()
+        for collection in ("products", "users"):
+            versions = [c.version for c, _ in seen if c.collection == collection]
+            assert versions == sorted(versions)
+        # Every record up to and including this write's had been flushed.
+        assert all(durable >= index for index, (_, durable) in enumerate(seen, 1))
+        assert len(seen) == db._wal.appended
+
+    def test_null_fields_are_not_logged(self):
+        """Test an update with explicit nulls replays, so the log stays recoverable."""
+        db = self.open()
+        product = db.create_product(SAMPLE_PRODUCT)
+        user = db.create_user(UserCreate(name="Ann", email="ann@example.com", password="pw"))
+        db.update_product(product.id, ProductUpdate(name=None, price=None, tags=None))
+        db.update_user(user.id, UserUpdate(name=None, email=None, password=None))
+        db.close()
+
+        recovered = self.open()
+        self.assert_same_state(db, recovered)
+        assert recovered.get_product(product.id).name == product.name
+        assert recovered.get_user(user.id).name == "Ann"
+        recovered.close()
+
+    def test_recovers_from_log(self):
+        """Test replaying the log rebuilds rows, indexes and versions."""
+        db = self.open()
+        self.write_some(db)
+        db.close()
+
+        recovered = self.open()
+        self.assert_same_state(db, recovered)
+        assert recovered.create_product(SAMPLE_PRODUCT).id == 7
+        recovered.close()
+
+    def test_recovers_from_snapshot_and_tail(self):
+        """Test snapshots compact the log and are replayed with its tail."""
+        db = self.open(snapshot_every=5)
+        self.write_some(db)
+        db.create_user(UserCreate(name="Bob", email="bob@example.com", password="pw"))
+        db.close()
+        assert os.path.exists(os.path.join(self.tmpdir, "snapshot"))
+        assert len([name for name in os.listdir(self.tmpdir) if name.startswith("log.")]) == 1
+
+        recovered = self.open(snapshot_every=5)
+        self.assert_same_state(db, recovered)
+        recovered.close()
+
+    def test_ignores_torn_tail(self):
+        """Test a partially written record at the end of the log is dropped."""
+        db = self.open()
+        self.write_some(db)
+        db.close()
+        segment = sorted(name for name in os.listdir(self.tmpdir) if name.startswith("log."))[-1]
+        with open(os.path.join(self.tmpdir, segment), "ab") as f:
+            f.write(b"\x40\x00\x00\x00\x00\x00\x00\x00[\"products\"")
+
+        recovered = self.open()
+        self.assert_same_state(db, recovered)
+        recovered.close()
+
+    def test_snapshot_file_round_trip(self):
+        """Test loading a snapshot restores rows, versions and every index."""
+        db = InMemoryDatabase()
+        self.write_some(db)
+        path = os.path.join(self.tmpdir, "data.snap")
+        db.save_snapshot(path)
+
+        restored = InMemoryDatabase()
+        restored.load_snapshot(path)
+        self.assert_same_state(db, restored)
+        assert restored.query_products(tags=["t"], in_stock=False).items == [db.get_product(6)]
+        assert restored.top_products(2) == db.top_products(2)
+        assert restored.create_product(SAMPLE_PRODUCT).id == 7
+        assert restored.search_products("headphones")[0].id == 7
+
+    def test_clear_is_logged(self):
+        """Test a cleared database stays empty after a restart."""
+        db = self.open()
+        self.write_some(db)
+        db.clear()
+        db.close()
+
+        recovered = self.open()
+        assert recovered.get_all_products() == []
+        assert recovered.get_all_users() == []
+        assert recovered.versions == db.versions
+        recovered.close()
+
+
+class TestChangeFeed:
+    """Test the change feed and the SSE stream built on it."""
+
+    def setup_method(self):
+        self.db = InMemoryDatabase()
+        self.feed = ChangeFeed(4, encode_change)
+        self.db.subscribe(self.feed.publish)
+
+    def create(self, name="Fed"):
+        return self.db.create_product(ProductCreate(
+            name=name, description="Feed test", price=1.0, category="Test"
+        ))
+
+    def messages(self, after_seq, count, collection=None, write=None):
+        """Collect ``count`` SSE messages, running ``write`` once the stream is idle."""
+        async def collect():
+            stream = main._change_stream(self.feed, after_seq, collection)
+            received = []
+            while len(received) < count:
+                next_chunk = asyncio.ensure_future(stream.__anext__())
+                await asyncio.sleep(0.01)
+                if not next_chunk.done() and write is not None:
+                    await asyncio.to_thread(write)
+                chunk = await asyncio.wait_for(next_chunk, 5)
+                received.extend(m for m in chunk.decode().split("\n\n") if m)
+            await stream.aclose()
+            return received
+
+        return [
+            dict(line.split(": ", 1) for line in message.splitlines())
+            for message in asyncio.run(collect())
+        ]
+
+    def test_read_and_overflow(self):
+        """Test reading forward by sequence and losing events past capacity."""
+        for i in range(3):
+            self.create(f"Fed {i}")
+        events = self.feed.read(0, limit=10)
+        assert [e.seq for e in events] == [1, 2, 3]
+        assert json.loads(events[0].data)["row"]["name"] == "Fed 0"
+        assert [e.seq for e in self.feed.read(1, limit=1)] == [2]
+        assert self.feed.read(3, limit=10) == []
+
+        for i in range(3):
+            self.create()
+        with pytest.raises(StaleSequence):
+            self.feed.read(1, limit=10)
+        with pytest.raises(StaleSequence):
+            self.feed.read(7, limit=10)
+        assert [e.seq for e in self.feed.read(2, limit=10)] == [3, 4, 5, 6]
+
+    def test_positions_belong_to_one_run(self):
+        """Test that resume tokens from another feed are not honoured."""
+        token = self.feed.position(3)
+        assert self.feed.parse_position(token) == 3
+        assert ChangeFeed(4, encode_change).parse_position(token) is None
+        assert self.feed.parse_position("garbage") is None
+
+    def test_stream_resyncs_then_follows_writes(self):
+        """Test that a new client is told to load, then receives deltas."""
+        self.create()
+        messages = self.messages(None, 2, write=lambda: self.create("Live"))
+        assert messages[0]["event"] == "resync"
+        assert messages[0]["id"] == self.feed.position(1)
+        change = json.loads(messages[1]["data"])
+        assert messages[1]["event"] == "change"
+        assert messages[1]["id"] == self.feed.position(2)
+        assert (change["op"], change["id"], change["row"]["name"]) == ("create", 2, "Live")
+
+    def test_stream_resumes_and_filters(self):
+        """Test resuming from a sequence, with another collection filtered out."""
+        product = self.create()
+        self.db.create_user(UserCreate(name="Fed", email="fed@example.com", password="secret"))
+        self.db.delete_product(product.id)
+        messages = self.messages(0, 2, collection="products")
+        assert [json.loads(m["data"])["op"] for m in messages] == ["create", "delete"]
+        assert messages[1]["id"] == self.feed.position(3)
+
+        user = self.messages(1, 1, collection="users")[0]
+        assert "password" not in json.loads(user["data"])["row"]
+
+    def test_slow_consumer_is_resynced(self):
+        """Test that a client further behind than the buffer is told to resync."""
+        for _ in range(6):
+            self.create()
+        messages = self.messages(1, 1)
+        assert messages[0]["event"] == "resync"
+        assert messages[0]["id"] == self.feed.position(6)
+
+
+class TestInvertedIndex:
+    """Test that pruned BM25 search returns what scoring every posting would."""
+
+    @staticmethod
+    def exhaustive(index, texts, query, limit, offset=0):
+        """Rank by scoring every document, as search did before pruning."""
+        import math
+
+        average_length = sum(len(tokenize(text)) for text in texts.values()) / len(texts)
+        scores = {}
+        for term in set(tokenize(query)):
+            matching = [doc_id for doc_id, text in texts.items() if term in tokenize(text)]
+            if not matching:
+                continue
+            idf = math.log(1 + (len(texts) - len(matching) + 0.5) / (len(matching) + 0.5))
+            for doc_id in matching:
+                tokens = tokenize(texts[doc_id])
+                frequency = tokens.count(term)
+                weight = idf * frequency * (index.k1 + 1) / (
+                    frequency + index.k1 * (1 - index.b + index.b * len(tokens) / average_length)
+                )
+                scores[doc_id] = scores.get(doc_id, 0.0) + weight
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        return ranked[offset:offset + limit]
+
+    def test_pruned_search_matches_exhaustive_ranking(self):
+        """Test single- and multi-term queries across adds, replacements and removals."""
+        import random
+
+        rng = random.Random(7)
+        words = [f"w{i}" for i in range(30)]
+        weights = [1 / (rank + 1) for rank in range(len(words))]
+        index, texts = InvertedIndex(), {}
+        for doc_id in range(1, 400):
+            texts[doc_id] = " ".join(rng.choices(words, weights, k=rng.randint(2, 12)))
+            index.add(doc_id, texts[doc_id])
+        for doc_id in rng.sample(sorted(texts), 100):
+            if doc_id % 2:
+                index.remove(doc_id)
+                del texts[doc_id]
+            else:
+                texts[doc_id] = " ".join(rng.choices(words, weights, k=rng.randint(2, 12)))
+                index.add(doc_id, texts[doc_id])
+
+        for query in ("w0", "w1", "w29", "w0 w1", "w2 w7 w20", "w0 missing"):
+            for limit, offset in ((10, 0), (5, 20), (300, 0)):
+                expected = self.exhaustive(index, texts, query, limit, offset)
+                found = index.search(query, limit=limit, offset=offset)
+                assert [doc_id for doc_id, _ in found] == [doc_id for doc_id, _ in expected]
+                assert [score for _, score in found] == pytest.approx(
+                    [score for _, score in expected]
+                )
+
+
+class TestCompression:
+    """Test Accept-Encoding negotiation and the compression middleware."""
+
+    def setup_method(self):
+        """Wrap a small app whose responses exercise each pass-through rule."""
+        from fastapi import FastAPI, Response
+        from fastapi.responses import StreamingResponse
+
+        inner = FastAPI()
+        big = json.dumps([{"id": i, "name": f"Row {i}"} for i in range(200)]).encode()
+
+        @inner.get("/big")
+        def get_big():
+            return Response(big, media_type="application/json")
+
+        @inner.get("/small")
+        def get_small():
+            return {"ok": True}
+
+        @inner.get("/stream")
+        def get_stream():
+            return StreamingResponse(iter([b'{"n": 1}\n', b'{"n": 2}\n']), media_type="application/x-ndjson")
+
+        @inner.get("/events")
+        def get_events():
+            return StreamingResponse(iter([b"data: 1\n\n"]), media_type="text/event-stream")
+
+        inner.add_middleware(CompressionMiddleware, minimum_size=1024)
+        self.big = big
+        self.client = TestClient(inner)
+
+    def test_negotiate_honours_q_values(self):
+        """Test that the preferred acceptable encoding is chosen."""
+        assert negotiate(None) is None
+        assert negotiate("identity") is None
+        assert negotiate("gzip") == "gzip"
+        assert negotiate("gzip;q=0") is None
+        assert negotiate("*") is not None
+        assert negotiate("*;q=0") is None
+        assert negotiate("deflate, GZIP;q=0.5") == "gzip"
+
+    def test_large_json_is_compressed(self):
+        """Test that bodies over the threshold are compressed with a fixed length."""
+        response = self.client.get("/big", headers={"Accept-Encoding": "gzip"})
+        assert response.headers["Content-Encoding"] == "gzip"
+        assert response.headers["Vary"] == "Accept-Encoding"
+        assert int(response.headers["Content-Length"]) < len(self.big)
+        assert response.content == self.big
+
+    def test_small_and_event_stream_bodies_pass_through(self):
+        """Test that small bodies and event streams are sent as they are."""
+        for path in ("/small", "/events"):
+            response = self.client.get(path, headers={"Accept-Encoding": "gzip"})
+            assert "Content-Encoding" not in response.headers
+        response = self.client.get("/big", headers={"Accept-Encoding": "identity"})
+        assert "Content-Encoding" not in response.headers
+
+    def test_streamed_body_is_compressed_incrementally(self):
+        """Test that a streamed NDJSON body decodes to the original lines."""
+        response = self.client.get("/stream", headers={"Accept-Encoding": "gzip"})
+        assert response.headers["Content-Encoding"] == "gzip"
+        assert "Content-Length" not in response.headers
+        assert [json.loads(line)["n"] for line in response.text.splitlines()] == [1, 2]
+
+    def test_cache_compresses_each_variant_once(self):
+        """Test that a cached variant is built once and dropped with its version."""
+        cache = ResponseCache(1024 * 1024, compress_min_bytes=1024)
+        cache.put("key", "products", 1, self.big, {})
+        first = asyncio.run(cache.add_variant("key", cache.get("key", 1), "gzip"))
+        variant = first.variants["gzip"]
+        again = asyncio.run(cache.add_variant("key", cache.get("key", 1), "gzip"))
+        assert again.variants["gzip"] is variant
+        assert cache.stats()["bytes"] == len(self.big) + len(variant)
+        assert first.response("gzip").headers["Content-Encoding"] == "gzip"
+        assert "Content-Encoding" not in first.response(None).headers
+        assert cache.get("key", 2) is None
+
+        small = cache.put("small", "products", 1, b"[]", {})
+        assert asyncio.run(cache.add_variant("small", small, "gzip")).variants == {}
+
+    def test_large_bodies_compress_off_the_loop(self, monkeypatch):
+        """Test that bodies over the offload threshold are compressed in a worker thread."""
+        import compression
+
+        threads = []
+        gzip = compression.COMPRESSORS["gzip"]
+
+        def recording(body):
+            threads.append(threading.current_thread())
+            return gzip(body)
+
+        monkeypatch.setitem(compression.COMPRESSORS, "gzip", recording)
+        monkeypatch.setattr(compression, "OFFLOAD_MIN_BYTES", len(self.big))
+
+        asyncio.run(compression.compress_async(b"x" * (len(self.big) - 1), "gzip"))
+        assert threads.pop() is threading.current_thread()
+        asyncio.run(compression.compress_async(self.big, "gzip"))
+        assert threads.pop().name == "AnyIO worker thread"
+        response = self.client.get("/big", headers={"Accept-Encoding": "gzip"})
+        assert response.content == self.big
+        assert threads.pop().name == "AnyIO worker thread"
+
+
+class TestPasswordHasher:
+    """Test scrypt hashing and the hasher's admission limit."""
+
+    def setup_method(self):
+        """Use cheap cost parameters; the format doesn't depend on them."""
+        self.hasher = PasswordHasher(n=2 ** 4, workers=2, max_pending=2)
+
+    def teardown_method(self):
+        """Stop the pool's threads."""
+        self.hasher.close()
+
+    def test_hash_and_verify(self):
+        """Test hashes are salted, verifiable and record their parameters."""
+        first, second = asyncio.run(self.hasher.hash_many(["secret", "secret"]))
+        assert first != second and first.startswith("scrypt$16$8$1$")
+        assert "secret" not in first
+        assert asyncio.run(self.hasher.verify("secret", first))
+        assert not asyncio.run(self.hasher.verify("wrong", first))
+        assert not self.hasher.verify_sync("secret", self.hasher.unknown_user_hash)
+        assert not self.hasher.needs_rehash(first)
+        assert PasswordHasher(n=2 ** 5).needs_rehash(first)
+
+    def test_plain_text_from_before_hashing_verifies(self):
+        """Test stored plain text is accepted once and flagged for rehashing."""
+        assert self.hasher.verify_sync("legacy", "legacy")
+        assert not self.hasher.verify_sync("other", "legacy")
+        assert self.hasher.needs_rehash("legacy")
+
+    def test_rejects_work_beyond_max_pending(self):
+        """Test the hasher sheds load instead of queueing without bound."""
+        release = threading.Event()
+        self.hasher._executor.submit(release.wait)  # Occupy a worker
+
+        async def flood():
+            calls = [self.hasher.hash("pw") for _ in range(3)]
+            return await asyncio.gather(*calls, return_exceptions=True)
+
+        threading.Timer(0.2, release.set).start()
+        results = asyncio.run(flood())
+        assert [isinstance(result, PasswordHasherBusy) for result in results] == [
+            False, False, True,
+        ]
+        assert self.hasher.pending == 0
+
+
+class TestMetrics:
+    """Test metric families and their Prometheus rendering."""
+
+    def test_histogram_buckets_are_cumulative(self):
+        """Test observations land in the first bucket they fit and add up."""
+        registry = Registry()
+        latency = registry.histogram("latency_seconds", "Latency.", ("route",))
+        for value in (0.0001, 0.003, 0.003, 20.0):
+            latency.observe(("/a",), value)
+        lines = registry.render().splitlines()
+        assert 'latency_seconds_bucket{route="/a",le="0.0001"} 1' in lines
+        assert 'latency_seconds_bucket{route="/a",le="0.0025"} 1' in lines
+        assert 'latency_seconds_bucket{route="/a",le="0.005"} 3' in lines
+        assert 'latency_seconds_bucket{route="/a",le="10.0"} 3' in lines
+        assert 'latency_seconds_bucket{route="/a",le="+Inf"} 4' in lines
+        assert 'latency_seconds_count{route="/a"} 4' in lines
+        assert "# TYPE latency_seconds histogram" in lines
+
+    def test_counts_from_many_threads_are_merged(self):
+        """Test per-thread shards add up to every increment."""
+        registry = Registry()
+        requests = registry.counter("requests_total", "Requests.", ("status",))
+        assert registry.counter("requests_total", "Requests.", ("status",)) is requests
+
+        def work():
+            for _ in range(1000):
+                requests.inc(("200",))
+
+        threads = [threading.Thread(target=work) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert 'requests_total{status="200"} 8000' in registry.render().splitlines()
+
+    def test_exited_threads_fold_into_one_shard(self):
+        """Test counts from threads that exited are kept while their shards are dropped."""
+        registry = Registry()
+        requests = registry.counter("requests_total", "Requests.", ("status",))
+        for _ in range(20):
+            thread = threading.Thread(target=requests.inc, args=(("200",),))
+            thread.start()
+            thread.join()
+        requests.inc(("200",))
+        assert len(requests._shards) == 1
+        assert 'requests_total{status="200"} 21' in registry.render().splitlines()
+
+    def test_instrument_times_backend_methods(self):
+        """Test wrapped storage methods still work and are timed by name."""
+        registry = Registry()
+        db = InMemoryDatabase()
+        instrument(db, registry, ["create_product", "get_product"])
+        product = db.create_product(SAMPLE_PRODUCT)
+        assert db.get_product(product.id) == product
+        lines = registry.render().splitlines()
+        assert 'db_operation_duration_seconds_count{method="create_product"} 1' in lines
+        assert 'db_operation_duration_seconds_count{method="get_product"} 1' in lines
+
+
+class TestProfiling:
+    """Test choosing requests to profile and splitting their time into phases."""
+
+    def test_phases_add_up_to_the_request(self):
+        """Test database time is split out of the endpoint's time."""
+        timings = RequestTimings()
+        start = timings.start
+        timings.handler, timings.endpoint = start + 0.001, start + 0.003
+        timings.endpoint_done, timings.handled = start + 0.010, start + 0.011
+        timings.end, timings.db = start + 0.012, 0.004
+        phases = timings.phases()
+        assert list(phases) == ["routing", "parsing", "endpoint", "db", "serialization", "sending"]
+        assert phases["endpoint"] == pytest.approx(3.0)
+        assert phases["db"] == pytest.approx(4.0)
+        assert sum(phases.values()) == pytest.approx(12.0)
+
+    def test_requests_are_chosen_by_header_or_sample(self):
+        """Test the header must match exactly and sampling applies to the rest."""
+        profiler = Profiler(header_value="token")
+        assert profiler.reason([(b"x-profile", b"token")]) == "header"
+        assert profiler.reason([(b"x-profile", b"1")]) is None
+        assert Profiler().reason([(b"x-profile", b"token")]) is None
+        assert Profiler(sample_rate=1.0).reason([]) == "sample"
+
+    def test_one_request_is_profiled_at_a_time(self):
+        """Test the profiling slot is taken by one request until stopped."""
+        profiler = Profiler()
+        profile = profiler.try_start()
+        assert profile is not None
+        assert profiler.try_start() is None
+        profiler.stop(profile)
+        again = profiler.try_start()
+        assert again is not None
+        profiler.stop(again)
+
 
 class TestModelValidation:
     """Test Pydantic model validation."""
@@ -196,5 +1272,496 @@ class TestModelValidation:
         assert update.email is None  # Should be None when not provided
 
 
+class TestApiEndpoints:
+    """Test API endpoints in-process through the ASGI app."""
+
+    def setup_method(self):
+        """Set up a fresh shared database and a test client for each test."""
+        from main import db, response_cache
+        self.db = db
+        self.db.clear()
+        self.db._init_sample_data()
+        self.cache = response_cache
+        self.cache.clear()
+        main.password_hasher.n = 2 ** 4  # Cheap hashes keep the tests fast
+        self.client = TestClient(app)
+
+    def test_get_products_page_sets_next_cursor(self):
+        """Test that a partial page advertises the next cursor."""
+        response = self.client.get("/products", params={"limit": 2})
+        assert response.status_code == 200
+        assert [p["id"] for p in response.json()] == [1, 2]
+        assert response.headers["X-Next-After-Id"] == "2"
+
+        response = self.client.get("/products", params={"limit": 2, "after_id": 2})
+        assert [p["id"] for p in response.json()] == [3]
+        assert "X-Next-After-Id" not in response.headers
+
+    def test_get_products_unknown_cursor(self):
+        """Test that a sorted query with a deleted cursor row is rejected."""
+        response = self.client.get("/products", params={"sort": "price", "after_id": 999})
+        assert response.status_code == 400
+
+    def test_get_top_products(self):
+        """Test the most expensive product endpoint."""
+        response = self.client.get("/products/top", params={"limit": 1, "order": "desc"})
+        assert response.status_code == 200
+        assert [p["name"] for p in response.json()] == ["Wireless Headphones"]
+
+    def test_search_products(self):
+        """Test the full-text search endpoint."""
+        response = self.client.get("/products/search", params={"q": "coffee grinder"})
+        assert response.status_code == 200
+        assert [p["name"] for p in response.json()] == ["Coffee Maker"]
+
+    def test_bulk_product_lifecycle(self):
+        """Test bulk create, update and delete with per-item results."""
+        response = self.client.post("/products/bulk", json=[
+            {"name": "Bulk A", "description": "First", "price": 1.0, "category": "Bulk"},
+            {"name": "Bulk B"},
+            {"name": "Bulk C", "description": "Third", "price": 3.0, "category": "Bulk"},
+        ])
+        assert response.status_code == 200
+        results = response.json()["results"]
+        assert [r["status"] for r in results] == [200, 422, 200]
+        created_ids = [results[0]["id"], results[2]["id"]]
+
+        response = self.client.patch("/products/bulk", json=[
+            {"id": created_ids[0], "price": 10.0},
+            {"id": 99999, "price": 1.0},
+        ])
+        assert [r["status"] for r in response.json()["results"]] == [200, 404]
+        assert self.db.get_product(created_ids[0]).price == 10.0
+        assert self.db.get_product(created_ids[0]).name == "Bulk A"
+
+        response = self.client.request("DELETE", "/products/bulk", json=created_ids + [99999])
+        assert [r["status"] for r in response.json()["results"]] == [200, 200, 404]
+        assert self.db.get_product(created_ids[1]) is None
+
+    def test_passwords_are_hashed_and_verified(self):
+        """Test passwords are stored hashed, never returned, and checked by /users/verify."""
+        user = {"name": "Ann", "email": "ann@example.com", "password": "secret"}
+        created = self.client.post("/users", json=user).json()
+        assert "password" not in created
+        stored = self.db.get_user(created["id"]).password
+        assert stored.startswith("scrypt$") and "secret" not in stored
+        assert "secret" not in repr(self.db.get_user(created["id"]))
+
+        credentials = {"email": "ANN@example.com", "password": "secret"}
+        response = self.client.post("/users/verify", json=credentials)
+        assert response.status_code == 200
+        assert response.json()["id"] == created["id"]
+        assert "password" not in response.json()
+        for wrong in (dict(credentials, password="nope"), dict(credentials, email="x@y.z")):
+            response = self.client.post("/users/verify", json=wrong)
+            assert response.status_code == 401
+
+        self.client.put(f"/users/{created['id']}", json={"password": "changed"})
+        assert self.client.post("/users/verify", json=credentials).status_code == 401
+        self.client.patch("/users/bulk", json=[{"id": created["id"], "password": "again"}])
+        assert self.db.get_user(created["id"]).password.startswith("scrypt$")
+        credentials["password"] = "again"
+        assert self.client.post("/users/verify", json=credentials).status_code == 200
+
+    def test_plain_text_password_is_rehashed_on_verify(self):
+        """Test a user stored before hashing is upgraded on their next login."""
+        legacy = self.db.create_user(UserCreate(name="Old", email="old@example.com", password="pw"))
+        credentials = {"email": "old@example.com", "password": "pw"}
+        assert self.client.post("/users/verify", json=credentials).status_code == 200
+        assert self.db.get_user(legacy.id).password.startswith("scrypt$")
+        assert self.client.post("/users/verify", json=credentials).status_code == 200
+
+    def test_password_hashing_overload_answers_503(self):
+        """Test that password work beyond the hasher's queue is shed."""
+        max_pending, main.password_hasher.max_pending = main.password_hasher.max_pending, 0
+        try:
+            response = self.client.post("/users", json={
+                "name": "Ann", "email": "ann@example.com", "password": "secret"
+            })
+        finally:
+            main.password_hasher.max_pending = max_pending
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == "1"
+        assert self.db.get_all_users() == []
+
+    def test_metrics_endpoint(self):
+        """Test /metrics counts requests by route template and reports sizes."""
+        def count(text: str, sample: str) -> int:
+            for line in text.splitlines():
+                if line.startswith(sample + " "):
+                    return int(line.rsplit(" ", 1)[1])
+            return 0
+
+        sample = 'http_requests_total{method="GET",route="/products/{product_id}",status="200"}'
+        before = count(self.client.get("/metrics").text, sample)
+        self.client.get("/products/1")
+        self.client.get("/products/2")
+        self.client.get("/no/such/path")
+        response = self.client.get("/metrics")
+        assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+        assert count(response.text, sample) == before + 2
+        assert 'route="<unmatched>",status="404"' in response.text
+        assert "/products/1" not in response.text
+        assert count(response.text, 'crud_collection_rows{collection="products"}') == 3
+        assert "http_request_duration_seconds_bucket" in response.text
+
+    def _profiled_client(self, monkeypatch, **options) -> TestClient:
+        """A client holding the admin token, through a fresh profiler set up with ``options``."""
+        monkeypatch.setattr(main.settings, "admin_token", "s3cret")
+        main.profiler = Profiler(**options)
+        return TestClient(
+            ProfilingMiddleware(app, main.profiler), headers={"Authorization": "Bearer s3cret"}
+        )
+
+    def test_profile_header_captures_downloadable_profile(self, monkeypatch):
+        """Test X-Profile with the admin token captures a profile that pstats can load."""
+        import pstats
+
+        client = self._profiled_client(monkeypatch, header_value="s3cret")
+        client.get("/products/1")
+        client.get("/products/1", headers={"X-Profile": "1"})
+        assert client.get("/admin/profiles").json() == []
+        client.get("/products/1", headers={"X-Profile": "s3cret"})
+        [summary] = client.get("/admin/profiles").json()
+        assert summary["path"] == "/products/1" and summary["reason"] == "header"
+        assert summary["status"] == 200 and "db" in summary["phases"]
+
+        response = client.get(f"/admin/profiles/{summary['id']}")
+        assert response.headers["content-type"] == "application/octet-stream"
+        path = os.path.join(tempfile.mkdtemp(), "request.prof")
+        with open(path, "wb") as out:
+            out.write(response.content)
+        assert pstats.Stats(path).total_calls > 0
+        text = client.get(f"/admin/profiles/{summary['id']}", params={"format": "text"}).text
+        assert "cumulative" in text
+        assert client.get("/admin/profiles/999").status_code == 404
+
+    def test_profile_buffer_keeps_the_latest(self, monkeypatch):
+        """Test sampled profiles are kept in a bounded ring buffer."""
+        client = self._profiled_client(monkeypatch, capacity=2, sample_rate=1.0)
+        for product_id in (1, 2, 3):
+            client.get(f"/products/{product_id}")
+        assert [p.path for p in main.profiler.profiles] == ["/products/2", "/products/3"]
+        assert [p.id for p in main.profiler.profiles] == [2, 3]
+
+    def test_slow_requests_are_logged_with_phases(self, monkeypatch, caplog):
+        """Test requests over the threshold are logged and listed with their phases."""
+        client = self._profiled_client(monkeypatch, slow_ms=1e-6)
+        with caplog.at_level("WARNING", logger="crud.slow"):
+            client.post("/products", json=SAMPLE_PRODUCT.model_dump())
+            client.post("/products", json={"name": "No price"})
+        assert "slow request POST /products 200" in caplog.text
+        slow = client.get("/admin/slow-requests").json()[0]
+        assert slow["method"] == "POST" and slow["status"] == 200
+        assert set(slow["phases"]) == {
+            "routing", "parsing", "endpoint", "db", "serialization", "sending",
+        }
+        assert slow["phases"]["db"] > 0
+        invalid = client.get("/admin/slow-requests").json()[1]
+        assert invalid["status"] == 422 and invalid["phases"]["endpoint"] == 0
+        assert not main.profiler.profiles
+
+    def test_admin_endpoints_require_the_token(self, monkeypatch):
+        """Test the admin endpoints need the token, and don't exist without one."""
+        for path in ("/admin/profiles", "/admin/profiles/1", "/admin/slow-requests"):
+            assert self.client.get(path).status_code == 404
+
+        self._profiled_client(monkeypatch)
+        response = self.client.get("/admin/slow-requests")
+        assert response.status_code == 401
+        assert response.headers["WWW-Authenticate"] == "Bearer"
+        wrong = {"Authorization": "Bearer nope"}
+        assert self.client.get("/admin/profiles", headers=wrong).status_code == 401
+        right = {"Authorization": "Bearer s3cret"}
+        assert self.client.get("/admin/profiles", headers=right).status_code == 200
+
+    def test_user_emails_are_unique(self):
+        """Test 409s for taken emails and lookup by email."""
+        user = {"name": "Ann", "email": "ann@example.com", "password": "secret"}
+        created = self.client.post("/users", json=user).json()
+        response = self.client.post("/users", json=dict(user, email="ANN@example.com"))
+        assert response.status_code == 409
+
+        other = self.client.post("/users", json=dict(user, email="bob@example.com")).json()
+        response = self.client.put(f"/users/{other['id']}", json={"email": "ann@example.com"})
+        assert response.status_code == 409
+
+        response = self.client.post("/users/bulk", json=[dict(user, email="cat@example.com"), user])
+        assert [r["status"] for r in response.json()["results"]] == [200, 409]
+
+        response = self.client.get("/users/by-email/Ann@Example.com")
+        assert response.status_code == 200
+        assert response.json()["id"] == created["id"]
+        assert "password" not in response.json()
+        assert self.client.get("/users/by-email/nobody@example.com").status_code == 404
+
+    def test_bulk_create_users_from_ndjson(self):
+        """Test bulk user creation from an NDJSON body."""
+        body = "\n".join([
+            '{"name": "One", "email": "one@example.com", "password": "pw1"}',
+            '{"name": "Two", "email": "two@example.com", "password": "pw2"}',
+        ])
+        response = self.client.post(
+            "/users/bulk", content=body, headers={"Content-Type": "application/x-ndjson"}
+        )
+        assert response.status_code == 200
+        assert [r["id"] for r in response.json()["results"]] == [1, 2]
+        assert self.db.get_user(2).email == "two@example.com"
+
+    def test_bulk_ndjson_lines_fail_on_their_own(self):
+        """Test a malformed NDJSON line is a 422 for that line alone."""
+        product = json.dumps(SAMPLE_PRODUCT.model_dump())
+        body = "\n".join([product, "{not json", f"{product},{product}", "", product])
+        response = self.client.post(
+            "/products/bulk", content=body, headers={"Content-Type": "application/x-ndjson"}
+        )
+        assert response.status_code == 200
+        results = response.json()["results"]
+        assert [(r["index"], r["status"]) for r in results] == [
+            (0, 200), (1, 422), (2, 422), (3, 200),
+        ]
+        assert self.db.get_product(results[3]["id"]).name == SAMPLE_PRODUCT.name
+
+    def test_export_products_ndjson(self):
+        """Test streaming every product as NDJSON."""
+        response = self.client.get("/products/export")
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/x-ndjson"
+        lines = response.text.splitlines()
+        assert [json.loads(line)["id"] for line in lines] == [1, 2, 3]
+
+        compressed = self.client.get("/products/export", headers={"Accept-Encoding": "gzip"})
+        assert compressed.headers["Content-Encoding"] == "gzip"
+        assert compressed.text == response.text
+
+    def test_fast_json_matches_response_model(self):
+        """Test the fast serialization path against response_model output."""
+        from config import settings
+        self.client.post("/users", json={
+            "name": "Fast", "email": "fast@example.com", "password": "secret"
+        })
+        cache_bytes, self.cache.max_bytes = self.cache.max_bytes, 0
+        try:
+            slow = [self.client.get(path) for path in ("/products?limit=2", "/users")]
+            settings.fast_json = True
+            fast = [self.client.get(path) for path in ("/products?limit=2", "/users")]
+        finally:
+            settings.fast_json = False
+            self.cache.max_bytes = cache_bytes
+
+        for slow_response, fast_response in zip(slow, fast):
+            assert fast_response.json() == slow_response.json()
+        assert fast[0].headers["X-Next-After-Id"] == "2"
+        assert "password" not in fast[1].json()[0]
+
+    def test_conditional_get_products(self):
+        """Test that a current ETag yields 304 until the collection changes."""
+        first = self.client.get("/products")
+        etag = first.headers["ETag"]
+
+        cached = self.client.get("/products", headers={"If-None-Match": etag})
+        assert cached.status_code == 304
+        assert cached.content == b""
+
+        self.client.put("/products/1", json={"price": 1.0})
+        fresh = self.client.get("/products", headers={"If-None-Match": etag})
+        assert fresh.status_code == 200
+        assert fresh.headers["ETag"] != etag
+
+    def test_conditional_get_user(self):
+        """Test per-row ETags on GET /users/{id}."""
+        user_id = self.client.post("/users", json={
+            "name": "Cached", "email": "cached@example.com", "password": "pw"
+        }).json()["id"]
+        etag = self.client.get(f"/users/{user_id}").headers["ETag"]
+
+        assert self.client.get(
+            f"/users/{user_id}", headers={"If-None-Match": etag}
+        ).status_code == 304
+        self.client.put(f"/users/{user_id}", json={"name": "Renamed"})
+        assert self.client.get(
+            f"/users/{user_id}", headers={"If-None-Match": etag}
+        ).status_code == 200
+
+    def test_if_match_on_put_and_delete(self):
+        """Test that stale If-Match writes get a 412 with the current ETag."""
+        etag = self.client.get("/products/1").headers["ETag"]
+        assert etag == '"products-1-1"'
+
+        first = self.client.put(
+            "/products/1", json={"name": "First"}, headers={"If-Match": etag}
+        )
+        assert first.status_code == 200
+        assert first.headers["ETag"] == '"products-1-2"'
+
+        stale = self.client.put(
+            "/products/1", json={"name": "Second"}, headers={"If-Match": etag}
+        )
+        assert stale.status_code == 412
+        assert stale.headers["ETag"] == first.headers["ETag"]
+        assert self.client.get("/products/1").json()["name"] == "First"
+
+        assert self.client.delete(
+            "/products/1", headers={"If-Match": etag}
+        ).status_code == 412
+        assert self.client.put(
+            "/products/1", json={"name": "Other"}, headers={"If-Match": '"users-1-2"'}
+        ).status_code == 412
+        assert self.client.delete(
+            "/products/1", headers={"If-Match": f'{etag}, {first.headers["ETag"]}'}
+        ).status_code == 200
+        assert self.client.get("/products/1").status_code == 404
+
+        user_id = self.client.post("/users", json={
+            "name": "Versioned", "email": "versioned@example.com", "password": "pw"
+        }).json()["id"]
+        user_etag = self.client.get(f"/users/{user_id}").headers["ETag"]
+        self.client.put(f"/users/{user_id}", json={"name": "Moved on"})
+        assert self.client.put(
+            f"/users/{user_id}", json={"name": "Stale"}, headers={"If-Match": user_etag}
+        ).status_code == 412
+        assert self.client.put(
+            f"/users/{user_id}", json={"name": "Forced"}, headers={"If-Match": "*"}
+        ).status_code == 200
+
+    def test_delta_sync_endpoints(self):
+        """Test GET /products/changes and /users/changes."""
+        first = self.client.get("/products/changes").json()
+        assert len(first["rows"]) == 3
+        self.client.put("/products/1", json={"name": "Synced"})
+        self.client.delete("/products/2")
+        delta = self.client.get("/products/changes", params={"since": first["version"]}).json()
+        assert [row["name"] for row in delta["rows"]] == ["Synced"]
+        assert delta["deleted"] == [2]
+        assert delta["version"] == first["version"] + 2
+
+        self.client.post("/users", json={"name": "Sync", "email": "s@example.com", "password": "pw"})
+        users = self.client.get("/users/changes").json()
+        assert "password" not in users["rows"][0]
+        assert self.client.get(
+            "/users/changes", params={"since": users["version"] + 5}
+        ).status_code == 410
+
+    def test_response_cache_hits_and_invalidates(self):
+        """Test that list responses are cached until the collection is written."""
+        first = self.client.get("/products", params={"limit": 2})
+        second = self.client.get("/products", params={"limit": 2})
+        assert second.content == first.content
+        assert second.headers["X-Next-After-Id"] == "2"
+        assert self.client.get("/cache/stats").json()["hits"] == 1
+
+        self.client.put("/products/1", json={"name": "Renamed"})
+        stats = self.client.get("/cache/stats").json()
+        assert stats["entries"] == 0
+        assert stats["invalidations"] == 1
+        third = self.client.get("/products", params={"limit": 2})
+        assert third.json()[0]["name"] == "Renamed"
+
+    def test_response_cache_gzip_variant(self):
+        """Test that large cached bodies are served gzip-encoded on request."""
+        self.db.create_products([
+            ProductCreate(name=f"Product {i}", description="Gzip test", price=1.0, category="Test")
+            for i in range(50)
+        ])
+        plain = self.client.get("/products", headers={"Accept-Encoding": "identity"})
+        assert "Content-Encoding" not in plain.headers
+        compressed = self.client.get("/products", headers={"Accept-Encoding": "gzip"})
+        assert compressed.headers["Content-Encoding"] == "gzip"
+        assert compressed.json() == plain.json()
+
+    @pytest.mark.parametrize("cache_bytes", [None, 0])
+    def test_compressed_variants_have_their_own_etag(self, monkeypatch, cache_bytes):
+        """Test that each encoding gets a distinct ETag that still validates the resource."""
+        if cache_bytes is not None:
+            monkeypatch.setattr(main.response_cache, "max_bytes", cache_bytes)
+        self.db.create_products([
+            ProductCreate(name=f"Product {i}", description="ETag test", price=1.0, category="Test")
+            for i in range(50)
+        ])
+        plain = self.client.get("/products", headers={"Accept-Encoding": "identity"})
+        compressed = self.client.get("/products", headers={"Accept-Encoding": "gzip"})
+        assert compressed.headers["Content-Encoding"] == "gzip"
+        etag = plain.headers["ETag"]
+        assert compressed.headers["ETag"] == f'{etag[:-1]}-gzip"'
+
+        cached = self.client.get(
+            "/products",
+            headers={"Accept-Encoding": "gzip", "If-None-Match": compressed.headers["ETag"]},
+        )
+        assert cached.status_code == 304
+        assert cached.headers["ETag"] == compressed.headers["ETag"]
+
+        row_etag = self.client.get("/products/1").headers["ETag"]
+        updated = self.client.put(
+            "/products/1", json={"name": "Gzipped"},
+            headers={"If-Match": f'{row_etag[:-1]}-gzip"'},
+        )
+        assert updated.status_code == 200
+
+
+class TestSQLiteApiEndpoints(TestApiEndpoints):
+    """Run the API endpoint tests against the SQLite backend."""
+
+    def setup_method(self):
+        """Point the app at a fresh SQLite database for each test."""
+        self.tmpdir = tempfile.mkdtemp()
+        self.memory_db = main.db
+        main.db = SQLiteDatabase(os.path.join(self.tmpdir, "test.db"))
+        main.db.seed_sample_data()
+        main.db.subscribe(main._invalidate_cached_responses)
+        main.db.subscribe(main.change_feed.publish)
+        main.adb = AsyncDatabase(main.db)
+        self.db = main.db
+        self.cache = main.response_cache
+        self.cache.clear()
+        self.client = TestClient(app)
+
+    def teardown_method(self):
+        """Restore the in-memory database and remove the SQLite files."""
+        main.db.close()
+        main.db = self.memory_db
+        main.adb = AsyncDatabase(main.db)
+        shutil.rmtree(self.tmpdir)
+
+    def test_workers_seed_a_new_file_once(self):
+        """Test that serving with two workers seeds a new file with the sample products."""
+        import socket
+        import subprocess
+        import sys
+        import time
+
+        import httpx
+
+        with socket.socket() as probe:
+            probe.bind(("127.0.0.1", 0))
+            port = probe.getsockname()[1]
+        env = dict(
+            os.environ,
+            CRUD_STORAGE="sqlite",
+            CRUD_SQLITE_PATH=os.path.join(self.tmpdir, "workers.db"),
+            CRUD_SEED_SAMPLE_DATA="1",
+            CRUD_WORKERS="2",
+            CRUD_HOST="127.0.0.1",
+            CRUD_PORT=str(port),
+        )
+        server = subprocess.Popen(
+            [sys.executable, "main.py"], cwd=os.path.dirname(os.path.abspath(__file__)),
+            env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        try:
+            deadline = time.monotonic() + 60
+            while True:
+                try:
+                    response = httpx.get(f"http://127.0.0.1:{port}/products", timeout=5)
+                    break
+                except httpx.TransportError:
+                    assert server.poll() is None and time.monotonic() < deadline
+                    time.sleep(0.2)
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+        assert [p["name"] for p in response.json()] == [p.name for p in SAMPLE_PRODUCTS]
+
+
 if __name__ == "__main__":
     pytest.main([__file__])
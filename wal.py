@@ -0,0 +1,180 @@
+"""Append-only write-ahead log and snapshots for the in-memory backend.
+
+A log directory holds numbered segments (``log.000001``, ...) and at most one
+``snapshot`` in the format of ``snapshot.py``. Segments are sequences of
+frames: a little-endian ``(length, crc32)`` header followed by a JSON payload.
+Reading stops at the first short or corrupt frame, so a write torn by a crash
+loses only the records that were never acknowledged.
+
+Change records are ``[collection, op, row_id, row_version, version, row]``.
+They carry the versions written and the whole row, so replaying a record over
+state that already includes it leaves that state unchanged. That lets a
+snapshot be taken while writes continue into the next segment.
+"""
+import json
+import os
+import re
+import struct
+import threading
+import zlib
+from typing import Iterator, List, Optional
+
+from storage import Change
+
+FRAME_HEADER = struct.Struct("<II")
+SEGMENT_PATTERN = re.compile(r"^log\.(\d{6})$")
+SNAPSHOT_NAME = "snapshot"
+
+
+def encode_change(change: Change, row_version: Optional[int]) -> bytes:
+    """Encode a ``Change`` as a log payload."""
+    head = json.dumps(
+        [change.collection, change.op, change.row_id, row_version, change.version]
+    ).encode()
+    row = change.row.model_dump_json().encode() if change.row is not None else b"null"
+    return head[:-1] + b"," + row + b"]"
+
+
+def frame(payload: bytes) -> bytes:
+    """Prefix ``payload`` with its length and checksum."""
+    return FRAME_HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+def read_frames(path: str) -> Iterator[bytes]:
+    """Yield the payloads of ``path`` up to the first incomplete or corrupt frame."""
+    with open(path, "rb") as f:
+        while True:
+            header = f.read(FRAME_HEADER.size)
+            if len(header) < FRAME_HEADER.size:
+                return
+            length, checksum = FRAME_HEADER.unpack(header)
+            payload = f.read(length)
+            if len(payload) < length or zlib.crc32(payload) != checksum:
+                return
+            yield payload
+
+
+def _fsync_directory(directory: str):
+    """Make renames and newly created files in ``directory`` durable."""
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class WriteAheadLog:
+    """Segmented append-only log with group commit.
+
+    ``append`` only buffers a record. ``commit`` makes every record appended
+    so far durable: the first caller to arrive writes and fsyncs the whole
+    buffer while later callers wait, then the next waiter flushes whatever
+    accumulated in the meantime. Concurrent writers therefore share fsyncs,
+    and a lone writer pays one fsync per commit.
+    """
+
+    def __init__(self, directory: str, fsync: bool = True):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.snapshot_path = os.path.join(directory, SNAPSHOT_NAME)
+        self.fsync = fsync
+        self.appended = 0
+        self.durable = 0
+        self.flushes = 0
+        self.records_in_segment = 0
+        self._buffer: List[bytes] = []
+        self._flushing = False
+        self._cond = threading.Condition()
+        segments = self.segments()
+        self.segment = segments[-1] + 1 if segments else 1
+        self._file = self._open_segment(self.segment)
+
+    def _segment_path(self, segment: int) -> str:
+        return os.path.join(self.directory, f"log.{segment:06d}")
+
+    def _open_segment(self, segment: int):
+        f = open(self._segment_path(segment), "ab")
+        if self.fsync:
+            _fsync_directory(self.directory)
+        return f
+
+    def segments(self) -> List[int]:
+        """Numbers of the log segments on disk, oldest first."""
+        numbers = []
+        for name in os.listdir(self.directory):
+            match = SEGMENT_PATTERN.match(name)
+            if match:
+                numbers.append(int(match.group(1)))
+        return sorted(numbers)
+
+    def append(self, payload: bytes) -> int:
+        """Buffer a record and return its sequence number."""
+        with self._cond:
+            self._buffer.append(frame(payload))
+            self.appended += 1
+            self.records_in_segment += 1
+            return self.appended
+
+    def commit(self, seq: Optional[int] = None):
+        """Block until record ``seq`` (default: everything appended) is durable."""
+        with self._cond:
+            target = self.appended if seq is None else seq
+            while self.durable < target:
+                if self._flushing:
+                    self._cond.wait()
+                    continue
+                batch, self._buffer = self._buffer, []
+                end = self.appended
+                self._flushing = True
+                self._cond.release()
+                try:
+                    self._write(batch)
+                finally:
+                    self._cond.acquire()
+                    self._flushing = False
+                    self._cond.notify_all()
+                self.durable = end
+
+    def _write(self, batch: List[bytes]):
+        self._file.write(b"".join(batch))
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+        self.flushes += 1
+
+    def rotate(self) -> int:
+        """Flush the current segment and send later appends to a new one.
+
+        Returns the new segment number; a snapshot taken afterwards only
+        needs the log from that segment on.
+        """
+        with self._cond:
+            while self._flushing:
+                self._cond.wait()
+            self._write(self._buffer)
+            self._buffer = []
+            self.durable = self.appended
+            self._file.close()
+            self.segment += 1
+            self.records_in_segment = 0
+            self._file = self._open_segment(self.segment)
+            self._cond.notify_all()
+            return self.segment
+
+    def remove_segments_before(self, segment: int):
+        """Delete the segments a snapshot has made redundant."""
+        for number in self.segments():
+            if number < segment:
+                os.remove(self._segment_path(number))
+
+    def replay(self, first_segment: int = 1) -> Iterator[bytes]:
+        """Yield the payloads of every segment from ``first_segment`` on, in order."""
+        for number in self.segments():
+            if first_segment <= number < self.segment:
+                yield from read_frames(self._segment_path(number))
+
+    def close(self):
+        """Flush outstanding records and close the current segment."""
+        self.commit()
+        with self._cond:
+            self._file.close()